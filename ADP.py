@@ -20,6 +20,10 @@ Classes:
 Functions:
     get_max_ID: 
         Get the max ID.
+    update_mouse:
+        Write fields to a mouse found with find_mouse().
+    find_mouse:
+        A mouse's record, fetched by its cached record id if known.
     SAC_mouse: 
         A mouse is SACed (i.e. sacrificed).
     SAC_cage: 
@@ -32,6 +36,10 @@ Functions:
         A cage's litter has weaned and is moved to seperate cages.
     get_date_born: 
         Uses the weaning date entry of a mother to calculate date born.
+    parse_animal_ID:
+        Split an animal ID into parental cage, cohort and number.
+    next_cohort:
+        The cohort letter(s) following a cohort ("A" --> "B", "Z" --> "AA").
     group_by_gender: 
         Group cage into list of males and females.
     get_next_cohort: 
@@ -42,19 +50,66 @@ Functions:
         Given a breeding cage, returns the mother's record.
     genotype_maintenance: 
         Assigns maintenance status to mice that require genotyping.
+    get_pedigree:
+        The colony's pedigree graph (ancestors, descendants, siblings).
+    get_kinship:
+        Kinship matrix of the live mice (see kinship.py).
+    best_partners:
+        Live mice of the opposite sex, least related first.
+    get_columns:
+        Column arrays of the table for colony reports (see columns.py).
+    get_schedule:
+        Calendar of weanings, retirements and overdue litters.
+    get_cages:
+        Index of the cage cards in use (see cages.py).
+    taken_cages:
+        The given cage numbers that are in use.
+    allocate_cages:
+        The lowest free cage numbers of cage_range.
+    load_mice:
+        Every mouse as a compact MouseRecord (see mouse_record.py).
+    record_pages:
+        A listing of the table, one page at a time.
+    get_negatives:
+        Find cages where every mouse is Cre negative.
+    cages_where:
+        Find cages where every mouse matches a condition.
 """
 
-import string
-import sys
 import datetime
+import logging
 from datetime import timedelta
 
+from requests.exceptions import HTTPError
+
 from airtable import Airtable
+from cages import CageIndex
+from columns import ColonyColumns
+from kinship import Kinship, PairKinship
+from mouse_record import MouseSchema, parse_animal_ID
+from pedigree import Pedigree
+from schedule import Schedule
 from session_dir.session_object import *
+from session_dir.id_allocator import get_allocator
+from session_dir.predicates import AND, OR, between, eq, ne
+from session_dir.record_ids import RecordIDMap
+from session_dir.tracing import traced
+from session_dir.write_buffer import WriteBuffer
+
+# Messages for the user; enable with
+# logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
 
 class Manipulate(Session):
     """ 
     Changes to a session's database are done through the Manipulate class
+
+    Pass snapshot=True to load the table once and answer lookups from
+    a local index instead of a request per lookup.
+    Whole-cage and weaning writes are sent in batches of up to 10 records
+    unless batch_writes is set to False.
+    Messages go to the "ADP" logger and the requests made by each public
+    method are recorded by self.tracer.
     """
 
     def __init__(self, *args, **kwargs):
@@ -76,6 +131,13 @@ class Manipulate(Session):
         self.father_ID_col = "Father ID"
         self.mother_ID_col = "Mother ID"
         self.weaning_date_col = "Weaning Date"
+        # Columns the snapshot (if enabled) keeps hash indexes on
+        self.indexed_fields = [self.animal_ID_col, self.cage_card_col,
+                               self.strain_col, self.ID_col]
+        # "Last modified time" field the disk cache (if enabled) syncs by
+        self.modified_field = "Last Modified"
+        # Shared by every session on this table
+        self.id_allocator = get_allocator(self.base_key, self.table_name)
 
         # Mouse status types
         self.available = "A: Available"
@@ -85,19 +147,237 @@ class Manipulate(Session):
         self.pups = "P: With Pups"
         self.maintenance = "CM: Colony Maintenance"
 
+        # Lines whose weaned pups wait in colony maintenance until
+        # genotyped (see genotypes.py)
+        self.genotyped_markers = ["-Cre", "DF16A"]
+
         # Mouse Sex
         self.male = "M"
         self.female = "F"
+
+        # Send multi-record writes through the batch endpoints
+        self.batch_writes = True
+        # Check new mice for IDs also taken by another session
+        self.verify_IDs = True
+        # Asks the user to confirm unusual entries, returns "y" to continue
+        self.ask = input
+        # Pedigree graph, built on first use by get_pedigree()
+        self._pedigree = None
+        # Kinship matrix, built on first use by get_kinship()
+        self._kinship = None
+        # Kinship of single pairs, for check_relatedness()
+        self._pair_kinship = None
+        # set_breeding() rejects pairs at least as related as kinship_limit
+        # (0.25: siblings, parent and offspring) and warns from
+        # kinship_warning (0.0625: first cousins)
+        self.check_kinship = True
+        self.kinship_limit = 0.25
+        self.kinship_warning = 0.0625
+        # Task calendar, built on first use by get_schedule()
+        self._schedule = None
+        self.retirement_days = 240
+        self.no_litter_days = 60
+        # Cage index, built on first use by get_cages()
+        self._cages = None
+        # Cage numbers allocate_cages() hands out (first, last)
+        self.cage_range = (1000, 9999)
+        # Layout of the snapshot's compact records, built by record_model()
+        self._mouse_schema = None
+        # Animal ID --> record id of every mouse the session has read or
+        # written, so find_mouse() can fetch it by id instead of searching
+        self.record_ids = RecordIDMap(self.animal_ID_col)
+        # The Active Mice view lists the mice that are not SACed or dead,
+        # so a snapshot can answer it locally
+        self.local_views = {self.main_view: self.alive()}
     
-    def get_max_ID(self):
+    def record_model(self):
+        """
+        Returns the MouseSchema the snapshot keeps mice in.
+        """
+        if self._mouse_schema is None:
+            self._mouse_schema = MouseSchema(
+                self.ID_col, self.animal_ID_col, self.cage_card_col,
+                self.status_col, self.strain_col, self.gender_col,
+                self.born_col, self.breeding_date_col, self.weaning_date_col,
+                self.partner_ID_col, self.father_ID_col, self.mother_ID_col)
+        return self._mouse_schema
+
+    def write_buffer(self, airtable):
+        """
+        Returns a WriteBuffer for airtable following self.batch_writes.
+        """
+        return WriteBuffer(airtable, batch=self.batch_writes)
+
+    def alive(self):
+        """
+        Returns a predicate matching mice that are not SACed or dead.
+        """
+        return AND(ne(self.status_col, self.SACed),
+                   ne(self.status_col, self.dead))
+
+    def cage_exists(self, airtable, cage_num):
+        """
+        True if any mouse record has the cage number.
+
+        Only one row and column are fetched.
+        """
+        return airtable.search(self.cage_card_col, cage_num,
+                               fields=[self.cage_card_col],
+                               max_records=1) != []
+
+    def parent_fields(self):
+        """
+        Columns needed to find a cage's parents and build their pups.
+        """
+        return [self.ID_col, self.status_col, self.strain_col,
+                self.animal_ID_col, self.gender_col, self.weaning_date_col]
+
+    @traced
+    def get_max_ID(self, fresh=False):
         """
         Returns the max ID.
+
+        Args:
+            fresh: Ask airtable even in snapshot mode or inside a unit of
+                   work, to see IDs other sessions have used since.
         """
-        airtable = self.Authenticate(self.base_key, self.table_name, self.API_key)
+        if fresh:
+            airtable = self.client(self.base_key, self.table_name,
+                                   self.API_key)
+        else:
+            airtable = self.Authenticate(self.base_key, self.table_name,
+                                         self.API_key)
         max_ID = airtable.get_all(sort="-" + self.ID_col, 
                                   max_records=1)[0]["fields"][self.ID_col]
+        self.id_allocator.observe(max_ID)
         return max_ID
 
+    @traced
+    def reserve_IDs(self, count):
+        """
+        Reserve a block of consecutive IDs for new mice.
+
+        Only the first reservation of a session queries the max ID; later
+        ones are served from the cached high-water mark.
+
+        Returns: range of the reserved IDs.
+        """
+        if self.id_allocator.needs_max():
+            self.get_max_ID()
+        return self.id_allocator.reserve(count)
+
+    def ID_range_formula(self, low, high):
+        """
+        Airtable formula matching IDs from low to high (inclusive).
+        """
+        return between(self.ID_col, low, high).formula()
+
+    @traced
+    def check_IDs(self, airtable, inserted, attempts=5):
+        """
+        Make sure newly inserted mice do not share an ID with mice
+        inserted at the same time by another session.
+
+        Mice that lost a collision (i.e. were created last) are moved to
+        newly reserved IDs. A collision means another session has used
+        IDs past the cached high-water mark, so the max ID is read again
+        before reserving.
+
+        Args:
+            airtable: Airtable object the mice were inserted through.
+            inserted: The inserted records.
+            attempts: Times to retry before giving up.
+
+        Returns:
+            The inserted records, with updated IDs where they were moved.
+        """
+        # While writes are held by a unit of work or staged, the mice are
+        # checked once they are committed
+        if not inserted or not self.verify_IDs or self._unit is not None\
+                or self._staged is not None:
+            return inserted
+        inserted = list(inserted)
+        for _ in range(attempts):
+            IDs = [int(record["fields"][self.ID_col]) for record in inserted]
+            existing = airtable.get_all(
+                formula=self.ID_range_formula(min(IDs), max(IDs)),
+                fields=[self.ID_col])
+            losers = self.id_allocator.collisions(inserted, existing,
+                                                  self.ID_col)
+            if not losers:
+                return inserted
+            self.get_max_ID(fresh=True)
+            new_IDs = self.id_allocator.reserve(len(losers))
+            updates = [{"id": record["id"], "fields": {self.ID_col: str(ID)}}
+                       for record, ID in zip(losers, new_IDs)]
+            with self.write_buffer(airtable) as buffer:
+                for update in updates:
+                    buffer.update(update["id"], update["fields"])
+            moved = {record["id"]: record for record in buffer.results}
+            for record, ID in zip(losers, new_IDs):
+                logger.warning("ID collision: "
+                               + record["fields"][self.animal_ID_col]
+                               + " moved to ID " + str(ID))
+            inserted = [moved.get(record["id"], record) for record in inserted]
+        assert False, "Could not assign unique IDs to the weaned mice"
+
+    @traced
+    def update_mouse(self, animal_ID, fields):
+        """
+        Write fields to a mouse's record.
+
+        The mouse is found with find_mouse(), so a mouse the session has
+        already read or written is fetched by its record id instead of
+        searched for.
+
+        Args:
+            animal_ID: Animal ID of the mouse.
+            fields: Dictionary of column --> value to write.
+
+        Returns: The updated record ({} if there is no such mouse).
+        """
+        airtable = self.Authenticate(self.base_key, self.table_name,
+                                     self.API_key)
+        matches = self.find_mouse(airtable, animal_ID)
+        if not matches:
+            return {}
+        record = airtable.update(matches[0]["id"], fields)
+        self.track_writes([{"id": matches[0]["id"], "fields": fields}])
+        return record
+
+    def find_mouse(self, airtable, animal_ID):
+        """
+        Search results for a mouse's Animal ID.
+
+        Outside snapshot mode, a mouse the session has already read or
+        written is fetched by its cached record id (see self.record_ids),
+        a direct read instead of a filtered search over the table. The
+        record is only used if it still has the Animal ID; if another
+        session has renamed or deleted it, the mouse is searched for.
+
+        Returns: List holding the mouse's record ([] if there is none).
+        """
+        record_id = None if self.snapshot else self.record_ids.get(animal_ID)
+        if record_id is not None:
+            try:
+                record = airtable.get(record_id)
+            except HTTPError as exception:
+                if exception.response is None\
+                        or exception.response.status_code != 404:
+                    raise
+                self.record_ids.discard(record_id)
+            else:
+                if self.is_mouse(record, animal_ID):
+                    return [record]
+        return airtable.search(self.animal_ID_col, animal_ID)
+
+    def is_mouse(self, record, animal_ID):
+        """
+        True if a record fetched by a cached id still has the Animal ID.
+        """
+        return str(record["fields"].get(self.animal_ID_col)) == str(animal_ID)
+
+    @traced
     def SAC_mouse(self, animal_ID):
         """
         Set a mouse"s status to "S: Sacrificed".
@@ -108,19 +388,21 @@ class Manipulate(Session):
         airtable = self.Authenticate(self.base_key, self.table_name,
                                      self.API_key)
         # Get the mouse record
-        record = airtable.search(self.animal_ID_col, animal_ID)[0]["fields"]
+        match = self.find_mouse(airtable, animal_ID)[0]
+        record = match["fields"]
         # Mouse must exist and not already be SACed
         assert record[self.animal_ID_col] != [], "ID does not exist"
         assert record[self.status_col] != self.SACed, "Mouse is already SACed"
 
-        airtable.update_by_field(self.animal_ID_col, animal_ID,\
-                                {self.status_col: self.SACed})
+        # The record was just fetched, so it is updated by record id
+        airtable.update(match["id"], {self.status_col: self.SACed})
+        self.track_writes([{"id": match["id"],
+                            "fields": {self.status_col: self.SACed}}])
         # animal_IDS is animal_ID + strain
         animal_IDS = (animal_ID + "_" + record[self.strain_col])
-        print("--------------------")
-        print(str(animal_IDS) + " mouse SACed")
-        print("--------------------")
+        logger.info(str(animal_IDS) + " mouse SACed")
 
+    @traced
     def SAC_cage(self, cage_num):
         """
         Set status of all mice within a cage to "S: Sacrificed".
@@ -132,38 +414,29 @@ class Manipulate(Session):
                                      self.API_key)
 
         # Cage must exist
-        assert airtable.search(self.cage_card_col, cage_num) != [],\
-                               "Cage does not exist"
+        assert self.cage_exists(airtable, cage_num), "Cage does not exist"
         # At least one mouse must still be alive for SAC command
-        # to be applicable
-        alive = False
-        for record in airtable.search(self.cage_card_col, cage_num):
-            if record["fields"][self.status_col] != self.SACed\
-                and record["fields"][self.status_col] != self.dead:
-                alive = True
-                break
-        if alive:
-            pass
-        else:
-            print("--------------------")
-            print("Error: All mice in cage " + str(cage_num) \
-                  + " are already dead")
-            print("--------------------")
+        # to be applicable; only live mice are fetched
+        matches = airtable.query(AND(eq(self.cage_card_col, cage_num),
+                                     self.alive()),
+                                 fields=[self.animal_ID_col, self.strain_col,
+                                         self.status_col])
+        if not matches:
+            logger.error("Error: All mice in cage " + str(cage_num)
+                         + " are already dead")
             return
         # All live mice are set to SAC status
-        for record in airtable.search(self.cage_card_col, cage_num):
-            if record["fields"][self.status_col] != self.SACed\
-                and record["fields"][self.status_col] != self.dead:  
-                airtable.update(record["id"], {self.status_col: self.SACed})
-                animal_IDS = record["fields"][self.animal_ID_col]\
-                             + "_" + record["fields"][self.strain_col]
-                print("--------------------")
-                print(animal_IDS + " was SACed")
-
-        print("--------------------")
-        print("Cage " + str(cage_num) + " SACed")
-        print("--------------------")
-
+        with self.write_buffer(airtable) as buffer:
+            for record in matches:
+                buffer.update(record["id"], {self.status_col: self.SACed})
+        self.track_writes(buffer.results)
+        for record in buffer.results:
+            animal_IDS = record["fields"][self.animal_ID_col]\
+                         + "_" + record["fields"][self.strain_col]
+            logger.info(animal_IDS + " was SACed")
+        logger.info("Cage " + str(cage_num) + " SACed")
+
+    @traced
     def set_breeding(self, cage_num, month, day, year, male_ID,
                      female_ID, female_ID2=False):
         """
@@ -176,7 +449,8 @@ class Manipulate(Session):
         female).
 
         Args:
-            cage_num: The assigned cage number.
+            cage_num: The assigned cage number, or None to allocate one
+                      with allocate_cages().
             month/day/year: The date breeding began, MM/DD/YYYY format.
             male_ID: Male's "Animal ID".
             female_ID: First female's "Animal ID".
@@ -186,15 +460,45 @@ class Manipulate(Session):
                                      self.API_key)
         date = datetime.date(year, month, day) 
 
-        male_record = airtable.search(self.animal_ID_col, male_ID)
-        female_record = airtable.search(self.animal_ID_col, female_ID)
+        male_record = self.find_mouse(airtable, male_ID)
+        female_record = self.find_mouse(airtable, female_ID)
+        female_record2 = None
         if female_ID2:
-            female_record2 = airtable.search(self.animal_ID_col, female_ID2)
+            female_record2 = self.find_mouse(airtable, female_ID2)
+        self.check_breeding(male_record, female_record, female_record2)
+        self.check_relatedness(male_ID, female_ID, female_ID2)
+
+        if cage_num is None:
+            cage_num = self.allocate_cages(1)[0]
+        elif not self.confirm_cage(airtable.search(
+                self.cage_card_col, cage_num, fields=[self.cage_card_col],
+                max_records=1)):
+            return
+
+        # The records were fetched above, so update them by record id
+        with self.write_buffer(airtable) as buffer:
+            for update in self.breeding_updates(cage_num, date, male_record,
+                                                female_record, female_record2):
+                buffer.update(update["id"], update["fields"])
+        self.track_writes(buffer.results)
+
+        self.report_breeding(cage_num, date, male_ID, female_ID, female_ID2)
+
+    def check_breeding(self, male_record, female_record, female_record2=None):
+        """
+        Validate the mice set to breeding by set_breeding().
+
+        Args:
+            male_record: Search results for the male's "Animal ID".
+            female_record: Search results for the first female's "Animal ID".
+            female_record2: Search results for the second female's
+                            "Animal ID", or None if there is none.
+        """
         # Make sure male_ID/female_ID/female_ID2 exist, are alive
         # and correct gender
         assert male_record, "Male Animal ID does not exist"
         assert female_record, "Female Animal ID does not exist"
-        if female_ID2:
+        if female_record2 is not None:
             assert female_record2, "Second female Animal ID does not exist"
         assert male_record[0]["fields"][self.gender_col] == self.male,\
                "Male Animal ID does not belong to a male"
@@ -206,24 +510,75 @@ class Manipulate(Session):
         assert female_record[0]["fields"][self.status_col] != self.SACed\
                and female_record[0]["fields"][self.status_col] != self.dead,\
                "Female is dead and cannot breed"
-        if female_ID2:
+        if female_record2 is not None:
             assert female_record2[0]["fields"][self.gender_col] == self.female,\
                 "Second female Animal ID does not belong to a female"
             assert female_record2[0]["fields"][self.status_col] != self.SACed\
                 and female_record2[0]["fields"][self.status_col] != self.dead,\
                 "Second female is dead and cannot breed"
 
-        if airtable.search(self.cage_card_col, cage_num) != []:
-            verify = input("Cage already alocated. Continue? y/n > ")
+    def check_relatedness(self, male_ID, female_ID, female_ID2=False):
+        """
+        Reject or warn about a breeding pair that is closely related.
+
+        Uses the kinship matrix if it is already built. Otherwise, only in
+        snapshot mode (where the pedigree costs no requests), the pair's
+        kinship is computed from their ancestors alone (see
+        kinship.PairKinship) rather than building the matrix.
+        """
+        if not self.check_kinship:
+            return
+        if self._kinship is not None:
+            kinship = self._kinship
+        elif self.snapshot:
+            pedigree = self.get_pedigree()
+            if self._pair_kinship is None\
+                    or self._pair_kinship.pedigree is not pedigree:
+                self._pair_kinship = PairKinship(pedigree)
+            kinship = self._pair_kinship
+        else:
+            return
+        for female in (female_ID, female_ID2):
+            if not female:
+                continue
+            coefficient = kinship.kinship(male_ID, female)
+            assert coefficient < self.kinship_limit,\
+                male_ID + " and " + female + " are too closely related "\
+                "to breed (kinship " + str(coefficient) + ")"
+            if coefficient >= self.kinship_warning:
+                logger.warning(male_ID + " and " + female + " are related "
+                               "(kinship " + str(coefficient) + ")")
+
+    def confirm_cage(self, cage_matches):
+        """
+        Ask before reusing an allocated cage.
+
+        Args:
+            cage_matches: Search results for the cage number.
+
+        Returns:
+            True if the cage is empty or the user chose to continue.
+        """
+        if cage_matches != []:
+            verify = self.ask("Cage already alocated. Continue? y/n > ")
             if verify == "y":
                 pass 
             else:
-                print("--------------------")
-                print("Ending function call prematurely")
-                print("--------------------")
-                return
+                logger.warning("Ending function call prematurely")
+                return False
+        return True
 
+    def breeding_updates(self, cage_num, date, male_record, female_record,
+                         female_record2=None):
+        """
+        Build the record updates that set a male and female(s) to breeding.
+
+        Returns:
+            List of {"id": record id, "fields": fields to update}.
+        """
         cage_num = str(cage_num)
+        male_ID = male_record[0]["fields"][self.animal_ID_col]
+        female_ID = female_record[0]["fields"][self.animal_ID_col]
         # IDS is the animal_ID + strain as it is used for "Partner ID" column
         male_IDS = (male_ID + "_"
                     + male_record[0]["fields"][self.strain_col])
@@ -235,35 +590,42 @@ class Manipulate(Session):
             self.cage_card_col: cage_num, self.breeding_date_col:
             str(date.month) + "/" + str(date.day) + "/" + str(date.year)
         }
-        airtable.update_by_field(self.animal_ID_col, male_ID, update_male)
         # Update first female's info
         update_female = {
             self.partner_ID_col: male_IDS, self.status_col: self.breeding,
             self.cage_card_col: cage_num, self.breeding_date_col:
             str(date.month) + "/" + str(date.day) + "/" + str(date.year)
         }
-        airtable.update_by_field(self.animal_ID_col, female_ID, update_female)
+        updates = [{"id": male_record[0]["id"], "fields": update_male},
+                   {"id": female_record[0]["id"], "fields": update_female}]
         # Update second female's (if there is one) info
-        if female_ID2:
+        if female_record2:
             update_female2 = {
                 self.partner_ID_col: male_IDS, self.status_col: self.breeding,
                 self.cage_card_col: cage_num, self.breeding_date_col:
                 str(date.month) + "/" + str(date.day) + "/" + str(date.year)
             }
-            airtable.update_by_field(self.animal_ID_col, female_ID2, update_female2)
+            updates.append({"id": female_record2[0]["id"],
+                            "fields": update_female2})
+        return updates
 
-        print("--------------------")
+    def report_breeding(self, cage_num, date, male_ID, female_ID,
+                        female_ID2=False):
+        """
+        Log the outcome of set_breeding().
+        """
         if female_ID2:
-            print("At cage " + str(cage_num) + ", " + str(male_ID) + " (MALE), "
-                + str(female_ID) + " and " + str(female_ID2) + " (FEMALES) "
-                + "were set to breeding on " + str(date.month) + "/"
-                + str(date.day) + "/" + str(date.year))
-        elif not female_ID2:
-            print("At cage " + str(cage_num) + ", " + str(male_ID) + " (MALE), "
-                + str(female_ID) + " (FEMALE)" + " were set to breeding on "
+            logger.info("At cage " + str(cage_num) + ", " + str(male_ID)
+                + " (MALE), " + str(female_ID) + " and " + str(female_ID2)
+                + " (FEMALES) " + "were set to breeding on "
                 + str(date.month) + "/" + str(date.day) + "/" + str(date.year))
-        print("--------------------")
+        elif not female_ID2:
+            logger.info("At cage " + str(cage_num) + ", " + str(male_ID)
+                + " (MALE), " + str(female_ID) + " (FEMALE)"
+                + " were set to breeding on " + str(date.month) + "/"
+                + str(date.day) + "/" + str(date.year))
 
+    @traced
     def birth(self, cage_num, month, day, year):
         """
         A cage's litter is born.
@@ -279,8 +641,7 @@ class Manipulate(Session):
         """
         airtable = self.Authenticate(self.base_key, self.table_name, 
                                      self.API_key)
-        assert airtable.search(self.cage_card_col, cage_num) != [],\
-                               "Cage does not exist"
+        assert self.cage_exists(airtable, cage_num), "Cage does not exist"
 
         # Calculate weaning date, i.e. date born plus 3 weeks
         date_born = datetime.date(year, month, day)
@@ -288,44 +649,56 @@ class Manipulate(Session):
 
         # Female from cage_num with the lowest ID number
         # will always be chosen as marked "P: With Pups"
-        matches = airtable.search(self.cage_card_col, cage_num)
-        females = []
-        for record in matches:
-            if record["fields"][self.gender_col] == self.female and\
-            record["fields"][self.status_col] != self.SACed and\
-            record["fields"][self.status_col] != self.dead:
-                females.append(record)
+        females = airtable.query(AND(eq(self.cage_card_col, cage_num),
+                                     eq(self.gender_col, self.female),
+                                     self.alive()),
+                                 fields=[self.ID_col, self.animal_ID_col,
+                                         self.status_col])
+        assert females, "No live female in cage"
         females = sorted(females, key = lambda i: i["fields"][self.ID_col])
-        mother_ID = females[0]["fields"][self.animal_ID_col]
         # Checking female was breeding
         assert females[0]["fields"][self.status_col] == self.breeding,\
                "Female was not originally set to breeding"
-        airtable.update_by_field(self.animal_ID_col, mother_ID,
-                                {self.status_col: self.pups})
-        airtable.update_by_field(self.animal_ID_col, mother_ID,
-                                {self.weaning_date_col:
-                                str(date_weaned.month) + "/"
-                                + str(date_weaned.day)
-                                + "/" + str(date_weaned.year)})
-        print("--------------------")
-        print("Pups born at cage " + str(cage_num) + " on " 
-              + str(date_born.month) + "/" + str(date_born.day) + "/" 
-              + str(date_born.year))
-        print("--------------------")
-
-    def group_by_gender(self, cage_num):
+        weaning_date = str(date_weaned.month) + "/" + str(date_weaned.day)\
+            + "/" + str(date_weaned.year)
+        # The mother was fetched above, so both fields go in one update
+        changes = {self.status_col: self.pups,
+                   self.weaning_date_col: weaning_date}
+        airtable.update(females[0]["id"], changes)
+        self.track_writes([{"id": females[0]["id"], "fields": changes}])
+        logger.info("Pups born at cage " + str(cage_num) + " on "
+                    + str(date_born.month) + "/" + str(date_born.day) + "/"
+                    + str(date_born.year))
+
+    @traced
+    def group_by_gender(self, cage_num, alive_only=False):
         """
         Group cage's mice records based on gender
 
         Args:
             cage_num: cage number
+            alive_only: Only fetch live mice, with the columns needed
+                        by get_parents().
 
         Returns:
             2 lists, one for males and one for females
         """
         airtable = self.Authenticate(self.base_key, self.table_name, self.API_key)
 
-        matches = airtable.search(self.cage_card_col, cage_num)
+        if alive_only:
+            return self.split_by_gender(airtable.query(
+                AND(eq(self.cage_card_col, cage_num), self.alive()),
+                fields=self.parent_fields()))
+        return self.split_by_gender(airtable.search(self.cage_card_col,
+                                                    cage_num))
+
+    def split_by_gender(self, matches):
+        """
+        Split already fetched mice records into males and females.
+
+        Returns:
+            2 lists, one for males and one for females
+        """
         females = []
         males = []
         for record in matches:
@@ -336,29 +709,49 @@ class Manipulate(Session):
         
         return males, females
 
+    @traced
     def get_next_cohort(self, cage_num):
         """
         Find the next cohort's letter.
 
         "A" --> 1st cohort, "B" --> 2nd cohort, etc.
 
+        All animal IDs from the parental cage are fetched in one query.
+        After "Z" cohorts continue with "AA", "AB", etc.
+
         Returns: Cohort letter
         """
         airtable = self.Authenticate(self.base_key, self.table_name, self.API_key)
 
-        i = 0
-        match = None
-        while match != []:
-            uppercase = list(string.ascii_uppercase)
-            # If a mouse with this cohort letter doesnt exist,
-            # we have found our next cohort
-            candidate = str(cage_num) + "-" + uppercase[i] + "1"
-            match = airtable.search(self.animal_ID_col, candidate)
-            cohort = uppercase[i]
-            i +=1
+        matches = airtable.search_prefix(self.animal_ID_col,
+                                         str(cage_num) + "-",
+                                         fields=[self.animal_ID_col])
+        return self.next_cohort_from(cage_num, matches)
+
+    def next_cohort_from(self, cage_num, matches):
+        """
+        Find the next cohort's letter from the parental cage's records.
+
+        Args:
+            cage_num: The parental cage number.
+            matches: Records whose animal ID starts with "<cage_num>-".
 
+        Returns: Cohort letter
+        """
+        started = set()
+        for record in matches:
+            parsed = parse_animal_ID(record["fields"].get(self.animal_ID_col,
+                                                          ""))
+            if parsed and parsed[0] == str(cage_num) and parsed[2] == 1:
+                started.add(parsed[1])
+        # If a mouse with this cohort letter doesnt exist,
+        # we have found our next cohort
+        cohort = "A"
+        while cohort in started:
+            cohort = next_cohort(cohort)
         return cohort
 
+    @traced
     def assign_weaned_mice(self, max_ID, record, cage_num, cohort,
                            female_num=0, female_cage=False, 
                            female_cage2=False, max_females=5, male_num=0,
@@ -380,10 +773,104 @@ class Manipulate(Session):
             male_cage: The cage number where the males (max 5) are transferred.
             male_cage2: The cage number where the remaining males are transferred.
             max_males: Amount of males assigned to 1st cage (default is 5).
-        
+
+        Returns:
+            The inserted records, in the order the mice were assigned.
         """
         
         airtable = self.Authenticate(self.base_key, self.table_name, self.API_key)
+        mice = self.plan_weaned_mice(max_ID, record, cage_num, cohort,
+                                     female_num, female_cage, female_cage2,
+                                     max_females, male_num, male_cage,
+                                     male_cage2, max_males)
+        with self.write_buffer(airtable) as buffer:
+            for mouse in mice:
+                buffer.insert(mouse)
+        self.add_to_pedigree(buffer.results)
+        self.track_writes(buffer.results)
+        return buffer.results
+
+    def refresh(self):
+        """
+        Reload the snapshot (if any), read the max ID again before the next
+        reservation, and drop the pedigree, kinship matrix, schedule and
+        cage index, which are rebuilt on next use to pick up changes made
+        by others.
+        """
+        super(Manipulate, self).refresh()
+        self.id_allocator.forget()
+        self.rolled_back()
+
+    def rolled_back(self):
+        """
+        After held writes are dropped: drop the pedigree, kinship, schedule
+        and cage index, which may have followed them; they are rebuilt on
+        next use.
+        """
+        self._pedigree = None
+        self._kinship = None
+        self._pair_kinship = None
+        self._schedule = None
+        self._cages = None
+
+    def committed(self, written):
+        """
+        After a unit of work: check the IDs of the inserted mice and move
+        the records tracked under staged ids to their real ones.
+        """
+        inserted = []
+        for key, record in written.items():
+            if key != record["id"]:
+                inserted.append(record)
+                for index in (self._schedule, self._cages):
+                    if index is not None:
+                        index.remove(key)
+        self.track_writes(inserted)
+        airtable = self.Authenticate(self.base_key, self.table_name,
+                                     self.API_key)
+        self.check_IDs(airtable, inserted)
+
+    def track_writes(self, records):
+        """
+        Keep an already built schedule and cage index current with written
+        records.
+
+        Args:
+            records: List of {"id": record id, "fields": fields written}.
+        """
+        for index in (self._schedule, self._cages):
+            if index is None:
+                continue
+            for record in records:
+                index.update(record["id"], record["fields"])
+
+    def add_to_pedigree(self, records):
+        """
+        Keep an already built pedigree and kinship matrix current with
+        newly inserted mice.
+        """
+        if self._pedigree is None:
+            return
+        for record in records:
+            self._pedigree.add(record["fields"])
+        if self._kinship is not None:
+            self._kinship.update()
+        if self._pair_kinship is not None:
+            self._pair_kinship.clear()
+
+    def plan_weaned_mice(self, max_ID, record, cage_num, cohort,
+                         female_num=0, female_cage=False,
+                         female_cage2=False, max_females=5, male_num=0,
+                         male_cage=False, male_cage2=False, max_males=5):
+        """
+        Build the records assign_weaned_mice() inserts, without writing them.
+
+        Takes the same arguments as assign_weaned_mice().
+
+        Returns:
+            List of field dictionaries, one per weaned mouse.
+        """
+        mice = []
 
         # Update ID (i) and animal_ID incrementally
         counter = 1
@@ -394,7 +881,7 @@ class Manipulate(Session):
             # Move onto next cohort if 10 < male_num + female_num 
             # and all females are assigned
             if mice_in_cohort >= 11 or (10 - male_num) < female_num == counter - 1:
-                cohort = chr(ord(cohort) + 1)
+                cohort = next_cohort(cohort)
                 mice_in_cohort = 1
             # animal_ID is animal_ID[0:-1] (e.g. 1057-B) + counter (e.g. 4)
             animal_ID = str(cage_num) + "-" + str(cohort) + str(mice_in_cohort)
@@ -411,63 +898,58 @@ class Manipulate(Session):
             # assign to 1st cage
             if counter <= max_females and counter <= female_num:
                 record[self.cage_card_col] = str(female_cage)
-                print(animal_ID + " goes to cage " + str(female_cage))
+                logger.info(animal_ID + " goes to cage " + str(female_cage))
             # elif cage 1 is full (has reached max_females) but not all 
             # females are assigned
             elif counter <= female_num:
                 record[self.cage_card_col] = str(female_cage2)
-                print(animal_ID + " goes to cage " + str(female_cage2))
+                logger.info(animal_ID + " goes to cage " + str(female_cage2))
             # If counter remaining for males is under max_males
             # assign to 1st cage
             elif counter - female_num <= max_males:
                 record[self.cage_card_col] = str(male_cage)
-                print(animal_ID + " goes to cage " + str(male_cage))
+                logger.info(animal_ID + " goes to cage " + str(male_cage))
             else:
                 record[self.cage_card_col] = str(male_cage2)
-                print(animal_ID + " goes to cage " + str(male_cage2))
-            airtable.insert(record)
+                logger.info(animal_ID + " goes to cage " + str(male_cage2))
+            # record is reused for the next mouse, so keep a copy
+            mice.append(dict(record))
             counter += 1
             mice_in_cohort += 1 
+        return mice
 
     def get_parents(self, males, females): 
 
         """
-        Find mother (i.e. lowest ID female) in cage.
+        Find father and mother (i.e. lowest ID live female) in cage.
 
         Args:
+            males: List of male mice records within a cage.
             females: List of female mice records within a cage.
 
         Returns:
-            Record (dictionary) of mother.
+            Records (dictionaries) of father and mother.
         """
 
         # mother_ID is the cage's female with the lowest ID
         # unless mouse is dead
+        alive = self.alive()
         females = sorted(females, key = lambda i: i["fields"][self.ID_col])
-        with_pups_index = 0
-        for i in range(0, len(females)):
-            if (females[i]["fields"][self.status_col] != self.SACed\
-                and females[i]["fields"][self.status_col] != self.dead):
-                with_pups_index = i
-                break
-            else:
-                pass
+        live_females = [record for record in females
+                        if alive.matches(record["fields"])]
+        assert live_females, "No live female in cage"
         # If female is alive, check if status is "P: With Pups"
-        assert (females[with_pups_index]["fields"][self.status_col]\
+        mother_record = live_females[0]
+        assert (mother_record["fields"][self.status_col]\
                 == self.pups), "Mother did not have P: With Pups status"
-        mother_record = females[with_pups_index]
-
-        for i in range(0, len(males)):
-            # Make sure Father ID is asigned to alive male
-            if (males[i]["fields"][self.status_col] != self.SACed\
-                and males[i]["fields"][self.status_col] != self.dead):
-                father_index = i
-                break
-            else:
-                pass
-        assert(males[father_index]["fields"][self.status_col]\
+
+        # Make sure Father ID is asigned to alive male
+        live_males = [record for record in males
+                      if alive.matches(record["fields"])]
+        assert live_males, "No live male in cage"
+        father_record = live_males[0]
+        assert(father_record["fields"][self.status_col]\
                == self.breeding), "Father was not set to breeding"
-        father_record = males[father_index]
 
         return father_record, mother_record
     
@@ -491,6 +973,7 @@ class Manipulate(Session):
 
         return record    
 
+    @traced
     def weaned(self, cage_num, strain, female_num=0, female_cage=False,
                female_cage2=False, max_females = 5, male_num=0, 
                male_cage=False, male_cage2=False, max_males = 5):
@@ -500,8 +983,9 @@ class Manipulate(Session):
 
         Change mother's status back to "B: Breeding".
         Remove mother's weaning date entry.
-        Check largest ID number and assign subsequent ID(s) to new mice
-        (not to be confused with animal_ID).
+        Reserve ID(s) above the largest ID number for the new mice
+        (not to be confused with animal_ID) and check them for collisions
+        with other sessions after inserting.
         Enter information for new mice (ID, Status, Strain, Cage Card,
         Animal ID, Born, Gender, Father ID, Mother ID).
         API does not yet provide functionality for adding comment
@@ -533,30 +1017,80 @@ class Manipulate(Session):
             male_cage: The cage number where the males (max 5) are transferred.
             male_cage2: The cage number where the remaining males are transferred.
             max_males: Amount of males assigned to 1st cage (default is 5).
+
+        Cages that are needed but not given are allocated with
+        allocate_cages().
         """
         airtable = self.Authenticate(self.base_key, self.table_name, self.API_key)
 
+        female_cage, female_cage2, male_cage, male_cage2 =\
+            self.weaning_cages(female_num, female_cage, female_cage2,
+                               max_females, male_num, male_cage, male_cage2,
+                               max_males)
+        taken = self.taken_cages(airtable, [female_cage, female_cage2,
+                                            male_cage, male_cage2])
+        self.check_weaned(self.cage_exists(airtable, cage_num),
+                          lambda cage: str(cage) in taken,
+                          female_num, female_cage, female_cage2, male_num,
+                          male_cage, male_cage2)
+        if not self.confirm_new_strain(airtable.search(
+                self.strain_col, strain, fields=[self.strain_col],
+                max_records=1)):
+            return
+
+        males, females = self.group_by_gender(cage_num, alive_only=True)
+        mother_record, record = self.weaned_record(strain, males, females)
+        # Set mother's status back to breeding and remove weaning date
+        with self.write_buffer(airtable) as buffer:
+            buffer.update(mother_record["id"],
+                          {self.status_col: self.breeding,
+                           self.weaning_date_col: None})
+        # airtable leaves cleared fields out of the returned record
+        self.track_writes([{"id": mother_record["id"],
+                            "fields": {self.status_col: self.breeding,
+                                       self.weaning_date_col: None}}])
+
+        # IDs come from a block reserved for this litter
+        IDs = self.reserve_IDs(male_num + female_num)
+        # Get next cohort letter
+        cohort = self.get_next_cohort(cage_num)
+
+        inserted = self.assign_weaned_mice(IDs.start - 1, record, cage_num,
+                                           cohort, female_num, female_cage,
+                                           female_cage2, max_females,
+                                           male_num, male_cage, male_cage2,
+                                           max_males)
+        self.check_IDs(airtable, inserted)
+
+    def check_weaned(self, parent_exists, cage_exists, female_num=0,
+                     female_cage=False, female_cage2=False, male_num=0,
+                     male_cage=False, male_cage2=False):
+        """
+        Validate the cages and litter size passed to weaned().
+
+        Args:
+            parent_exists: True if the parental cage has any mice.
+            cage_exists: Callable returning True if a target cage number
+                         has any mice.
+            female_num/female_cage/female_cage2/male_num/male_cage/male_cage2:
+                As passed to weaned().
+        """
         # Original cage must exist and new ones must not
-        assert airtable.search(self.cage_card_col, cage_num) != [],\
-               "Cage does not exist"
+        assert parent_exists, "Cage does not exist"
         if male_cage:
-            assert airtable.search(self.cage_card_col, male_cage) == [],\
-                   "Cage already alocated"
+            assert not cage_exists(male_cage), "Cage already alocated"
             assert male_cage not in [male_cage2, female_cage, female_cage2],\
                    "Cage has been assigned twice"
         if male_cage2:
-            assert airtable.search(self.cage_card_col, male_cage2) == [],\
-                   "Cage already alocated"
+            assert not cage_exists(male_cage2), "Cage already alocated"
             assert male_cage2 not in [male_cage, female_cage, female_cage2],\
                    "Cage has been assigned twice"                    
         if female_cage:
-            assert airtable.search(self.cage_card_col, female_cage) == [],\
-                   "Cage already alocated"
+            assert not cage_exists(female_cage), "Cage already alocated"
             assert female_cage not in [male_cage, male_cage2, female_cage2],\
                    "Cage has been assigned twice"
         if female_cage2:
-            assert airtable.search(self.cage_card_col, female_cage2) == [],\
-                   "Cage already alocated"
+            assert not cage_exists(female_cage2), "Cage already alocated"
             assert female_cage2 not in [male_cage, male_cage2, female_cage],\
                    "Cage has been assigned twice"
         if male_num > 5:
@@ -567,18 +1101,39 @@ class Manipulate(Session):
         # Prevent accidental entries of too many offspring
         assert male_num <= 20, "Number of males too large"
         assert female_num <= 20, "Number of females too large"
-        if airtable.search(self.strain_col, strain) == []:
-            verify = input("You are about to enter a new strain that" +
+
+    def confirm_new_strain(self, strain_matches):
+        """
+        Ask before entering a strain that is not in the database.
+
+        Args:
+            strain_matches: Search results for the strain.
+
+        Returns:
+            True if the strain exists or the user chose to continue.
+        """
+        if strain_matches == []:
+            verify = self.ask("You are about to enter a new strain that" +
                            " is not in the database. Continue? y/n >")
             if verify == "y":
                 pass
             else:
-                print("--------------------")
-                print("Ending function call prematurely")
-                print("--------------------")
-                return
+                logger.warning("Ending function call prematurely")
+                return False
+        return True
+
+    def weaned_record(self, strain, males, females):
+        """
+        Build the column-value pairs shared by a weaned litter.
+
+        Args:
+            strain: The weaned litter's genetic strain.
+            males: List of male mice records in the parental cage.
+            females: List of female mice records in the parental cage.
 
-        males, females = self.group_by_gender(cage_num)
+        Returns:
+            The mother's record and the shared record dictionary.
+        """
         father_record, mother_record = self.get_parents(males, females)
         mother_ID = mother_record["fields"][self.animal_ID_col]
 
@@ -590,15 +1145,6 @@ class Manipulate(Session):
         # Calculate when pups were born (weaning date - 21 days):
         date_weaned = mother_record["fields"][self.weaning_date_col]
         date_born = get_date_born(date_weaned)
-        # Set mother's status back to breeding and remove weaning date
-        airtable.update_by_field(self.animal_ID_col, mother_ID,
-                                {self.status_col: self.breeding})
-        airtable.update_by_field(self.animal_ID_col, mother_ID,
-                                {self.weaning_date_col: None})
-
-        max_ID = self.get_max_ID()
-        # Get next cohort letter
-        cohort = self.get_next_cohort(cage_num)
         # All offspring share these values
         record = {
             self.status_col: self.available, self.strain_col: str(strain),
@@ -607,35 +1153,328 @@ class Manipulate(Session):
         }
 
         # Change record's status to colony maintenance if genotyping is necessary
-        record = self.genotype_maintenance(strain, ['-Cre','DF16A'], record)
+        record = self.genotype_maintenance(strain, self.genotyped_markers,
+                                           record)
+        return mother_record, record
+
+    @traced
+    def get_pedigree(self, refresh=False):
+        """
+        Returns the colony's Pedigree (see pedigree.py).
+
+        The lineage columns of every mouse are fetched once per session;
+        pups inserted by weaned() are added to it as they are written.
+
+        Args:
+            refresh: Fetch the lineage columns again.
+        """
+        if self._pedigree is None or refresh:
+            airtable = self.Authenticate(self.base_key, self.table_name,
+                                         self.API_key)
+            records = airtable.get_all(fields=[self.animal_ID_col,
+                                               self.father_ID_col,
+                                               self.mother_ID_col])
+            self._pedigree = Pedigree(records, self.animal_ID_col,
+                                      self.father_ID_col, self.mother_ID_col)
+        return self._pedigree
+
+    @traced
+    def get_kinship(self, refresh=False):
+        """
+        Returns the Kinship matrix of the live mice (see kinship.py).
+
+        Built once per session from the pedigree (needs NumPy); litters
+        inserted by weaned() are added to it incrementally.
+
+        Args:
+            refresh: Fetch the pedigree and live mice again.
+        """
+        if self._kinship is None or refresh:
+            pedigree = self.get_pedigree(refresh)
+            airtable = self.Authenticate(self.base_key, self.table_name,
+                                         self.API_key)
+            live = airtable.query(self.alive(), fields=[self.animal_ID_col])
+            self._kinship = Kinship(pedigree,
+                                    [record["fields"][self.animal_ID_col]
+                                     for record in live
+                                     if self.animal_ID_col in record["fields"]])
+        return self._kinship
+
+    @traced
+    def best_partners(self, animal_ID, limit=10):
+        """
+        Live mice of the opposite sex, least related first.
+
+        Args:
+            animal_ID: The mouse to find partners for.
+            limit: Number of partners returned.
+
+        Returns: List of (animal ID, kinship).
+        """
+        airtable = self.Authenticate(self.base_key, self.table_name,
+                                     self.API_key)
+        record = airtable.search(self.animal_ID_col, animal_ID,
+                                 fields=[self.gender_col], max_records=1)
+        assert record, "Animal ID does not exist"
+        gender = self.female\
+            if record[0]["fields"].get(self.gender_col) == self.male\
+            else self.male
+        candidates = airtable.query(AND(eq(self.gender_col, gender),
+                                        self.alive()),
+                                    fields=[self.animal_ID_col])
+        return self.get_kinship().best_partners(
+            animal_ID, [candidate["fields"][self.animal_ID_col]
+                        for candidate in candidates
+                        if self.animal_ID_col in candidate["fields"]], limit)
+
+    @traced
+    def get_schedule(self, refresh=False):
+        """
+        Returns the Schedule of upcoming weanings, retirements and overdue
+        litters (see schedule.py).
+
+        The scheduled columns of every mouse are fetched once per session;
+        writes made by this session update it.
+
+        Args:
+            refresh: Fetch the columns again.
+        """
+        if self._schedule is None or refresh:
+            airtable = self.Authenticate(self.base_key, self.table_name,
+                                         self.API_key)
+            records = airtable.get_all(fields=[
+                self.animal_ID_col, self.cage_card_col, self.status_col,
+                self.gender_col, self.born_col, self.weaning_date_col,
+                self.breeding_date_col])
+            self._schedule = Schedule(
+                records, self.retirement_days, self.no_litter_days,
+                self.animal_ID_col, self.cage_card_col, self.status_col,
+                self.gender_col, self.born_col, self.weaning_date_col,
+                self.breeding_date_col, self.breeding, self.pups, self.female)
+        return self._schedule
+
+    @traced
+    def get_cages(self, refresh=False):
+        """
+        Returns the CageIndex of the cage cards in use (see cages.py).
+
+        The cage card column is fetched once per session; writes made by
+        this session update it.
+
+        Args:
+            refresh: Fetch the column again.
+        """
+        if self._cages is None or refresh:
+            airtable = self.Authenticate(self.base_key, self.table_name,
+                                         self.API_key)
+            self._cages = CageIndex(
+                airtable.get_all(fields=[self.cage_card_col]),
+                self.cage_card_col)
+        return self._cages
+
+    def taken_cages(self, airtable, cages):
+        """
+        The cage numbers among cages that any mouse record has.
+
+        In snapshot mode a built cage index answers. Otherwise the cages
+        are looked up with one query, since another session may have used
+        them since the index was built; the index is corrected with what
+        the query finds.
+
+        Args:
+            cages: Cage numbers (False or None entries are skipped).
+
+        Returns: Set of the taken cage numbers, as strings.
+        """
+        cages = [cage for cage in cages if cage]
+        if not cages:
+            return set()
+        if self.snapshot and self._cages is not None:
+            return set(str(cage) for cage in cages
+                       if not self._cages.is_free(cage))
+        return set(str(record["fields"].get(self.cage_card_col))
+                   for record in self._query_cages(airtable, cages))
+
+    def _query_cages(self, airtable, cages):
+        # The records with any of the cage numbers, in one query
+        records = airtable.query(OR(*[eq(self.cage_card_col, cage)
+                                      for cage in cages]),
+                                 fields=[self.cage_card_col])
+        if self._cages is not None:
+            for record in records:
+                self._cages.update(record["id"], record["fields"])
+        return records
+
+    @traced
+    def allocate_cages(self, count, exclude=()):
+        """
+        The lowest free cage numbers of self.cage_range.
+
+        Free cages are taken from the cage index. Outside snapshot mode
+        another session may have used some of them since the index was
+        built, so they are checked with one query and the search repeated
+        past any that are taken.
+
+        Args:
+            count: Number of cages needed.
+            exclude: Cage numbers not to hand out.
+
+        Returns: List of cage numbers.
+        """
+        if not count:
+            return []
+        cages = self.get_cages()
+        airtable = self.Authenticate(self.base_key, self.table_name,
+                                     self.API_key)
+        first, last = self.cage_range
+        while True:
+            free = cages.free(count, first, last, exclude)
+            if self.snapshot:
+                return free
+            if not self._query_cages(airtable, free):
+                return free
+
+    def weaning_cages(self, female_num=0, female_cage=False,
+                      female_cage2=False, max_females=5, male_num=0,
+                      male_cage=False, male_cage2=False, max_males=5):
+        """
+        Allocate the cages a weaned litter needs but was not given.
+
+        Takes the cage arguments of weaned().
+
+        Returns:
+            female_cage, female_cage2, male_cage, male_cage2
+        """
+        cages = [female_cage, female_cage2, male_cage, male_cage2]
+        needed = [female_num > 0, female_num > max_females, male_num > 0,
+                  male_num > max_males]
+        missing = [slot for slot in range(4) if needed[slot]
+                   and not cages[slot]]
+        allocated = self.allocate_cages(len(missing), exclude=[
+            cage for cage in cages if cage])
+        for slot, cage in zip(missing, allocated):
+            cages[slot] = cage
+            logger.info("Cage " + str(cage) + " allocated")
+        return cages
+
+    @traced
+    def load_mice(self, view=None):
+        """
+        Returns every mouse (or those in a view) as MouseRecords.
+
+        Pages are converted as they are downloaded, so only one page of
+        record dictionaries is held at a time.
+
+        Args:
+            view: View to read (default is the whole table).
+        """
+        airtable = self.Authenticate(self.base_key, self.table_name,
+                                     self.API_key)
+        options = {} if view is None else {"view": view}
+        return list(self.record_model().load_pages(
+            self.record_pages(airtable, **options)))
+
+    def record_pages(self, airtable, **options):
+        """
+        The records get_all() would return, one page at a time as they are
+        downloaded, so a scan of the table does not hold it all at once.
+
+        A snapshot or unit of work answers in one go instead, since it
+        holds the records already or lays its staged values over them.
+
+        Keyword Args:
+            Same as get_all (fields, view, sort, ...).
+        """
+        if self.snapshot or self._unit is not None:
+            return [airtable.get_all(**options)]
+        return airtable.get_iter(**options)
 
-        self.assign_weaned_mice(max_ID, record, cage_num, cohort, female_num, female_cage,
-                                female_cage2, max_females, male_num,
-                                male_cage, male_cage2, max_males)
+    @traced
+    def get_columns(self, view=None):
+        """
+        Returns ColonyColumns of the table (see columns.py) for counts by
+        status, strain or cage, age histograms and cage occupancy.
+
+        Only the columns it holds are fetched.
 
+        Args:
+            view: View to read (default is the whole table).
+        """
+        airtable = self.Authenticate(self.base_key, self.table_name,
+                                     self.API_key)
+        options = {} if view is None else {"view": view}
+        records = airtable.get_all(fields=[
+            self.ID_col, self.cage_card_col, self.animal_ID_col,
+            self.status_col, self.strain_col, self.gender_col, self.born_col,
+            self.weaning_date_col, self.breeding_date_col], **options)
+        return ColonyColumns(records, self.ID_col, self.cage_card_col,
+                             self.animal_ID_col, self.status_col,
+                             self.strain_col, self.gender_col, self.born_col,
+                             self.weaning_date_col, self.breeding_date_col,
+                             dead_statuses=(self.SACed, self.dead))
+
+    @traced
     def get_negatives(self):
+        """
+        Find cages where every mouse is Cre negative ("-Cren" strain).
+
+        Returns: List of cage numbers
+        """
+        return self.cages_where(
+            lambda fields: "-Cren" in fields.get(self.strain_col, ""),
+            [self.strain_col])
+
+    @traced
+    def cages_where(self, predicate, fields=(), view=None):
+        """
+        Find cages where every mouse matches a condition.
+
+        A cage is listed if it has a mouse in the view, and judged on every
+        mouse with its cage card, including ones no longer in the view
+        (e.g. a SACed mouse still carrying the card). The table is read
+        once, page by page, with only the needed columns; a view that can
+        be evaluated locally (see self.local_views) is checked on the same
+        pages, any other view costs a second listing of just the cage
+        cards.
+
+        Args:
+            predicate: Function taking a record's fields dictionary and
+                       returning True if the mouse matches.
+            fields: Columns the predicate reads.
+            view: View whose cages are considered (default is
+                  self.main_view).
+
+        Returns:
+            List of cage numbers, in table order.
+        """
         airtable = self.Authenticate(self.base_key, self.table_name, self.API_key)
+        view = view or self.main_view
+        in_view = self.local_views.get(view)
+        columns = [self.cage_card_col] + list(fields)
+        listed = set()
+        if in_view is None:
+            for page in self.record_pages(airtable, view=view,
+                                          fields=[self.cage_card_col]):
+                listed.update(record["fields"].get(self.cage_card_col)
+                              for record in page)
+        else:
+            columns += [name for name in in_view.fields()
+                        if name not in columns]
+
+        # Cage --> True while every mouse seen in it matches
+        matching = {}
+        for page in self.record_pages(airtable, fields=columns):
+            for record in page:
+                cage = record["fields"].get(self.cage_card_col)
+                if cage is None:
+                    continue
+                matching[cage] = matching.get(cage, True)\
+                    and bool(predicate(record["fields"]))
+                if in_view is not None and in_view.matches(record["fields"]):
+                    listed.add(cage)
+        return [cage for cage, matches in matching.items()
+                if matches and cage in listed]
 
-        cre_cages = []
-        for record in airtable.get_all(view=self.main_view):
-            if "-Cre" in record["fields"][self.strain_col] and\
-                record["fields"][self.cage_card_col] not in cre_cages:
-                cre_cages.append(record["fields"][self.cage_card_col])
-                
-        negative_cages = []
-        for cage in cre_cages:
-            records = airtable.search(self.cage_card_col, cage)
-            all_negatives = True
-            for record in records:
-                if '-Cren' in record["fields"][self.strain_col]:
-                    pass
-                else:
-                    all_negatives = False
-                    break
-            if all_negatives:
-                negative_cages.append(cage)
-        return negative_cages
-                
 
 def get_date_born(date_weaned):
     """
@@ -656,4 +1495,21 @@ def get_date_born(date_weaned):
     date_born = (str(date_born.month) + "/" + str(date_born.day)
                 + "/" + str(date_born.year))
 
-    return date_born
\ No newline at end of file
+    return date_born
+
+
+def next_cohort(cohort):
+    """
+    Return the cohort following cohort.
+
+    "A" --> "B", ..., "Z" --> "AA", "AZ" --> "BA", ...
+    """
+    letters = list(cohort)
+    i = len(letters) - 1
+    while i >= 0 and letters[i] == "Z":
+        letters[i] = "A"
+        i -= 1
+    if i < 0:
+        return "A" + "".join(letters)
+    letters[i] = chr(ord(letters[i]) + 1)
+    return "".join(letters)
@@ -0,0 +1,312 @@
+"""
+Asyncio counterpart of the Manipulate class.
+
+weaned() and set_breeding() run their independent validation lookups
+concurrently with asyncio.gather, so a call waits roughly as long as the
+slowest lookup instead of the sum of all of them. Validation and error
+messages are shared with Manipulate.
+
+Classes:
+    ThreadTransport: Default async transport, runs the blocking Airtable
+                     methods in a thread pool.
+    AsyncManipulate: Manipulate with coroutine weaned() and set_breeding().
+"""
+
+import asyncio
+import contextvars
+import datetime
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import HTTPError
+
+from ADP import Manipulate
+from session_dir.predicates import AND, eq
+from session_dir.tracing import traced
+from session_dir.write_buffer import MAX_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadTransport(object):
+    """
+    Async transport over a blocking Airtable object.
+
+    Any object providing the same coroutine methods (get, search,
+    search_prefix, query, get_all, insert, update, batch_insert,
+    batch_update) can be passed to
+    AsyncManipulate instead, e.g. one built on an async HTTP library.
+    """
+
+    def __init__(self, airtable, max_workers=5):
+        """
+        Args:
+            airtable: The Airtable object requests are sent through.
+            max_workers: Requests that may be in flight at once.
+        """
+        self.airtable = airtable
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def _call(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # The worker thread runs in the caller's context, so its requests
+        # are traced against the operation that made them
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(
+                context.run, getattr(self.airtable, method), *args, **kwargs))
+
+    async def get(self, record_id):
+        return await self._call("get", record_id)
+
+    async def search(self, field_name, field_value, **options):
+        return await self._call("search", field_name, field_value, **options)
+
+    async def query(self, predicate, **options):
+        return await self._call("query", predicate, **options)
+
+    async def search_prefix(self, field_name, prefix, **options):
+        return await self._call("search_prefix", field_name, prefix,
+                                **options)
+
+    async def get_all(self, **options):
+        return await self._call("get_all", **options)
+
+    async def insert(self, fields, typecast=False):
+        return await self._call("insert", fields, typecast)
+
+    async def update(self, record_id, fields, typecast=False):
+        return await self._call("update", record_id, fields, typecast)
+
+    async def batch_insert(self, records, typecast=False):
+        return await self._call("batch_insert", records, typecast)
+
+    async def batch_update(self, records, typecast=False):
+        return await self._call("batch_update", records, typecast)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class AsyncManipulate(Manipulate):
+    """
+    Manipulate whose weaned() and set_breeding() are coroutines.
+
+    All other methods are inherited unchanged and stay synchronous.
+
+    >>> mytable = AsyncManipulate('base_key', 'table_name', 'API_key')
+    >>> asyncio.run(mytable.weaned(5303, 'WT', female_num=4,
+    ...                            female_cage=5401))
+    """
+
+    def __init__(self, *args, transport=None, **kwargs):
+        """
+        Takes the same arguments as Manipulate, plus:
+            transport: Async transport (default: ThreadTransport over the
+                       session's pooled client).
+        """
+        super(AsyncManipulate, self).__init__(*args, **kwargs)
+        self._transport = transport
+        self._threads = None
+
+    @property
+    def transport(self):
+        if self._transport is not None:
+            return self._transport
+        if self._threads is None:
+            self._threads = ThreadTransport(None)
+        # Resolved on every use, so requests go to the unit of work or
+        # staged table active at the time, and never to a finished one
+        self._threads.airtable = self.Authenticate(self.base_key,
+                                                   self.table_name,
+                                                   self.API_key)
+        return self._threads
+
+    def close(self):
+        if self._threads is not None:
+            self._threads.close()
+            self._threads = None
+        super(AsyncManipulate, self).close()
+
+    async def _run(self, function, *args, **kwargs):
+        # A blocking Manipulate call (e.g. allocate_cages()), run in a
+        # worker thread so the event loop keeps serving other coroutines
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, functools.partial(
+            context.run, function, *args, **kwargs))
+
+    async def _get_next_cohort(self, cage_num):
+        matches = await self.transport.search_prefix(
+            self.animal_ID_col, str(cage_num) + "-",
+            fields=[self.animal_ID_col])
+        return self.next_cohort_from(cage_num, matches)
+
+    async def _find_mouse(self, animal_ID):
+        # Same as Manipulate.find_mouse() over the async transport
+        record_id = None if self.snapshot else self.record_ids.get(animal_ID)
+        if record_id is not None:
+            try:
+                record = await self.transport.get(record_id)
+            except HTTPError as exception:
+                if exception.response is None\
+                        or exception.response.status_code != 404:
+                    raise
+                self.record_ids.discard(record_id)
+            else:
+                if self.is_mouse(record, animal_ID):
+                    return [record]
+        return await self.transport.search(self.animal_ID_col, animal_ID)
+
+    async def _cage_exists(self, cage_num):
+        matches = await self.transport.search(
+            self.cage_card_col, cage_num, fields=[self.cage_card_col],
+            max_records=1)
+        return matches != []
+
+    async def _get_max_ID(self, fresh=False):
+        # Same as Manipulate.get_max_ID(); a snapshot does not see the IDs
+        # other sessions have used, so a fresh read asks airtable
+        if fresh and self.snapshot:
+            await self._run(self.get_max_ID, True)
+            return
+        records = await self.transport.get_all(sort="-" + self.ID_col,
+                                               max_records=1)
+        self.id_allocator.observe(records[0]["fields"][self.ID_col])
+
+    async def _check_IDs(self, inserted, attempts=5):
+        # Same as Manipulate.check_IDs() over the async transport; held
+        # writes are checked once they are committed
+        if not inserted or not self.verify_IDs or self._unit is not None\
+                or self._staged is not None:
+            return inserted
+        for _ in range(attempts):
+            IDs = [int(record["fields"][self.ID_col]) for record in inserted]
+            existing = await self.transport.get_all(
+                formula=self.ID_range_formula(min(IDs), max(IDs)),
+                fields=[self.ID_col])
+            losers = self.id_allocator.collisions(inserted, existing,
+                                                  self.ID_col)
+            if not losers:
+                return inserted
+            # Another session has used IDs past the cached mark
+            await self._get_max_ID(fresh=True)
+            new_IDs = self.id_allocator.reserve(len(losers))
+            moved = await self._batch("batch_update", [
+                {"id": record["id"], "fields": {self.ID_col: str(ID)}}
+                for record, ID in zip(losers, new_IDs)])
+            for record, ID in zip(losers, new_IDs):
+                logger.warning("ID collision: "
+                               + record["fields"][self.animal_ID_col]
+                               + " moved to ID " + str(ID))
+            moved = {record["id"]: record for record in moved}
+            inserted = [moved.get(record["id"], record) for record in inserted]
+        assert False, "Could not assign unique IDs to the weaned mice"
+
+    async def _batch(self, method, records):
+        # Chunks are sent concurrently; gather keeps them in order
+        chunks = [records[i:i + MAX_BATCH_SIZE]
+                  for i in range(0, len(records), MAX_BATCH_SIZE)]
+        results = await asyncio.gather(*[getattr(self.transport, method)(chunk)
+                                         for chunk in chunks])
+        return [record for chunk in results for record in chunk]
+
+    @traced
+    async def set_breeding(self, cage_num, month, day, year, male_ID,
+                           female_ID, female_ID2=False):
+        """
+        Coroutine version of Manipulate.set_breeding().
+
+        The animal and cage lookups (or the cage allocation) are sent
+        concurrently.
+        """
+        date = datetime.date(year, month, day)
+        allocated = cage_num is None
+        lookups = [self._find_mouse(male_ID), self._find_mouse(female_ID),
+                   self._run(self.allocate_cages, 1) if allocated
+                   else self.transport.search(self.cage_card_col, cage_num,
+                                              fields=[self.cage_card_col],
+                                              max_records=1)]
+        if female_ID2:
+            lookups.append(self._find_mouse(female_ID2))
+        results = await asyncio.gather(*lookups)
+        male_record, female_record, cage_matches = results[:3]
+        female_record2 = results[3] if female_ID2 else None
+        if allocated:
+            # Allocated cages are free, so there is nothing to confirm
+            cage_num, cage_matches = cage_matches[0], []
+
+        self.check_breeding(male_record, female_record, female_record2)
+        self.check_relatedness(male_ID, female_ID, female_ID2)
+        if not self.confirm_cage(cage_matches):
+            return
+
+        updated = await self._batch("batch_update", self.breeding_updates(
+            cage_num, date, male_record, female_record, female_record2))
+        self.track_writes(updated)
+        self.report_breeding(cage_num, date, male_ID, female_ID, female_ID2)
+
+    @traced
+    async def weaned(self, cage_num, strain, female_num=0, female_cage=False,
+                     female_cage2=False, max_females=5, male_num=0,
+                     male_cage=False, male_cage2=False, max_males=5):
+        """
+        Coroutine version of Manipulate.weaned().
+
+        The parental cage, parents, target cages, strain and max ID lookups
+        and the allocation of missing cages are sent concurrently.
+
+        Returns:
+            The inserted records, in the order the mice were assigned.
+        """
+        target_cages = [cage for cage in (male_cage, male_cage2, female_cage,
+                                          female_cage2) if cage]
+        # Allocated cages are known to be free, so only given ones are
+        # looked up
+        max_lookup = self._get_max_ID() if self.id_allocator.needs_max()\
+            else asyncio.sleep(0)
+        results = await asyncio.gather(
+            self.transport.query(AND(eq(self.cage_card_col, cage_num),
+                                     self.alive()),
+                                 fields=self.parent_fields()),
+            self._cage_exists(cage_num),
+            self.transport.search(self.strain_col, strain,
+                                  fields=[self.strain_col], max_records=1),
+            max_lookup,
+            self._run(self.weaning_cages, female_num, female_cage,
+                      female_cage2, max_females, male_num, male_cage,
+                      male_cage2, max_males),
+            *[self._cage_exists(cage) for cage in target_cages])
+        parents, parent_exists, strain_matches = results[:3]
+        female_cage, female_cage2, male_cage, male_cage2 = results[4]
+        cage_exists = dict(zip(target_cages, results[5:]))
+
+        self.check_weaned(parent_exists, cage_exists.get, female_num,
+                          female_cage, female_cage2, male_num, male_cage,
+                          male_cage2)
+        if not self.confirm_new_strain(strain_matches):
+            return
+
+        males, females = self.split_by_gender(parents)
+        mother_record, record = self.weaned_record(strain, males, females)
+        IDs = self.id_allocator.reserve(male_num + female_num)
+        # Set mother's status back to breeding and remove weaning date
+        # while the next cohort letter is looked up
+        cohort, _ = await asyncio.gather(
+            self._get_next_cohort(cage_num),
+            self.transport.update(mother_record["id"],
+                                  {self.status_col: self.breeding,
+                                   self.weaning_date_col: None}))
+
+        mice = self.plan_weaned_mice(IDs.start - 1, record, cage_num, cohort,
+                                     female_num, female_cage, female_cage2,
+                                     max_females, male_num, male_cage,
+                                     male_cage2, max_males)
+        inserted = await self._batch("batch_insert", mice)
+        self.track_writes([{"id": mother_record["id"],
+                            "fields": {self.status_col: self.breeding,
+                                       self.weaning_date_col: None}}]
+                          + inserted)
+        self.add_to_pedigree(inserted)
+        return await self._check_IDs(inserted)
@@ -0,0 +1,345 @@
+"""
+Benchmarks of the Manipulate workflows against a simulated airtable base.
+
+Each workflow runs on a generated colony of 1k to 200k mice kept by a
+MemoryBackend that adds a fixed latency to every request. For each
+operation the wall time (compute plus simulated network wait), the number
+of HTTP requests and the bytes transferred are reported and compared with
+the budgets recorded in benchmark_budgets.json, kept separately for the
+direct and snapshot modes. Any operation over budget fails the run.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --rows 1000 10000 200000 --latency 0.2
+    python benchmark.py --record     # accept the current numbers as budgets
+
+Functions:
+    build_colony:
+        Fill a backend table with a realistic colony.
+    run_benchmarks:
+        Measure every operation at the given table sizes.
+    check_budgets:
+        Mark the measurements that exceed their budget.
+    record_budgets:
+        Budgets with headroom from a set of measurements.
+    main:
+        Command line entry point.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from ADP import Manipulate, next_cohort
+from session_dir.backends import MemoryBackend
+from session_dir.id_allocator import IDAllocator
+
+TABLE = "Mice"
+BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "benchmark_budgets.json")
+# Weaned litter sizes benchmarked
+LITTERS = [1, 5, 10, 20, 40]
+STRAINS = ["WT", "DF16A x WT", "Ai14-Cren", "Cdh5-Cre x WT", "C57BL/6"]
+# Kinds of cage, repeated in this order until the table is full
+CAGE_KINDS = ["breeding", "litter", "stock", "stock", "retired"]
+# Slack allowed over the measured numbers when budgets are recorded
+HEADROOM = {"requests": 1.0, "bytes": 1.1, "seconds": 1.25}
+METRICS = ["requests", "bytes", "seconds"]
+
+
+class Colony(object):
+    """
+    Cage numbers of each kind in a generated colony.
+
+    Benchmarks take() cages so that every operation works on cages
+    no earlier operation has changed.
+    """
+
+    def __init__(self):
+        self.cages = {kind: [] for kind in CAGE_KINDS}
+        self.mice = {}
+        self.next_free = None
+
+    def take(self, kind, condition=None):
+        cages = self.cages[kind]
+        for i in range(len(cages) - 1, -1, -1):
+            if condition is None or condition(cages[i]):
+                return cages.pop(i)
+        assert False, "No " + kind + " cage left"
+
+    def free_cage(self):
+        self.next_free += 1
+        return self.next_free
+
+
+def build_colony(backend, rows, table_name=TABLE):
+    """
+    Fill a backend table with a colony of about rows mice.
+
+    Breeding cages hold a breeding pair, litter cages a pair whose pups are
+    due to be weaned, stock cages 4 available mice of one sex and retired
+    cages mice that were SACed or died.
+
+    Returns: Colony
+    """
+    colony = Colony()
+    records = []
+    # Parental cage --> mice born there so far
+    born = {}
+
+    def add_mouse(cage, parent, gender, status, strain, **fields):
+        count = born.get(parent, 0)
+        born[parent] = count + 1
+        cohort = "A"
+        for _ in range(count // 10):
+            cohort = next_cohort(cohort)
+        animal_ID = str(parent) + "-" + cohort + str(count % 10 + 1)
+        fields.update({"ID": str(len(records) + 1), "Animal ID": animal_ID,
+                       "Cage Card": str(cage), "Gender": gender,
+                       "Status": status, "Strain": strain,
+                       "Born": "3/1/2019"})
+        records.append(fields)
+        colony.mice.setdefault(cage, []).append(animal_ID)
+
+    cage = 1000
+    parent = 100
+    while len(records) < rows:
+        kind = CAGE_KINDS[(cage - 1000) % len(CAGE_KINDS)]
+        strain = STRAINS[(cage // len(CAGE_KINDS)) % len(STRAINS)]
+        if kind == "breeding":
+            add_mouse(cage, parent, "M", "B: Breeding", strain)
+            add_mouse(cage, parent, "F", "B: Breeding", strain)
+        elif kind == "litter":
+            add_mouse(cage, parent, "M", "B: Breeding", strain)
+            add_mouse(cage, parent, "F", "P: With Pups", strain,
+                      **{"Weaning Date": "4/12/2019"})
+            parent = cage
+        elif kind == "stock":
+            gender = "M" if cage % 2 else "F"
+            for _ in range(4):
+                add_mouse(cage, parent, gender, "A: Available", strain)
+        else:
+            add_mouse(cage, parent, "M", "S: Sacrificed", strain)
+            add_mouse(cage, parent, "F", "D: Died", strain)
+            add_mouse(cage, parent, "F", "S: Sacrificed", strain)
+        colony.cages[kind].append(cage)
+        cage += 1
+    colony.next_free = cage + 1000
+    backend.add_records(table_name, records[:rows])
+    return colony
+
+
+def set_breeding(mytable, colony):
+    male = colony.mice[colony.take("stock", lambda cage: cage % 2)][0]
+    female = colony.mice[colony.take("stock", lambda cage: not cage % 2)][0]
+    mytable.set_breeding(colony.free_cage(), 10, 11, 2019, male, female)
+
+
+def birth(mytable, colony):
+    mytable.birth(colony.take("breeding"), 10, 11, 2019)
+
+
+def weaned(litter):
+    def wean(mytable, colony):
+        females = litter // 2
+        males = litter - females
+        mytable.weaned(colony.take("litter"), "WT", female_num=females,
+                       female_cage=colony.free_cage() if females else False,
+                       female_cage2=colony.free_cage() if females > 5
+                       else False,
+                       max_females=max(5, int(math.ceil(females / 2.0))),
+                       male_num=males, male_cage=colony.free_cage(),
+                       male_cage2=colony.free_cage() if males > 5 else False,
+                       max_males=max(5, int(math.ceil(males / 2.0))))
+    return wean
+
+
+def SAC_cage(mytable, colony):
+    mytable.SAC_cage(colony.take("stock"))
+
+
+def get_next_cohort(mytable, colony):
+    mytable.get_next_cohort(colony.cages["litter"][0])
+
+
+def get_negatives(mytable, colony):
+    mytable.get_negatives()
+
+
+def operations():
+    """
+    Returns: List of (name, function(mytable, colony)) pairs.
+    """
+    return [("set_breeding", set_breeding), ("birth", birth)]\
+        + [("weaned_" + str(litter), weaned(litter)) for litter in LITTERS]\
+        + [("SAC_cage", SAC_cage), ("get_next_cohort", get_next_cohort),
+           ("get_negatives", get_negatives)]
+
+
+class Measurement(object):
+    """
+    Cost of one operation at one table size.
+    """
+
+    def __init__(self, name, rows, requests, bytes, seconds):
+        self.name = name
+        self.rows = rows
+        self.requests = requests
+        self.bytes = bytes
+        self.seconds = seconds
+        # Metrics over budget, filled in by check_budgets()
+        self.over = []
+        self.budget = None
+
+    def summary(self):
+        line = "{:<16} {:>7} {:>6} {:>10} {:>9.3f}".format(
+            self.name, self.rows, self.requests, self.bytes, self.seconds)
+        if self.budget is None:
+            return line + "  no budget"
+        if self.over:
+            return line + "  OVER " + ", ".join(
+                metric + " > " + str(self.budget[metric])
+                for metric in self.over)
+        return line + "  ok"
+
+
+def measure(backend, colony, name, rows, operation, snapshot=False):
+    mytable = Manipulate("benchmark", TABLE, snapshot=snapshot,
+                         backend=backend)
+    # A fresh allocator, so every run pays for the max ID query once
+    mytable.id_allocator = IDAllocator()
+    mytable.ask = lambda prompt: "y"
+    backend.views[mytable.main_view] = mytable.alive()
+    backend.reset_stats()
+    start = time.perf_counter()
+    operation(mytable, colony)
+    elapsed = time.perf_counter() - start
+    mytable.close()
+    stats = backend.stats()
+    # Simulated waits are added, real ones are already in elapsed
+    if backend.sleep is not time.sleep:
+        elapsed += stats["wait_time"]
+    return Measurement(name, rows, stats["requests"],
+                       stats["bytes_sent"] + stats["bytes_received"], elapsed)
+
+
+def run_benchmarks(rows=(1000, 10000), latency=0.2, snapshot=False,
+                   real_sleep=False):
+    """
+    Measure every operation at the given table sizes.
+
+    Args:
+        rows: Table sizes to benchmark.
+        latency: Seconds added to every request.
+        snapshot: Run the operations in snapshot mode.
+        real_sleep: Wait out the latency instead of adding it to the time.
+
+    Returns: List of Measurement.
+    """
+    results = []
+    for size in rows:
+        backend = MemoryBackend(latency, sleep=time.sleep if real_sleep
+                                else lambda seconds: None)
+        colony = build_colony(backend, size)
+        for name, operation in operations():
+            results.append(measure(backend, colony, name, size, operation,
+                                   snapshot))
+    return results
+
+
+def check_budgets(results, budgets, metrics=METRICS):
+    """
+    Mark the measurements that exceed their budget.
+
+    Args:
+        results: List of Measurement.
+        budgets: Dictionary of rows --> operation --> metric --> budget.
+        metrics: Metrics to check.
+
+    Returns: List of the measurements over budget.
+    """
+    over = []
+    for result in results:
+        result.budget = budgets.get(str(result.rows), {}).get(result.name)
+        if result.budget is None:
+            continue
+        result.over = [metric for metric in metrics if metric in result.budget
+                       and getattr(result, metric) > result.budget[metric]]
+        if result.over:
+            over.append(result)
+    return over
+
+
+def record_budgets(results, budgets=None):
+    """
+    Budgets with headroom from a set of measurements, merged into budgets.
+    """
+    budgets = dict(budgets or {})
+    for result in results:
+        budgets.setdefault(str(result.rows), {})[result.name] = {
+            "requests": int(math.ceil(result.requests
+                                      * HEADROOM["requests"])),
+            "bytes": int(math.ceil(result.bytes * HEADROOM["bytes"])),
+            "seconds": round(result.seconds * HEADROOM["seconds"], 3)}
+    return budgets
+
+
+def load_budgets(path=BUDGETS):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as budget_file:
+        return json.load(budget_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Manipulate workflows against a simulated "
+                    "airtable base.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000],
+                        help="table sizes (default: 1000 10000)")
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="seconds per request (default: 0.2)")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="run the workflows in snapshot mode")
+    parser.add_argument("--real-sleep", action="store_true",
+                        help="wait out the latency instead of simulating it")
+    parser.add_argument("--budgets", default=BUDGETS,
+                        help="budget file (default: benchmark_budgets.json)")
+    parser.add_argument("--record", action="store_true",
+                        help="save the measurements as the new budgets")
+    options = parser.parse_args(argv)
+
+    results = run_benchmarks(options.rows, options.latency, options.snapshot,
+                             options.real_sleep)
+    mode = "snapshot" if options.snapshot else "direct"
+    budgets = load_budgets(options.budgets)
+    # Time budgets only hold for the latency they were recorded with
+    metrics = METRICS if options.latency == budgets.get("latency")\
+        else ["requests", "bytes"]
+    over = check_budgets(results, budgets.get(mode, {}), metrics)
+
+    print("{:<16} {:>7} {:>6} {:>10} {:>9}".format(
+        "operation", "rows", "reqs", "bytes", "seconds"))
+    for result in results:
+        print(result.summary())
+
+    if options.record:
+        budgets[mode] = record_budgets(results, budgets.get(mode))
+        budgets["latency"] = options.latency
+        with open(options.budgets, "w") as budget_file:
+            json.dump(budgets, budget_file, indent=2, sort_keys=True)
+            budget_file.write("\n")
+        print("Budgets saved to " + options.budgets)
+        return 0
+    print("--------------------")
+    print(str(len(over)) + " of " + str(len(results))
+          + " operations over budget")
+    print("--------------------")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
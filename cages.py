@@ -0,0 +1,127 @@
+"""
+Index of the cage cards in use.
+
+A cage is taken while any mouse record (dead ones included) carries its
+cage card, the same rule cage_exists() applies with a search. A CageIndex
+is built from one scan of the Cage Card column and kept current with the
+session's writes, so it answers "is cage X free" without a request and can
+hand out the lowest free cage numbers of a range.
+
+Numbered cages are also kept in a sorted list, so finding free cages only
+steps over the cages in use within the range asked for.
+
+>>> cages = mytable.get_cages()
+>>> cages.is_free(5402)
+>>> cages.free(3, 5000, 5999)
+[5001, 5002, 5005]
+
+Classes:
+    CageIndex: Cage card --> records using it.
+"""
+
+import bisect
+
+
+class CageIndex(object):
+    """
+    The cage cards in use, kept current by update().
+    """
+
+    def __init__(self, records=(), cage_card_col="Cage Card"):
+        """
+        Args:
+            records: Mice records with (at least) the cage card column.
+            cage_card_col: Name of the cage card column.
+        """
+        self.cage_card_col = cage_card_col
+        # Cage card --> number of records using it
+        self.counts = {}
+        # Record id --> its cage card
+        self.cage_of = {}
+        for record in records:
+            cage = record["fields"].get(cage_card_col)
+            if cage is not None and cage != "":
+                cage = str(cage)
+                self.cage_of[record["id"]] = cage
+                self.counts[cage] = self.counts.get(cage, 0) + 1
+        # Numbered cages in use, sorted
+        self.occupied = sorted(int(cage) for cage in self.counts
+                               if cage.isdigit())
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, cage):
+        return not self.is_free(cage)
+
+    def _add(self, record_id, cage):
+        self.cage_of[record_id] = cage
+        self.counts[cage] = self.counts.get(cage, 0) + 1
+        if self.counts[cage] == 1 and cage.isdigit():
+            bisect.insort(self.occupied, int(cage))
+
+    def _discard(self, record_id):
+        cage = self.cage_of.pop(record_id, None)
+        if cage is None:
+            return
+        self.counts[cage] -= 1
+        if self.counts[cage] == 0:
+            del self.counts[cage]
+            if cage.isdigit():
+                del self.occupied[bisect.bisect_left(self.occupied,
+                                                     int(cage))]
+
+    def update(self, record_id, fields):
+        """
+        Move a record to the cage card among the fields written, if any.
+        """
+        if self.cage_card_col not in fields:
+            return
+        self._discard(record_id)
+        cage = fields[self.cage_card_col]
+        if cage is not None and cage != "":
+            self._add(record_id, str(cage))
+
+    def remove(self, record_id):
+        """
+        Drop a deleted record.
+        """
+        self._discard(record_id)
+
+    def is_free(self, cage):
+        """
+        True if no record uses the cage card.
+        """
+        cage = str(cage)
+        if cage in self.counts:
+            return False
+        if not cage.isdigit():
+            return True
+        # "05100" and "5100" are the same cage
+        index = bisect.bisect_left(self.occupied, int(cage))
+        return index == len(self.occupied) or self.occupied[index] != int(cage)
+
+    def free(self, count, first, last, exclude=()):
+        """
+        The lowest free cage numbers from first to last (both included).
+
+        Args:
+            count: Number of cages needed.
+            exclude: Cage numbers not to hand out (e.g. already chosen).
+
+        Returns: List of count cage numbers, in increasing order.
+        """
+        exclude = set(str(cage) for cage in exclude)
+        cages = []
+        index = bisect.bisect_left(self.occupied, first)
+        cage = first
+        while len(cages) < count and cage <= last:
+            while index < len(self.occupied) and self.occupied[index] < cage:
+                index += 1
+            if (index == len(self.occupied) or self.occupied[index] != cage)\
+                    and str(cage) not in exclude:
+                cages.append(cage)
+            cage += 1
+        assert len(cages) == count, "Not enough free cages from "\
+            + str(first) + " to " + str(last)
+        return cages
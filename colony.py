@@ -0,0 +1,110 @@
+"""
+Thin command line client for the colony daemon (see daemon.py).
+
+Only the standard library is imported, so a command starts in a few
+milliseconds and runs against the daemon's warm session instead of
+importing ADP and downloading the table itself.
+
+A request names an event and its columns, as in an events file (see
+events.py), given as column=value pairs:
+
+Usage:
+    python colony.py birth cage=5100 date=10/11/2019
+    python colony.py breeding cage=5400 date=8/1/2019 male=4881-D3 female=4727-A2
+    python colony.py weaned cage=5100 strain=WT female_num=3 male_num=4
+    python colony.py sac_mouse animal=4881-D4
+    python colony.py negatives
+
+Functions:
+    send:
+        Send one request to the daemon and return its response.
+    main:
+        Command line entry point.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Used when no socket path is given (or set in COLONY_SOCKET)
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".cache",
+                              "airtable-animal-database", "daemon.sock")
+
+
+def socket_path(path=None):
+    """
+    The daemon's socket: path, else $COLONY_SOCKET, else DEFAULT_SOCKET.
+    """
+    return os.path.expanduser(path or os.environ.get("COLONY_SOCKET")
+                              or DEFAULT_SOCKET)
+
+
+def send(request, path=None, timeout=None):
+    """
+    Send one request to the daemon.
+
+    Args:
+        request: Dictionary with an "event" and its columns.
+        path: The daemon's socket (see socket_path()).
+        timeout: Seconds to wait for the response (default is no limit).
+
+    Returns:
+        The response: dictionary with "status" ("ok", "failed" or
+        "declined"), "message", "output" (the messages logged) and
+        "result".
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_path(path))
+        connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with connection.makefile("rb") as response:
+            return json.loads(response.readline().decode("utf-8"))
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Send a colony event to the running daemon.")
+    parser.add_argument("event", help="birth, breeding, weaned, sac_cage, "
+                                      "sac_mouse, negatives or refresh")
+    parser.add_argument("columns", nargs="*", metavar="column=value",
+                        help="the event's columns, as in an events file")
+    parser.add_argument("--socket", default=None,
+                        help="daemon socket (default: COLONY_SOCKET or "
+                             + DEFAULT_SOCKET + ")")
+    parser.add_argument("--yes", action="store_true",
+                        help="answer yes to a confirmation prompt")
+    options = parser.parse_args(argv)
+
+    request = {"event": options.event}
+    for column in options.columns:
+        name, equals, value = column.partition("=")
+        if not equals:
+            parser.error("expected column=value, got " + repr(column))
+        request[name.strip()] = value.strip()
+    if options.yes:
+        request["confirm"] = "y"
+
+    try:
+        response = send(request, options.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print("No daemon is listening on " + socket_path(options.socket)
+              + "; start one with daemon.py", file=sys.stderr)
+        return 2
+    if response["output"]:
+        print(response["output"].rstrip())
+    if response["result"] is not None:
+        print(json.dumps(response["result"]))
+    if response["status"] != "ok":
+        print(response["status"] + ": " + response["message"],
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Columnar view of the mouse table for colony reports.
+
+A ColonyColumns object turns a list of records into NumPy arrays once: ID
+and cage number as integers, dates as day ordinals (parsed once per
+distinct M/D/YYYY string) and status, strain and gender as categorical
+codes. Counts, histograms and cage occupancy are then array operations
+instead of loops over record dictionaries. NumPy is only needed once a
+ColonyColumns is created.
+
+>>> columns = mytable.get_columns()
+>>> columns.counts("status")
+>>> columns.counts("strain", columns.alive())
+>>> columns.cage_occupancy()
+>>> columns.age_histogram(datetime.date(2019, 10, 11), width=7)
+
+Classes:
+    ColonyColumns: Column arrays of a mouse table.
+
+Functions:
+    date_ordinal:
+        Day ordinal of an M/D/YYYY date.
+"""
+
+import datetime
+
+# Stored for blank or unreadable numbers and dates
+MISSING = -1
+
+
+def date_ordinal(date):
+    """
+    Day ordinal (datetime.date.toordinal) of an M/D/YYYY date.
+
+    Returns: MISSING if the date is blank or not M/D/YYYY.
+    """
+    try:
+        month, day, year = [int(part) for part in str(date).split("/")]
+        return datetime.date(year, month, day).toordinal()
+    except ValueError:
+        return MISSING
+
+
+def _number(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+class ColonyColumns(object):
+    """
+    Column arrays of a mouse table.
+
+    Attributes:
+        ID, cage: Integer arrays (MISSING if blank).
+        born, weaning_date, breeding_date: Day ordinal arrays (MISSING if
+                                           blank).
+        status, strain, gender: Integer code arrays; categories[name][code]
+                                is the value a code stands for and a blank
+                                entry is the empty string.
+        animal_ID: List of animal IDs.
+
+    Query methods take an optional mask (a boolean array, e.g. from
+    alive() or where()) selecting the mice counted.
+    """
+
+    categorical = ["status", "strain", "gender"]
+
+    def __init__(self, records, ID_col="ID", cage_card_col="Cage Card",
+                 animal_ID_col="Animal ID", status_col="Status",
+                 strain_col="Strain", gender_col="Gender", born_col="Born",
+                 weaning_date_col="Weaning Date",
+                 breeding_date_col="Breeding Date",
+                 dead_statuses=("S: Sacrificed", "D: Died")):
+        """
+        Args:
+            records: Mice records.
+            *_col: Column names.
+            dead_statuses: Statuses of mice no longer in the colony.
+        """
+        import numpy
+        self.numpy = numpy
+        self.dead_statuses = list(dead_statuses)
+        fields = [record["fields"] for record in records]
+        self.animal_ID = [mouse.get(animal_ID_col, "") for mouse in fields]
+        self.ID = numpy.array([_number(mouse.get(ID_col))
+                               for mouse in fields], dtype=numpy.int64)
+        self.cage = numpy.array([_number(mouse.get(cage_card_col))
+                                 for mouse in fields], dtype=numpy.int64)
+        # Most mice share a few dates, so each string is parsed once
+        ordinals = {}
+
+        def dates(column):
+            values = []
+            for mouse in fields:
+                date = mouse.get(column)
+                if date not in ordinals:
+                    ordinals[date] = date_ordinal(date) if date else MISSING
+                values.append(ordinals[date])
+            return numpy.array(values, dtype=numpy.int32)
+
+        self.born = dates(born_col)
+        self.weaning_date = dates(weaning_date_col)
+        self.breeding_date = dates(breeding_date_col)
+
+        self.categories = {}
+        for name, column in [("status", status_col), ("strain", strain_col),
+                             ("gender", gender_col)]:
+            codes = {}
+            values = [codes.setdefault(mouse.get(column) or "", len(codes))
+                      for mouse in fields]
+            self.categories[name] = list(codes)
+            setattr(self, name, numpy.array(values, dtype=numpy.int32))
+
+    def __len__(self):
+        return len(self.animal_ID)
+
+    def code(self, name, value):
+        """
+        Code of a categorical value, or MISSING if no mouse has it.
+        """
+        categories = self.categories[name]
+        return categories.index(value) if value in categories else MISSING
+
+    def where(self, name, *values):
+        """
+        Mask of the mice whose categorical column (status, strain or
+        gender) has one of the values.
+        """
+        codes = [self.code(name, value) for value in values]
+        return self.numpy.isin(getattr(self, name), codes)
+
+    def alive(self):
+        """
+        Mask of the mice that are not SACed or dead.
+        """
+        return ~self.where("status", *self.dead_statuses)
+
+    def _select(self, array, mask):
+        return array if mask is None else array[mask]
+
+    def counts(self, name, mask=None):
+        """
+        Number of mice per value of a categorical column.
+
+        Returns: Dictionary of value --> count (values with no mice left
+                 out).
+        """
+        counts = self.numpy.bincount(self._select(getattr(self, name), mask),
+                                     minlength=len(self.categories[name]))
+        return {value: int(count) for value, count
+                in zip(self.categories[name], counts) if count}
+
+    def count_by_cage(self, mask=None):
+        """
+        Number of mice per cage.
+
+        Returns: Dictionary of cage number --> count, by cage number.
+        """
+        cages, counts = self.numpy.unique(self._select(self.cage, mask),
+                                          return_counts=True)
+        return {int(cage): int(count) for cage, count in zip(cages, counts)
+                if cage != MISSING}
+
+    def cage_occupancy(self):
+        """
+        Number of live mice per cage.
+        """
+        return self.count_by_cage(self.alive())
+
+    def cages_where(self, mask, among=None):
+        """
+        Cages where every mouse matches a condition.
+
+        As with Manipulate.cages_where(), a cage is judged on every mouse
+        with its card, including SACed and dead ones, unless among
+        narrows it down (e.g. among=self.alive()).
+
+        Args:
+            mask: Mask of the mice matching the condition.
+            among: Mask of the mice considered (default is every mouse).
+
+        Returns: List of cage numbers, by cage number.
+        """
+        cages = self.cage if among is None else self.cage[among]
+        matches = mask if among is None else mask[among]
+        cages = self.numpy.unique(cages[~self.numpy.isin(
+            cages, cages[~matches])])
+        return [int(cage) for cage in cages if cage != MISSING]
+
+    def ages(self, today, mask=None):
+        """
+        Age in days of the mice with a known birth date.
+
+        Args:
+            today: datetime.date the ages are taken at.
+        """
+        born = self._select(self.born, mask)
+        born = born[born != MISSING]
+        return today.toordinal() - born
+
+    def age_histogram(self, today, width=7, mask=None):
+        """
+        Number of mice per age bracket.
+
+        Args:
+            today: datetime.date the ages are taken at.
+            width: Days per bracket (7 for weeks).
+            mask: Mice counted (default is every mouse with a birth date).
+
+        Returns: Array whose item i counts the mice aged i * width to
+                 (i + 1) * width - 1 days.
+        """
+        ages = self.ages(today, mask)
+        return self.numpy.bincount(ages[ages >= 0] // width)
@@ -0,0 +1,231 @@
+"""
+Long-running colony daemon.
+
+A daemon holds one warm Manipulate session in snapshot mode, with its
+pooled client and indexed table snapshot, and serves colony operations
+over a Unix socket, so each command (see colony.py) costs only the
+requests of the operation itself. Requests are run one at a time, which
+keeps technicians working at once from picking the same IDs or cages, and
+each one is run in a unit of work, so a failed operation writes nothing.
+
+The snapshot follows the daemon's own writes. Before a request it is
+reloaded if refresh_interval seconds have passed since the last reload, to
+pick up changes made by others; with --cache-dir a reload only downloads
+the records changed since (see session_dir/disk_cache.py).
+
+Protocol: one JSON object per line each way. A request has the "event"
+and columns of an events file row (see events.py), or "event": "negatives"
+(get_negatives) or "refresh". The response has "status" ("ok", "failed" or
+"declined"), "message", "output" (the messages logged) and "result".
+
+Usage:
+    python daemon.py --base-key appXXXXXXXX --table "Mice" --cache-dir ~/.cache/adp
+
+Classes:
+    ColonyDaemon: Socket server running requests against a session.
+
+Functions:
+    handle_request:
+        Run one request against a session.
+    main:
+        Command line entry point.
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from ADP import Manipulate
+from colony import DEFAULT_SOCKET, socket_path
+from events import capture_messages, event_call
+
+# Seconds between reloads of the snapshot
+REFRESH_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def handle_request(mytable, request):
+    """
+    Run one request against a session.
+
+    Event requests run inside a unit of work. A confirmation prompt is
+    answered "y" only if the request has "confirm": "y"; otherwise the
+    operation stops without writing and the response is "declined".
+
+    Args:
+        mytable: Manipulate object.
+        request: Dictionary with an "event" and its columns.
+
+    Returns: The response dictionary.
+    """
+    response = {"status": "ok", "message": "", "output": "", "result": None}
+    kind = str(request.get("event", "")).strip().lower()
+    answers = []
+
+    def answer(prompt):
+        reply = "y" if str(request.get("confirm", "")).lower()\
+            .startswith("y") else "n"
+        answers.append(reply)
+        return reply
+
+    ask = mytable.ask
+    mytable.ask = answer
+    output = io.StringIO()
+    try:
+        with capture_messages(output):
+            if kind == "negatives":
+                response["result"] = mytable.get_negatives()
+            elif kind == "refresh":
+                mytable.refresh()
+            else:
+                method, args, kwargs = event_call(request)
+                with mytable.unit_of_work():
+                    getattr(mytable, method)(*args, **kwargs)
+    except Exception as error:
+        response["status"] = "failed"
+        response["message"] = str(error) or error.__class__.__name__
+    else:
+        if "n" in answers:
+            response["status"] = "declined"
+            response["message"] = "confirmation needed (set confirm=y)"
+    finally:
+        mytable.ask = ask
+    response["output"] = output.getvalue()
+    return response
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Answers the requests sent on one connection, in order.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode("utf-8"))
+                assert isinstance(request, dict), "Request must be an object"
+            except (ValueError, AssertionError) as error:
+                response = {"status": "failed", "output": "", "result": None,
+                            "message": "Invalid request: " + str(error)}
+            else:
+                response = self.server.run(request)
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class ColonyDaemon(socketserver.ThreadingUnixStreamServer):
+    """
+    Serves colony operations from one warm Manipulate session.
+
+    >>> mytable = Manipulate("base_key", "Mice", snapshot=True)
+    >>> daemon = ColonyDaemon(mytable, "/tmp/colony.sock")
+    >>> daemon.serve_forever()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, mytable, path=None, refresh_interval=REFRESH_INTERVAL,
+                 clock=time.monotonic):
+        """
+        Args:
+            mytable: Manipulate object in snapshot mode.
+            path: Socket to listen on (see colony.socket_path()).
+            refresh_interval: Seconds between reloads of the snapshot
+                              (None never reloads).
+            clock: Function returning the time in seconds.
+        """
+        assert mytable.snapshot, "The daemon needs a session in snapshot mode"
+        self.mytable = mytable
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        # Held while a request runs, so requests never interleave
+        self.lock = threading.Lock()
+        path = socket_path(path)
+        self.remove_stale_socket(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        socketserver.ThreadingUnixStreamServer.__init__(self, path,
+                                                        RequestHandler)
+        # Load the snapshot now instead of on the first request
+        mytable.Authenticate(mytable.base_key, mytable.table_name,
+                             mytable.API_key)
+        mytable.refresh()
+        self.refreshed = clock()
+
+    def remove_stale_socket(self, path):
+        # A socket file left by a daemon that is no longer running
+        if not os.path.exists(path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+        else:
+            assert False, "A daemon is already listening on " + path
+        finally:
+            probe.close()
+
+    def run(self, request):
+        """
+        Run a request once no other one is running.
+        """
+        with self.lock:
+            if self.refresh_interval is not None\
+                    and self.clock() - self.refreshed >= self.refresh_interval:
+                self.mytable.refresh()
+                self.refreshed = self.clock()
+            response = handle_request(self.mytable, request)
+        logger.info(str(request.get("event")) + ": " + response["status"])
+        return response
+
+    def server_close(self):
+        socketserver.ThreadingUnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve colony operations from a warm session.")
+    parser.add_argument("--base-key", required=True, help="Airtable base key")
+    parser.add_argument("--table", required=True, help="Airtable table name")
+    parser.add_argument("--api-key", default=None,
+                        help="API key (default: AIRTABLE_API_KEY)")
+    parser.add_argument("--socket", default=None,
+                        help="socket to listen on (default: COLONY_SOCKET "
+                             "or " + DEFAULT_SOCKET + ")")
+    parser.add_argument("--cache-dir", default=None,
+                        help="keep the snapshot in a disk cache, so reloads "
+                             "only download changed records")
+    parser.add_argument("--refresh", type=float, default=REFRESH_INTERVAL,
+                        help="seconds between snapshot reloads (default: "
+                             + str(REFRESH_INTERVAL) + ")")
+    options = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with Manipulate(options.base_key, options.table, options.api_key,
+                    snapshot=True, cache_dir=options.cache_dir) as mytable:
+        daemon = ColonyDaemon(mytable, options.socket, options.refresh)
+        print("Listening on " + daemon.server_address)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Bulk processor for a day's colony events.
+
+Reads births, breedings, weanings and SACs from a CSV or YAML file, plans
+every event against one snapshot of the table (so lookups are answered
+locally and later events see the effect of earlier ones), validates all
+of them, and only then commits the writes in batched, ordered requests.
+
+Event file columns (CSV header or YAML keys):
+    event: birth, breeding, weaned, sac_cage or sac_mouse
+    cage: Cage number (parental cage for weaned, new cage for breeding)
+    date: M/D/YYYY (birth and breeding)
+    male, female, female2: Animal IDs (breeding)
+    strain, female_num, female_cage, female_cage2, max_females,
+    male_num, male_cage, male_cage2, max_males: As for weaned()
+    animal: Animal ID (sac_mouse)
+    confirm: "y" to continue past a confirmation prompt for this event
+
+Usage:
+    python events.py events.csv --base-key appXXXXXXXX --table "Mice"
+
+Functions:
+    read_events:
+        Read events from a CSV or YAML file.
+    event_call:
+        Translate an event into a Manipulate method call.
+    process_events:
+        Plan, validate and commit a list of events.
+    main:
+        Command line entry point.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import logging
+import sys
+
+from ADP import Manipulate
+
+# event --> (Manipulate method, required columns, optional columns)
+EVENTS = {
+    "birth": ("birth", ["cage", "date"], []),
+    "breeding": ("set_breeding", ["cage", "date", "male", "female"],
+                 ["female2"]),
+    "weaned": ("weaned", ["cage", "strain"],
+               ["female_num", "female_cage", "female_cage2", "max_females",
+                "male_num", "male_cage", "male_cage2", "max_males"]),
+    "sac_cage": ("SAC_cage", ["cage"], []),
+    "sac_mouse": ("SAC_mouse", ["animal"], []),
+}
+
+# Columns holding counts, passed to Manipulate as integers
+COUNT_COLUMNS = ["female_num", "max_females", "male_num", "max_males"]
+
+
+def read_events(path):
+    """
+    Read events from a CSV or YAML (.yml/.yaml) file.
+
+    Returns: List of dictionaries, one per event.
+    """
+    if path.endswith((".yml", ".yaml")):
+        import yaml
+        with open(path) as events_file:
+            events = yaml.safe_load(events_file) or []
+    else:
+        with open(path, newline="") as events_file:
+            events = list(csv.DictReader(events_file))
+    # Blank cells are treated as missing
+    return [{key.strip(): value for key, value in event.items()
+             if key and value is not None and str(value).strip() != ""}
+            for event in events]
+
+
+def parse_date(date):
+    """
+    Split an M/D/YYYY date into (month, day, year).
+    """
+    month, day, year = [int(part) for part in str(date).split("/")]
+    return month, day, year
+
+
+def event_call(event):
+    """
+    Translate an event into a Manipulate method call.
+
+    Returns:
+        (method name, positional args, keyword args)
+    """
+    kind = str(event.get("event", "")).strip().lower()
+    assert kind in EVENTS, "Unknown event type: " + str(kind)
+    method, required, optional = EVENTS[kind]
+    for column in required:
+        assert column in event, "Missing column for " + kind + ": " + column
+
+    if kind == "birth":
+        return method, [event["cage"]] + list(parse_date(event["date"])), {}
+    if kind == "breeding":
+        kwargs = {"female_ID2": str(event["female2"])} if "female2" in event\
+            else {}
+        return method, [event["cage"]] + list(parse_date(event["date"]))\
+            + [str(event["male"]), str(event["female"])], kwargs
+    if kind == "weaned":
+        kwargs = {}
+        for column in optional:
+            if column in event:
+                kwargs[column] = int(event[column]) if column in COUNT_COLUMNS\
+                    else event[column]
+        return method, [event["cage"], str(event["strain"])], kwargs
+    if kind == "sac_cage":
+        return method, [event["cage"]], {}
+    return method, [str(event["animal"])], {}
+
+
+@contextlib.contextmanager
+def capture_messages(output):
+    """
+    Copy the messages Manipulate logs inside the block to a text stream.
+    """
+    handler = logging.StreamHandler(output)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    adp_logger = logging.getLogger("ADP")
+    level = adp_logger.level
+    adp_logger.addHandler(handler)
+    adp_logger.setLevel(logging.INFO)
+    try:
+        yield
+    finally:
+        adp_logger.removeHandler(handler)
+        adp_logger.setLevel(level)
+
+
+class EventResult(object):
+    """
+    Outcome of one event.
+
+    status is "ok", "failed" or "declined" (a confirmation prompt was
+    answered no, so the event made no changes).
+    """
+
+    def __init__(self, number, event):
+        self.number = number
+        self.event = event
+        self.status = "ok"
+        self.message = ""
+        self.writes = 0
+        self.output = ""
+
+    def summary(self):
+        kind = str(self.event.get("event", "?"))
+        target = self.event.get("cage", self.event.get("animal", ""))
+        line = "{:>4}  {:<10} {:<10} {:<9} {:>3} writes".format(
+            self.number, kind, str(target), self.status, self.writes)
+        if self.message:
+            line += "  " + self.message
+        return line
+
+
+def process_events(mytable, events, confirm=False, partial=False,
+                   dry_run=False):
+    """
+    Plan, validate and commit a list of events.
+
+    Every event is run against a staged snapshot of the table. If any event
+    fails, nothing is written unless partial is True, in which case only
+    the events that passed are committed.
+
+    Args:
+        mytable: Manipulate object in snapshot mode.
+        events: List of event dictionaries (see read_events()).
+        confirm: Answer "y" to every confirmation prompt.
+        partial: Commit the events that passed even if others failed.
+        dry_run: Validate only, never write.
+
+    Returns:
+        (list of EventResult, dictionary of staged id --> written record)
+    """
+    results = []
+    staged = mytable.stage()
+    # Collisions are checked once for all inserts after the commit
+    verify_IDs, mytable.verify_IDs = mytable.verify_IDs, False
+    ask = mytable.ask
+    try:
+        for number, event in enumerate(events, 1):
+            result = EventResult(number, event)
+            answers = []
+
+            def answer(prompt, event=event):
+                reply = "y" if confirm or str(event.get("confirm", ""))\
+                    .lower().startswith("y") else "n"
+                answers.append(reply)
+                return reply
+
+            mytable.ask = answer
+            savepoint = staged.savepoint()
+            output = io.StringIO()
+            try:
+                method, args, kwargs = event_call(event)
+                with capture_messages(output):
+                    getattr(mytable, method)(*args, **kwargs)
+            except Exception as error:
+                # Undo whatever the failed event staged
+                staged.rollback(savepoint)
+                mytable.rolled_back()
+                result.status = "failed"
+                result.message = str(error) or error.__class__.__name__
+            else:
+                if "n" in answers:
+                    result.status = "declined"
+                    result.message = "confirmation needed (set confirm=y)"
+                result.writes = len(set(entry[0] for entry
+                                        in staged.undo[savepoint:]))
+            result.output = output.getvalue()
+            results.append(result)
+    finally:
+        mytable.ask = ask
+        mytable.verify_IDs = verify_IDs
+
+    failed = any(result.status == "failed" for result in results)
+    if dry_run or (failed and not partial):
+        mytable.discard()
+        return results, {}
+
+    written = mytable.commit()
+    mytable.committed(written)
+    return results, written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Apply a file of colony events to the animal database.")
+    parser.add_argument("events", help="CSV or YAML file of events")
+    parser.add_argument("--base-key", required=True, help="Airtable base key")
+    parser.add_argument("--table", required=True, help="Airtable table name")
+    parser.add_argument("--api-key", default=None,
+                        help="API key (default: AIRTABLE_API_KEY)")
+    parser.add_argument("--yes", action="store_true",
+                        help="answer yes to every confirmation prompt")
+    parser.add_argument("--partial", action="store_true",
+                        help="commit the events that passed even if "
+                             "others failed")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="validate only, write nothing")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show each event's messages")
+    options = parser.parse_args(argv)
+
+    events = read_events(options.events)
+    with Manipulate(options.base_key, options.table, options.api_key,
+                    snapshot=True) as mytable:
+        results, written = process_events(mytable, events, options.yes,
+                                          options.partial, options.dry_run)
+
+    for result in results:
+        print(result.summary())
+        if options.verbose and result.output:
+            for line in result.output.rstrip().splitlines():
+                print("        " + line)
+    failed = sum(result.status == "failed" for result in results)
+    print("--------------------")
+    print(str(len(results)) + " events, " + str(failed) + " failed, "
+          + str(len(written)) + " records written")
+    if failed and not options.partial and not options.dry_run:
+        print("Nothing was written; fix the failed events and rerun")
+    print("--------------------")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
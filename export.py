@@ -0,0 +1,274 @@
+"""
+Streaming export of an airtable data table to CSV and Parquet files.
+
+The table (or a view of it, with a field projection) is listed one page at
+a time with Client.pages() and every page is written out as it arrives, so
+the memory used stays the same however large the table is: one page for
+the CSV, one chunk of pages for Parquet.
+
+After each chunk of pages the exporter saves a checkpoint to a state file:
+the offset of the next page, the rows written and the size of the CSV. An
+export interrupted partway and run again with resume=True cuts the CSV
+back to the checkpoint and continues the listing from the saved offset.
+Airtable only keeps a listing's offsets for a while; if the saved one has
+expired, the listing starts over and skips the rows already written.
+
+Parquet output is a directory with one compressed part file per chunk, so
+the parts already written survive an interruption. It needs pyarrow.
+Every column is written as text, as in the CSV, with lists and objects
+(linked records, attachments) JSON encoded; blank cells are null.
+
+Usage:
+    python export.py --base-key appXXXXXXXX --table "Mice" --csv mice.csv
+    python export.py --base-key appXXXXXXXX --table "Mice" --csv mice.csv --parquet mice --resume
+
+Classes:
+    Exporter: Streams a table to CSV and/or Parquet, with checkpoints.
+
+Functions:
+    have_pyarrow:
+        True if pyarrow can be imported.
+    cell:
+        A field value as written to the files.
+    main:
+        Command line entry point.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+
+from requests.exceptions import HTTPError
+
+from ADP import Manipulate
+
+# Pages written between checkpoints (and per Parquet part)
+PAGES_PER_CHUNK = 10
+
+logger = logging.getLogger(__name__)
+
+
+def have_pyarrow():
+    """
+    True if pyarrow, needed for Parquet output, is installed.
+    """
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
+
+
+def cell(value):
+    """
+    A field value as text: "" for blank, JSON for lists and objects.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+class Exporter(object):
+    """
+    Streams the records of a table to a CSV file and/or a Parquet
+    directory, saving a checkpoint after every chunk of pages.
+
+    >>> exporter = Exporter(client, ["ID", "Animal ID"], csv_path="mice.csv")
+    >>> exporter.run(resume=True)
+    """
+
+    def __init__(self, airtable, fields, csv_path=None, parquet_dir=None,
+                 state_path=None, view=None, pages_per_chunk=PAGES_PER_CHUNK,
+                 compression="zstd"):
+        """
+        Args:
+            airtable: Client to list the table with (must provide pages()).
+            fields: Columns to export, after the record id.
+            csv_path: CSV file to write, if any.
+            parquet_dir: Directory to write Parquet parts to, if any.
+            state_path: Checkpoint file (default: the CSV or Parquet path
+                        followed by ".state.json").
+            view: View to export (default is the whole table).
+            pages_per_chunk: Pages written between checkpoints.
+            compression: Parquet compression codec.
+        """
+        assert csv_path or parquet_dir, "No CSV file or Parquet directory"
+        if parquet_dir:
+            assert have_pyarrow(), "Parquet output needs pyarrow installed"
+        self.airtable = airtable
+        self.fields = list(fields)
+        self.columns = ["id"] + self.fields
+        self.csv_path = csv_path
+        self.parquet_dir = parquet_dir
+        self.state_path = state_path or (csv_path or parquet_dir.rstrip("/\\"))\
+            + ".state.json"
+        self.view = view
+        self.pages_per_chunk = pages_per_chunk
+        self.compression = compression
+
+    def load_state(self):
+        """
+        Returns the saved checkpoint, or None if there is none.
+        """
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path) as state_file:
+            state = json.load(state_file)
+        assert state["fields"] == self.fields and state["view"] == self.view,\
+            "The checkpoint in " + self.state_path + " is for another export"
+        return state
+
+    def save_state(self, state):
+        # Written to a temporary file first, so a crash never leaves half
+        # a checkpoint
+        partial = self.state_path + ".partial"
+        with open(partial, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(partial, self.state_path)
+
+    def _pages(self, offset, rows):
+        options = {"fields": self.fields}
+        if self.view is not None:
+            options["view"] = self.view
+        if offset is not None:
+            started = False
+            try:
+                for page in self.airtable.pages(offset, **options):
+                    started = True
+                    yield page
+                return
+            except HTTPError as exception:
+                if started or exception.response is None\
+                        or exception.response.status_code != 422:
+                    raise
+            logger.warning("The saved offset has expired, skipping the "
+                           + str(rows) + " rows already exported")
+        skip = rows if offset is not None else 0
+        for records, next_offset in self.airtable.pages(None, **options):
+            if skip >= len(records):
+                skip -= len(records)
+                continue
+            yield records[skip:], next_offset
+            skip = 0
+
+    def _open_csv(self, state):
+        if state["rows"] or state["offset"] is not None:
+            # Rows written after the checkpoint are written again
+            with open(self.csv_path, "r+b") as csv_file:
+                csv_file.truncate(state["csv_size"])
+            return open(self.csv_path, "a", newline="", encoding="utf-8")
+        csv_file = open(self.csv_path, "w", newline="", encoding="utf-8")
+        csv.writer(csv_file).writerow(self.columns)
+        return csv_file
+
+    def _write_part(self, number, columns):
+        import pyarrow
+        import pyarrow.parquet
+        os.makedirs(self.parquet_dir, exist_ok=True)
+        table = pyarrow.table({name: pyarrow.array(values,
+                                                   type=pyarrow.string())
+                               for name, values in zip(self.columns,
+                                                       columns)})
+        path = os.path.join(self.parquet_dir,
+                            "part-" + str(number).zfill(5) + ".parquet")
+        pyarrow.parquet.write_table(table, path + ".partial",
+                                    compression=self.compression)
+        os.replace(path + ".partial", path)
+
+    def run(self, resume=False):
+        """
+        Export the table.
+
+        Args:
+            resume: Continue from the saved checkpoint, if there is one,
+                    instead of starting over.
+
+        Returns: The number of rows in the export.
+        """
+        state = self.load_state() if resume else None
+        if state is None:
+            state = {"fields": self.fields, "view": self.view,
+                     "offset": None, "rows": 0, "parts": 0, "csv_size": 0,
+                     "done": False}
+        if state["done"]:
+            return state["rows"]
+
+        csv_file = self._open_csv(state) if self.csv_path else None
+        writer = csv.writer(csv_file) if csv_file else None
+        columns = [[] for _ in self.columns]
+        pages = 0
+        try:
+            for records, offset in self._pages(state["offset"],
+                                               state["rows"]):
+                for record in records:
+                    values = [record["id"]] + [record["fields"].get(name)
+                                               for name in self.fields]
+                    if writer is not None:
+                        writer.writerow([cell(value) for value in values])
+                    if self.parquet_dir:
+                        for column, value in zip(columns, values):
+                            column.append(None if value is None
+                                          else cell(value))
+                state["rows"] += len(records)
+                pages += 1
+                if pages % self.pages_per_chunk and offset:
+                    continue
+                # Checkpoint: everything up to the next page is on disk
+                if self.parquet_dir and columns[0]:
+                    self._write_part(state["parts"], columns)
+                    state["parts"] += 1
+                    columns = [[] for _ in self.columns]
+                if csv_file is not None:
+                    csv_file.flush()
+                    os.fsync(csv_file.fileno())
+                    state["csv_size"] = csv_file.tell()
+                state["offset"] = offset
+                state["done"] = not offset
+                self.save_state(state)
+        finally:
+            if csv_file is not None:
+                csv_file.close()
+        return state["rows"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the animal table to CSV and/or Parquet, one "
+                    "page at a time.")
+    parser.add_argument("--base-key", required=True, help="Airtable base key")
+    parser.add_argument("--table", required=True, help="Airtable table name")
+    parser.add_argument("--api-key", default=None,
+                        help="API key (default: AIRTABLE_API_KEY)")
+    parser.add_argument("--view", default=None,
+                        help="view to export (default: the whole table)")
+    parser.add_argument("--fields", nargs="+", default=None,
+                        help="columns to export (default: the mouse "
+                             "columns)")
+    parser.add_argument("--csv", default=None, help="CSV file to write")
+    parser.add_argument("--parquet", default=None,
+                        help="directory to write Parquet parts to")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted export")
+    options = parser.parse_args(argv)
+    if not options.csv and not options.parquet:
+        parser.error("give --csv and/or --parquet")
+
+    with Manipulate(options.base_key, options.table,
+                    options.api_key) as mytable:
+        client = mytable.client(mytable.base_key, mytable.table_name,
+                                mytable.API_key)
+        exporter = Exporter(client,
+                            options.fields or mytable.record_model().columns,
+                            options.csv, options.parquet, view=options.view)
+        rows = exporter.run(options.resume)
+    print(str(rows) + " rows exported")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
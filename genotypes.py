@@ -0,0 +1,332 @@
+"""
+Bulk ingestion of a genotyping plate's results.
+
+Pups of lines that need genotyping (Manipulate.genotyped_markers, e.g.
+"-Cre" and "DF16A") are weaned into "CM: Colony Maintenance" (see
+genotype_maintenance()). A plate's results are applied in one go: the mice
+in colony maintenance are fetched with one query and indexed by animal ID,
+every result is matched against the index, and the new strains and
+statuses are written in batched updates.
+
+A result is recorded by following its marker in the strain with "p"
+(positive) or "n" (negative): "Ai14-Cre" becomes "Ai14-Crep" or
+"Ai14-Cren", the form get_negatives() looks for. A marker is only found
+as a whole token: "-Cre" is not in "Cdh5-CreERT2". A strain carrying a
+marker more than once (e.g. "Ai14-Cre x Cdh5-Cre") is reported and left
+alone, since the result cannot be placed. Once every marker of a mouse's
+strain has a result, the mouse is set to "A: Available".
+
+Plate file columns (CSV header):
+    animal: Animal ID
+    result: positive or negative (also +/-, pos/neg, p/n). Anything else
+            (e.g. "fail") is reported and left for a rerun.
+    marker: Marker the result is for (e.g. Cre, DF16A), needed only when
+            the strain has more than one marker awaiting a result
+    well: Plate well, shown in the report
+
+Usage:
+    python genotypes.py plate.csv --base-key appXXXXXXXX --table "Mice" --dry-run
+    python genotypes.py plate.csv --base-key appXXXXXXXX --table "Mice" --report changes.csv
+
+Classes:
+    GenotypeResult: Outcome of one row of a plate.
+
+Functions:
+    read_plate:
+        Read results from a plate file.
+    parse_result:
+        "p", "n" or None for a result cell.
+    pending_markers:
+        Markers of a strain still awaiting a result.
+    genotype_strain:
+        Strain with a marker's result added.
+    ingest_results:
+        Match results against the mice in colony maintenance and write them.
+    write_report:
+        Save the outcome of every row to a CSV file.
+    main:
+        Command line entry point.
+"""
+
+import argparse
+import csv
+import re
+import sys
+
+from ADP import Manipulate
+from session_dir.predicates import eq
+
+# Result cell (lower case) --> suffix added to the marker
+RESULTS = {"positive": "p", "pos": "p", "+": "p", "p": "p",
+           "negative": "n", "neg": "n", "-": "n", "n": "n"}
+SUFFIXES = ["p", "n"]
+# Row statuses the command line treats as failures
+FAILED = ["not found", "unreadable", "unknown marker", "ambiguous",
+          "conflict"]
+
+
+def read_plate(path):
+    """
+    Read a plate's results from a CSV file.
+
+    Returns: List of dictionaries, one per row, with lower case column
+    names. Blank cells are left out.
+    """
+    with open(path, newline="") as plate_file:
+        rows = list(csv.DictReader(plate_file))
+    return [{key.strip().lower(): value.strip() for key, value in row.items()
+             if key and value is not None and value.strip() != ""}
+            for row in rows]
+
+
+def parse_result(result):
+    """
+    Returns "p" for a positive result, "n" for a negative one, else None.
+    """
+    return RESULTS.get(str(result or "").strip().lower())
+
+
+def _marker_ends(strain, marker):
+    # Indexes just past each whole-token occurrence of the marker in the
+    # strain: it may be followed by a result suffix, but not by more of
+    # a longer name
+    pattern = re.escape(marker) + "(?=[" + "".join(SUFFIXES)\
+        + "]?(?![A-Za-z0-9]))"
+    if marker[:1].isalnum():
+        pattern = "(?<![A-Za-z0-9])" + pattern
+    return [match.end() for match in re.finditer(pattern, strain)]
+
+
+def _marker_end(strain, marker):
+    # Index just past the only occurrence of the marker in the strain, or
+    # -1 if it is missing or repeated
+    ends = _marker_ends(strain, marker)
+    return ends[0] if len(ends) == 1 else -1
+
+
+def pending_markers(strain, markers):
+    """
+    The markers in a strain that have no result yet.
+
+    Args:
+        strain: Strain, e.g. "Ai14-Cre x DF16An".
+        markers: Markers that need genotyping, e.g. ["-Cre", "DF16A"].
+    """
+    pending = []
+    for marker in markers:
+        if any(strain[end:end + 1] not in SUFFIXES
+               for end in _marker_ends(strain, marker)):
+            pending.append(marker)
+    return pending
+
+
+def genotype_strain(strain, marker, suffix):
+    """
+    Returns the strain with a result ("p" or "n") following the marker.
+    """
+    end = _marker_end(strain, marker)
+    assert end >= 0, marker + " is not in strain " + strain + " just once"
+    return strain[:end] + suffix + strain[end:]
+
+
+class GenotypeResult(object):
+    """
+    Outcome of one row of a plate.
+
+    status is "ok", "duplicate" (the same result given again),
+    "not found" (no mouse with the animal ID is in colony maintenance),
+    "unreadable", "unknown marker", "ambiguous" (the marker is in the
+    strain more than once) or "conflict" (the mouse was given different
+    results for a marker, so none of its results are written).
+    """
+
+    def __init__(self, number, row):
+        self.number = number
+        self.row = row
+        self.animal_ID = row.get("animal", "")
+        self.marker = None
+        self.status = "ok"
+        self.message = ""
+        self.record_id = None
+        self.old_strain = self.new_strain = None
+        self.old_status = self.new_status = None
+
+    def summary(self):
+        line = "{:>4}  {:<5} {:<10} {:<14}".format(
+            self.number, self.row.get("well", ""), self.animal_ID,
+            self.status)
+        if self.status == "ok":
+            line += "  " + str(self.old_strain) + " -> "\
+                + str(self.new_strain)
+            if self.new_status != self.old_status:
+                line += ", " + str(self.new_status)
+        if self.message:
+            line += "  " + self.message
+        return line
+
+
+def _match_marker(row, strain, markers):
+    # The marker of the strain a row's result is for, or None and why
+    present = [marker for marker in markers if _marker_ends(strain, marker)]
+    given = row.get("marker")
+    if given is None:
+        # Without a marker column the result is for the one awaited
+        candidates = pending_markers(strain, markers) or present
+        if len(candidates) == 1:
+            return candidates[0], ""
+        return None, "set the marker column (strain " + strain + ")"
+    for marker in present:
+        if marker.strip("-").lower() == given.strip("-").lower():
+            return marker, ""
+    return None, "strain " + strain + " has no marker " + given
+
+
+def ingest_results(mytable, results, dry_run=False):
+    """
+    Apply a plate's results.
+
+    The mice in colony maintenance are fetched once and indexed by animal
+    ID; every row is matched against the index, and the changed mice are
+    written in batched updates (one write per mouse).
+
+    Args:
+        mytable: Manipulate object.
+        results: List of row dictionaries (see read_plate()).
+        dry_run: Work out and report the changes, but write nothing.
+
+    Returns: List of GenotypeResult, one per row.
+    """
+    airtable = mytable.Authenticate(mytable.base_key, mytable.table_name,
+                                    mytable.API_key)
+    markers = mytable.genotyped_markers
+    waiting = {}
+    for record in airtable.query(
+            eq(mytable.status_col, mytable.maintenance),
+            fields=[mytable.animal_ID_col, mytable.strain_col,
+                    mytable.status_col]):
+        animal_ID = record["fields"].get(mytable.animal_ID_col)
+        if animal_ID is not None:
+            waiting[str(animal_ID)] = record
+    # Record id --> strain with the results so far
+    strains = {}
+    conflicts = set()
+    rows = []
+    for number, row in enumerate(results, 1):
+        result = GenotypeResult(number, row)
+        rows.append(result)
+        record = waiting.get(result.animal_ID)
+        if record is None:
+            result.status = "not found"
+            result.message = "not in colony maintenance"
+            continue
+        result.record_id = record["id"]
+        result.old_strain = record["fields"].get(mytable.strain_col, "")
+        result.old_status = record["fields"].get(mytable.status_col)
+        suffix = parse_result(row.get("result"))
+        if suffix is None:
+            result.status = "unreadable"
+            result.message = "result " + repr(row.get("result", ""))
+            continue
+        strain = strains.get(record["id"], result.old_strain)
+        marker, message = _match_marker(row, strain, markers)
+        if marker is None:
+            result.status = "unknown marker"
+            result.message = message
+            continue
+        result.marker = marker
+        if len(_marker_ends(strain, marker)) > 1:
+            result.status = "ambiguous"
+            result.message = marker + " is in strain " + strain\
+                + " more than once"
+            continue
+        if marker in pending_markers(strain, markers):
+            strains[record["id"]] = genotype_strain(strain, marker, suffix)
+            continue
+        # The marker already has a result, from the table or this plate
+        end = _marker_end(strain, marker)
+        if strain[end:end + 1] == suffix:
+            result.status = "duplicate"
+        else:
+            result.status = "conflict"
+            result.message = "different results for " + marker
+            conflicts.add(record["id"])
+
+    updates = {}
+    for result in rows:
+        if result.record_id in conflicts and result.status == "ok":
+            result.status = "conflict"
+            result.message = "another row has a different result"
+        if result.status != "ok":
+            continue
+        result.new_strain = strains[result.record_id]
+        result.new_status = result.old_status
+        if not pending_markers(result.new_strain, markers):
+            result.new_status = mytable.available
+        fields = {mytable.strain_col: result.new_strain}
+        if result.new_status != result.old_status:
+            fields[mytable.status_col] = result.new_status
+        updates[result.record_id] = fields
+
+    if updates and not dry_run:
+        with mytable.write_buffer(airtable) as buffer:
+            for record_id, fields in updates.items():
+                buffer.update(record_id, fields)
+        mytable.track_writes(buffer.results)
+    return rows
+
+
+def write_report(path, rows):
+    """
+    Save the outcome of every row to a CSV file.
+    """
+    with open(path, "w", newline="") as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(["row", "well", "animal", "marker", "status",
+                         "old strain", "new strain", "old status",
+                         "new status", "message"])
+        for result in rows:
+            writer.writerow([result.number, result.row.get("well", ""),
+                             result.animal_ID, result.marker or "",
+                             result.status, result.old_strain or "",
+                             result.new_strain or "",
+                             result.old_status or "",
+                             result.new_status or "", result.message])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Apply a genotyping plate's results to the animal "
+                    "database.")
+    parser.add_argument("plate", help="CSV file of results")
+    parser.add_argument("--base-key", required=True, help="Airtable base key")
+    parser.add_argument("--table", required=True, help="Airtable table name")
+    parser.add_argument("--api-key", default=None,
+                        help="API key (default: AIRTABLE_API_KEY)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report the changes, write nothing")
+    parser.add_argument("--report", default=None,
+                        help="also save the report to a CSV file")
+    options = parser.parse_args(argv)
+
+    results = read_plate(options.plate)
+    with Manipulate(options.base_key, options.table,
+                    options.api_key) as mytable:
+        rows = ingest_results(mytable, results, options.dry_run)
+
+    for result in rows:
+        print(result.summary())
+    if options.report:
+        write_report(options.report, rows)
+    changed = len(set(result.record_id for result in rows
+                      if result.status == "ok"))
+    failed = sum(result.status in FAILED for result in rows)
+    print("--------------------")
+    print(str(len(rows)) + " results, " + str(failed) + " not applied, "
+          + str(changed) + " mice " + ("to change" if options.dry_run
+                                        else "changed"))
+    print("--------------------")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
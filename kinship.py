@@ -0,0 +1,251 @@
+"""
+Kinship and inbreeding coefficients of a colony.
+
+The coefficient of kinship of two mice is the probability that alleles
+drawn at random from each are identical by descent: 0.25 for full siblings
+or parent and offspring, 0.125 for half siblings, 0.0625 for first
+cousins. It is also the inbreeding coefficient of their offspring.
+
+A Kinship matrix is computed with the tabular method from a Pedigree,
+one generation at a time with NumPy array operations, for the live mice
+with known parents and their ancestors. Any other mouse is unrelated to
+everyone (kinship 0, 0.5 with itself). New litters are added row by row.
+NumPy is only needed once a Kinship is created.
+
+Checking a single pair does not need the matrix: PairKinship follows the
+pair's ancestors with the recursive definition, remembering the pairs it
+has computed, so only the ancestors of the two mice are visited.
+
+>>> kinship = mytable.get_kinship()
+>>> kinship.kinship("4881-D3", "4727-A2")
+>>> kinship.best_partners("4727-A2", candidates=males)
+>>> PairKinship(mytable.get_pedigree()).kinship("4881-D3", "4727-A2")
+
+Classes:
+    Kinship: Cached kinship matrix.
+    PairKinship: Kinship of single pairs, computed on demand.
+"""
+
+from pedigree import NO_PARENT
+
+
+class Kinship(object):
+    """
+    Kinship matrix over a pedigree.
+
+    Row 0 stands for an unknown parent and stays all zero; mice are
+    numbered from 1 in the order they were added, which puts parents
+    before their offspring.
+    """
+
+    def __init__(self, pedigree, animal_IDs=None, dtype="float32"):
+        """
+        Args:
+            pedigree: Pedigree to compute kinship over.
+            animal_IDs: Mice to cover (e.g. the live ones); default is every
+                        mouse in the pedigree. Their ancestors are added.
+            dtype: NumPy dtype of the matrix.
+        """
+        import numpy
+        self.numpy = numpy
+        self.pedigree = pedigree
+        self.rows = {}
+        self.size = 1
+        self.matrix = numpy.zeros((1, 1), dtype=dtype)
+        # Pedigree nodes already looked at by update()
+        self.synced = len(pedigree)
+        if animal_IDs is None:
+            nodes = range(len(pedigree))
+        else:
+            nodes = [pedigree.nodes[animal_ID] for animal_ID in animal_IDs
+                     if animal_ID in pedigree.nodes]
+        self._build(self._with_ancestors(nodes))
+
+    def __contains__(self, animal_ID):
+        return self.pedigree.nodes.get(animal_ID) in self.rows
+
+    def _has_parents(self, node):
+        return self.pedigree.father[node] != NO_PARENT\
+            or self.pedigree.mother[node] != NO_PARENT
+
+    def _with_ancestors(self, nodes):
+        # Mice without parents only need a row if they are someone's
+        # ancestor; on their own they are unrelated to everyone
+        selected = set()
+        stack = [node for node in nodes if self._has_parents(node)]
+        while stack:
+            node = stack.pop()
+            if node in selected or node in self.rows:
+                continue
+            selected.add(node)
+            for parent in (self.pedigree.father[node],
+                           self.pedigree.mother[node]):
+                if parent != NO_PARENT:
+                    stack.append(parent)
+        return selected
+
+    def _reserve(self, count):
+        # Grow the matrix (doubling) to hold count more rows
+        needed = self.size + count
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = self.numpy.zeros((capacity, capacity),
+                                  dtype=self.matrix.dtype)
+        matrix[:self.size, :self.size] = self.matrix[:self.size, :self.size]
+        self.matrix = matrix
+
+    def _parent_rows(self, nodes):
+        fathers = [self.rows.get(self.pedigree.father[node], 0)
+                   for node in nodes]
+        mothers = [self.rows.get(self.pedigree.mother[node], 0)
+                   for node in nodes]
+        return self.numpy.array(fathers), self.numpy.array(mothers)
+
+    def _build(self, nodes):
+        # Generation by generation: every parent of a generation already
+        # has a row when the generation is computed
+        generations = {}
+        for node in nodes:
+            generations.setdefault(self.pedigree.generation(
+                self.pedigree.names[node]), []).append(node)
+        self._reserve(len(nodes))
+        K = self.matrix
+        for generation in sorted(generations):
+            block = sorted(generations[generation])
+            start = self.size
+            end = start + len(block)
+            for row, node in enumerate(block, start):
+                self.rows[node] = row
+            fathers, mothers = self._parent_rows(block)
+            # Kinship with every earlier mouse is the mean of the parents'
+            K[start:end, :start] = 0.5 * (K[fathers, :start]
+                                          + K[mothers, :start])
+            K[:start, start:end] = K[start:end, :start].T
+            # Within the generation (parents' columns are filled in now)
+            K[start:end, start:end] = 0.5 * (K[fathers, start:end]
+                                             + K[mothers, start:end])
+            K[start:end, start:end] = 0.5 * (K[start:end, start:end]
+                                             + K[start:end, start:end].T)
+            K[range(start, end), range(start, end)] =\
+                0.5 * (1 + K[fathers, mothers])
+            self.size = end
+
+    def update(self):
+        """
+        Add the mice added to the pedigree since the last update, e.g. a
+        newly weaned litter. Only their own rows are computed.
+
+        Changed parents of mice already in the matrix are not picked up;
+        create a new Kinship for that.
+        """
+        new = range(self.synced, len(self.pedigree))
+        self.synced = len(self.pedigree)
+        self._build(self._with_ancestors(new))
+
+    def kinship(self, animal_ID, other_ID):
+        """
+        Coefficient of kinship of two mice (the inbreeding coefficient of
+        their offspring).
+        """
+        row = self.rows.get(self.pedigree.nodes.get(animal_ID))
+        other = self.rows.get(self.pedigree.nodes.get(other_ID))
+        if row is None or other is None:
+            return 0.5 if animal_ID == other_ID else 0.0
+        return float(self.matrix[row, other])
+
+    def inbreeding(self, animal_ID):
+        """
+        Inbreeding coefficient of a mouse (kinship of its parents).
+        """
+        father, mother = self.pedigree.parents(animal_ID)
+        if father is None or mother is None:
+            return 0.0
+        return self.kinship(father, mother)
+
+    def best_partners(self, animal_ID, candidates, limit=10):
+        """
+        Rank possible partners from least to most related.
+
+        Args:
+            animal_ID: The mouse to find partners for.
+            candidates: Animal IDs of possible partners.
+            limit: Number of partners returned.
+
+        Returns: List of (animal ID, kinship), least related first.
+        """
+        candidates = [candidate for candidate in candidates
+                      if candidate != animal_ID]
+        row = self.rows.get(self.pedigree.nodes.get(animal_ID))
+        if row is None:
+            return [(candidate, 0.0) for candidate in candidates[:limit]]
+        # Unknown candidates read the all-zero row 0
+        columns = self.numpy.array(
+            [self.rows.get(self.pedigree.nodes.get(candidate), 0)
+             for candidate in candidates], dtype=int)
+        values = self.matrix[row, columns]
+        order = self.numpy.argsort(values, kind="stable")[:limit]
+        return [(candidates[i], float(values[i])) for i in order]
+
+
+class PairKinship(object):
+    """
+    Kinship of single pairs over a pedigree, without NumPy.
+
+    The kinship of two different mice is the mean of the kinship of the
+    younger one's parents with the other; a mouse's kinship with itself is
+    half of one plus the kinship of its parents. Coefficients computed on
+    the way are remembered until clear() (call it when parents change).
+    """
+
+    def __init__(self, pedigree):
+        """
+        Args:
+            pedigree: Pedigree to compute kinship over.
+        """
+        self.pedigree = pedigree
+        # (node, node), lower node first --> coefficient
+        self.memo = {}
+
+    def clear(self):
+        """
+        Forget the coefficients computed so far.
+        """
+        self.memo = {}
+
+    def kinship(self, animal_ID, other_ID):
+        """
+        Coefficient of kinship of two mice (the inbreeding coefficient of
+        their offspring).
+        """
+        node = self.pedigree.nodes.get(animal_ID)
+        other = self.pedigree.nodes.get(other_ID)
+        if node is None or other is None:
+            return 0.5 if animal_ID == other_ID else 0.0
+        return self._coefficient(node, other)
+
+    def _coefficient(self, node, other):
+        if node == NO_PARENT or other == NO_PARENT:
+            return 0.0
+        key = (node, other) if node <= other else (other, node)
+        if key in self.memo:
+            return self.memo[key]
+        # A pair met again while being computed only happens if the data
+        # has a loop; it counts as unrelated
+        self.memo[key] = 0.0
+        pedigree = self.pedigree
+        if node == other:
+            value = 0.5 * (1 + self._coefficient(pedigree.father[node],
+                                                 pedigree.mother[node]))
+        else:
+            # A mouse can only be an ancestor of a later generation, so the
+            # parents followed are the younger mouse's
+            if pedigree.generation(pedigree.names[node])\
+                    < pedigree.generation(pedigree.names[other]):
+                node, other = other, node
+            value = 0.5 * (self._coefficient(pedigree.father[node], other)
+                           + self._coefficient(pedigree.mother[node], other))
+        self.memo[key] = value
+        return value
@@ -0,0 +1,262 @@
+"""
+Compact in-memory model of a mouse record.
+
+Records come from airtable as {"id": ..., "fields": {...}} dictionaries
+with a string key per column. A MouseRecord keeps the same data in fixed
+slots instead: ID and cage number as integers, dates as datetime.date
+objects shared by every mouse with that date, status, strain and gender
+interned, and the animal ID split into parental cage, cohort and number.
+A table of hundreds of thousands of mice then takes a fraction of the
+memory.
+
+A MouseRecord also reads like a fields dictionary keyed by column name
+(get(), [], in), returning the values airtable sent, so predicates and the
+snapshot's indexes work on it unchanged. Values a slot cannot hold exactly
+(e.g. a date not written M/D/YYYY) are kept as sent in extra, together
+with the columns that have no slot.
+
+>>> schema = MouseSchema()
+>>> mice = list(schema.load_pages(airtable.get_iter()))
+>>> mice[0].cage, mice[0].born, mice[0].cohort
+>>> mice[0].get("Cage Card")
+
+Classes:
+    MouseRecord: One mouse, in slots.
+    MouseSchema: Column layout; converts records to and from MouseRecords.
+
+Functions:
+    parse_animal_ID:
+        Split an animal ID into parental cage, cohort and number.
+"""
+
+import datetime
+import re
+import sys
+
+# Slot --> kind of value it holds
+SLOTS = [("ID", "number"), ("animal_ID", "text"), ("cage", "number"),
+         ("status", "category"), ("strain", "category"),
+         ("gender", "category"), ("born", "date"),
+         ("breeding_date", "date"), ("weaning_date", "date"),
+         ("partner_ID", "text"), ("father_ID", "text"),
+         ("mother_ID", "text")]
+
+
+def parse_animal_ID(animal_ID):
+    """
+    Split an animal ID into its parts.
+
+    Args:
+        animal_ID: Animal ID, e.g. "1057-B4"
+
+    Returns:
+        (parental cage, cohort, number), e.g. ("1057", "B", 4), or None
+        if animal_ID does not follow the format.
+    """
+    match = re.match(r"^(.+)-([A-Z]+)(\d+)$", str(animal_ID))
+    if match is None:
+        return None
+    return match.group(1), match.group(2), int(match.group(3))
+
+
+class MouseRecord(object):
+    """
+    One mouse, in slots.
+
+    Blank cells are None. parental_cage, cohort and number are None if the
+    animal ID does not follow the "1057-B4" format.
+    """
+
+    __slots__ = ["schema", "id", "created_time", "parental_cage", "cohort",
+                 "number", "extra"] + [slot for slot, _ in SLOTS]
+
+    def __init__(self, schema, record_id, created_time=None):
+        self.schema = schema
+        self.id = record_id
+        self.created_time = created_time
+        self.parental_cage = self.cohort = self.number = self.extra = None
+        self.ID = self.animal_ID = self.cage = None
+        self.status = self.strain = self.gender = None
+        self.born = self.breeding_date = self.weaning_date = None
+        self.partner_ID = self.father_ID = self.mother_ID = None
+
+    def get(self, column, default=None):
+        """
+        The value airtable holds for a column, or default if blank.
+        """
+        value = self.schema.value(self, column)
+        return default if value is None else value
+
+    def __getitem__(self, column):
+        value = self.schema.value(self, column)
+        if value is None:
+            raise KeyError(column)
+        return value
+
+    def __contains__(self, column):
+        return self.schema.value(self, column) is not None
+
+    def keys(self):
+        return [column for column in self.schema.columns if column in self]\
+            + list(self.extra or ())
+
+    def fields(self):
+        """
+        Returns the record's fields as a new dictionary.
+        """
+        return {column: self[column] for column in self.keys()}
+
+    def __repr__(self):
+        return "<MouseRecord " + str(self.id) + " " + str(self.animal_ID)\
+            + ">"
+
+
+class MouseSchema(object):
+    """
+    Column layout of the mouse table.
+
+    Converts records to MouseRecords (load) and back (dump). Each distinct
+    date and category value is stored once and shared by every mouse.
+    """
+
+    def __init__(self, ID_col="ID", animal_ID_col="Animal ID",
+                 cage_card_col="Cage Card", status_col="Status",
+                 strain_col="Strain", gender_col="Gender", born_col="Born",
+                 breeding_date_col="Breeding Date",
+                 weaning_date_col="Weaning Date",
+                 partner_ID_col="Partner ID", father_ID_col="Father ID",
+                 mother_ID_col="Mother ID"):
+        """
+        Args:
+            *_col: Column names, in the order of SLOTS.
+        """
+        self.columns = [ID_col, animal_ID_col, cage_card_col, status_col,
+                        strain_col, gender_col, born_col, breeding_date_col,
+                        weaning_date_col, partner_ID_col, father_ID_col,
+                        mother_ID_col]
+        # Column --> (slot, kind)
+        self.slots = dict(zip(self.columns, SLOTS))
+        self.animal_ID_col = animal_ID_col
+        # Number column --> True if airtable sends it as text (e.g. "5100")
+        self.number_text = {}
+        self.dates = {}
+        self.date_text = {}
+
+    def _date(self, text):
+        # Shared date object, or None unless text is M/D/YYYY as written
+        # by Manipulate (no leading zeros)
+        if text not in self.dates:
+            date = None
+            try:
+                month, day, year = [int(part) for part in text.split("/")]
+                date = datetime.date(year, month, day)
+            except ValueError:
+                pass
+            if date is not None and self._date_text(date) != text:
+                date = None
+            self.dates[text] = date
+        return self.dates[text]
+
+    def _date_text(self, date):
+        text = self.date_text.get(date)
+        if text is None:
+            text = self.date_text[date] = str(date.month) + "/"\
+                + str(date.day) + "/" + str(date.year)
+        return text
+
+    def _number(self, column, value):
+        # int, or None if the value would not come back the same. Whether
+        # a column is sent as text is taken from the first value seen.
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, int):
+            as_text = False
+        elif isinstance(value, str) and value.isdigit()\
+                and str(int(value)) == value:
+            as_text = True
+        else:
+            return None
+        if self.number_text.setdefault(column, as_text) != as_text:
+            return None
+        return int(value)
+
+    def _convert(self, column, kind, value):
+        if kind == "number":
+            return self._number(column, value)
+        if not isinstance(value, str):
+            return None
+        if kind == "date":
+            return self._date(value)
+        if kind == "category":
+            return sys.intern(value)
+        return value
+
+    def load(self, record):
+        """
+        Returns a MouseRecord holding an airtable record.
+        """
+        mouse = MouseRecord(self, record["id"], record.get("createdTime"))
+        for column, value in record["fields"].items():
+            slot = self.slots.get(column)
+            converted = None
+            if slot is not None and value is not None:
+                converted = self._convert(column, slot[1], value)
+            if converted is None:
+                if mouse.extra is None:
+                    mouse.extra = {}
+                mouse.extra[column] = value
+                continue
+            setattr(mouse, slot[0], converted)
+            if column == self.animal_ID_col:
+                parsed = parse_animal_ID(converted)
+                if parsed is not None:
+                    mouse.parental_cage = sys.intern(parsed[0])
+                    mouse.cohort = sys.intern(parsed[1])
+                    mouse.number = parsed[2]
+        return mouse
+
+    def load_pages(self, pages):
+        """
+        Converts pages of records (e.g. from Airtable.get_iter()) as they
+        arrive, so only one page of dictionaries is held at a time.
+        """
+        for page in pages:
+            for record in page:
+                yield self.load(record)
+
+    def value(self, mouse, column):
+        """
+        The value airtable holds for a column of a mouse (None if blank).
+        """
+        if mouse.extra is not None and column in mouse.extra:
+            return mouse.extra[column]
+        slot = self.slots.get(column)
+        if slot is None:
+            return None
+        value = getattr(mouse, slot[0])
+        if value is None:
+            return None
+        if slot[1] == "date":
+            return self._date_text(value)
+        if slot[1] == "number" and self.number_text[column]:
+            return str(value)
+        return value
+
+    def dump(self, mouse, fields=None):
+        """
+        Returns the airtable record of a mouse, as a new dictionary.
+
+        Args:
+            fields: Columns to include (default is all).
+        """
+        if fields is None:
+            record_fields = mouse.fields()
+        else:
+            if hasattr(fields, "startswith"):
+                fields = [fields]
+            record_fields = {column: mouse[column] for column in fields
+                             if column in mouse}
+        record = {"id": mouse.id, "fields": record_fields}
+        if mouse.created_time is not None:
+            record["createdTime"] = mouse.created_time
+        return record
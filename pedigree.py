@@ -0,0 +1,236 @@
+"""
+Pedigree graph of a colony.
+
+Lineage is stored in the "Father ID" and "Mother ID" columns as animal ID
+plus strain (e.g. "1023-C1_WT"). A Pedigree parses these columns once into
+integer nodes with parent arrays and child adjacency lists, so ancestor,
+descendant, sibling and litter lookups are answered locally instead of by
+repeated searches.
+
+>>> pedigree = mytable.get_pedigree()
+>>> pedigree.descendants("1071-A1")
+>>> pedigree.offspring_of_cage(5202)
+>>> pedigree.generation("5202-B3")
+
+Classes:
+    Pedigree: Parent/child graph over animal IDs.
+
+Functions:
+    parent_animal_ID:
+        Animal ID part of a Father ID / Mother ID entry.
+"""
+
+from array import array
+from collections import deque
+
+# Parent index of a node whose parent is unknown
+NO_PARENT = -1
+
+
+def parent_animal_ID(entry):
+    """
+    Animal ID part of a Father ID / Mother ID entry.
+
+    Args:
+        entry: e.g. "1023-C1_WT" (animal ID, "_", strain).
+
+    Returns: e.g. "1023-C1", or None if the entry is blank.
+    """
+    if not entry:
+        return None
+    return str(entry).split("_", 1)[0].strip() or None
+
+
+class Pedigree(object):
+    """
+    Parent/child graph over animal IDs.
+
+    Every animal ID seen (as a mouse or as a parent) is a node numbered
+    from 0. father[node] and mother[node] hold parent nodes (NO_PARENT if
+    unknown) and children[node] the nodes whose father or mother it is.
+    """
+
+    def __init__(self, records=(), animal_ID_col="Animal ID",
+                 father_ID_col="Father ID", mother_ID_col="Mother ID"):
+        """
+        Args:
+            records: Mice records to build the graph from.
+            animal_ID_col/father_ID_col/mother_ID_col: Column names.
+        """
+        self.animal_ID_col = animal_ID_col
+        self.father_ID_col = father_ID_col
+        self.mother_ID_col = mother_ID_col
+        self.nodes = {}
+        self.names = []
+        self.father = array("i")
+        self.mother = array("i")
+        self.children = []
+        # Parental cage (animal ID prefix) --> nodes born there
+        self.litters = {}
+        self._generations = {}
+        for record in records:
+            self.add(record["fields"])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, animal_ID):
+        return animal_ID in self.nodes
+
+    def node(self, animal_ID):
+        """
+        Returns the node number of an animal ID, adding it if new.
+        """
+        node = self.nodes.get(animal_ID)
+        if node is None:
+            node = self.nodes[animal_ID] = len(self.names)
+            self.names.append(animal_ID)
+            self.father.append(NO_PARENT)
+            self.mother.append(NO_PARENT)
+            self.children.append([])
+            cage = animal_ID.rsplit("-", 1)[0]
+            if cage != animal_ID:
+                self.litters.setdefault(cage, []).append(node)
+        return node
+
+    def add(self, fields):
+        """
+        Add (or update the parents of) one mouse.
+
+        Args:
+            fields: The mouse record's fields.
+        """
+        animal_ID = fields.get(self.animal_ID_col)
+        if not animal_ID:
+            return
+        node = self.node(str(animal_ID))
+        for parents, column in [(self.father, self.father_ID_col),
+                                (self.mother, self.mother_ID_col)]:
+            parent_ID = parent_animal_ID(fields.get(column))
+            parent = NO_PARENT if parent_ID is None else self.node(parent_ID)
+            if parents[node] == parent:
+                continue
+            if parents[node] != NO_PARENT:
+                self.children[parents[node]].remove(node)
+            if parent != NO_PARENT:
+                self.children[parent].append(node)
+            parents[node] = parent
+            # Depths below this mouse may have changed
+            self._generations = {}
+
+    def _walk(self, animal_ID, step, max_depth=None):
+        # Breadth first walk, nearest relatives first
+        start = self.nodes.get(animal_ID)
+        if start is None:
+            return []
+        seen = {start}
+        found = []
+        queue = deque([(start, 0)])
+        while queue:
+            node, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for relative in step(node):
+                if relative != NO_PARENT and relative not in seen:
+                    seen.add(relative)
+                    found.append(self.names[relative])
+                    queue.append((relative, depth + 1))
+        return found
+
+    def parents(self, animal_ID):
+        """
+        Returns: (father's animal ID, mother's animal ID), None if unknown.
+        """
+        node = self.nodes.get(animal_ID)
+        if node is None:
+            return None, None
+        return tuple(None if parent == NO_PARENT else self.names[parent]
+                     for parent in (self.father[node], self.mother[node]))
+
+    def ancestors(self, animal_ID, max_depth=None):
+        """
+        Returns the animal IDs of a mouse's ancestors, parents first.
+
+        Args:
+            max_depth: Generations to go up (1 for parents only).
+        """
+        return self._walk(animal_ID, lambda node: (self.father[node],
+                                                   self.mother[node]),
+                          max_depth)
+
+    def descendants(self, animal_ID, max_depth=None):
+        """
+        Returns the animal IDs of a mouse's descendants, children first.
+
+        Args:
+            max_depth: Generations to go down (1 for children only).
+        """
+        return self._walk(animal_ID, lambda node: self.children[node],
+                          max_depth)
+
+    def siblings(self, animal_ID, half=False):
+        """
+        Returns the animal IDs of a mouse's siblings.
+
+        Args:
+            half: Also include half siblings (one shared parent).
+        """
+        node = self.nodes.get(animal_ID)
+        if node is None:
+            return []
+        father, mother = self.father[node], self.mother[node]
+        candidates = []
+        for parent in (father, mother):
+            if parent != NO_PARENT:
+                candidates += self.children[parent]
+        found = []
+        for sibling in candidates:
+            if sibling == node or self.names[sibling] in found:
+                continue
+            same_father = self.father[sibling] == father != NO_PARENT
+            same_mother = self.mother[sibling] == mother != NO_PARENT
+            if (same_father and same_mother) or half:
+                found.append(self.names[sibling])
+        return found
+
+    def offspring_of_cage(self, cage_num):
+        """
+        Returns the animal IDs of the mice born in a parental cage.
+        """
+        return [self.names[node]
+                for node in self.litters.get(str(cage_num), [])]
+
+    def generation(self, animal_ID):
+        """
+        Generation depth of a mouse: 0 for founders (no known parents),
+        otherwise one more than its deepest parent.
+        """
+        node = self.nodes.get(animal_ID)
+        if node is None:
+            return None
+        # Iterative, so long lineages do not hit the recursion limit
+        stack = [node]
+        visiting = set()
+        while stack:
+            current = stack[-1]
+            if current in self._generations:
+                stack.pop()
+                continue
+            parents = [parent for parent in (self.father[current],
+                                             self.mother[current])
+                       if parent != NO_PARENT]
+            pending = [parent for parent in parents
+                       if parent not in self._generations
+                       and parent not in visiting]
+            if pending and current not in visiting:
+                visiting.add(current)
+                stack.extend(pending)
+                continue
+            # A parent still being visited means the data has a loop;
+            # it is counted as a founder
+            self._generations[current] = 1 + max(
+                [self._generations.get(parent, -1) for parent in parents]
+                or [-1])
+            visiting.discard(current)
+            stack.pop()
+        return self._generations[node]
@@ -0,0 +1,236 @@
+"""
+Calendar of upcoming colony tasks.
+
+A Schedule is built from one scan of the Status, Weaning Date, Born and
+Breeding Date columns (plus Animal ID, Cage Card and Gender) and keeps the
+tasks it finds in a calendar sorted by due date:
+
+    wean:       a mother's litter is due to be weaned (Weaning Date).
+    retire:     a breeder is past retirement age (Born + retirement_days).
+    no_litter:  a breeding female has had no litter no_litter_days after
+                being set to breeding or after her last litter.
+
+Writes made by a session (birth, weaned, set_breeding, SAC) are passed to
+update(), which only reschedules the mice written, so the daily task list
+never needs a full rescan.
+
+>>> schedule = mytable.get_schedule()
+>>> for task in schedule.due(datetime.date(2019, 10, 11)):
+...     print(task)
+
+Classes:
+    Task: One scheduled task.
+    Schedule: Calendar of tasks, kept current by update().
+"""
+
+import bisect
+import datetime
+
+from columns import MISSING, date_ordinal
+
+KINDS = ["wean", "retire", "no_litter"]
+
+
+class Task(object):
+    """
+    One scheduled task.
+
+    Attributes:
+        kind: "wean", "retire" or "no_litter".
+        due: Day ordinal the task is due on.
+        record_id: Record of the mouse the task is about.
+        animal_ID/cage: The mouse's animal ID and cage number.
+    """
+
+    def __init__(self, kind, due, record_id, animal_ID, cage):
+        self.kind = kind
+        self.due = due
+        self.record_id = record_id
+        self.animal_ID = animal_ID
+        self.cage = cage
+
+    @property
+    def date(self):
+        return datetime.date.fromordinal(self.due)
+
+    def __str__(self):
+        date = self.date
+        text = str(date.month) + "/" + str(date.day) + "/" + str(date.year)\
+            + ": "
+        if self.kind == "wean":
+            return text + "wean the litter of " + self.animal_ID\
+                + " in cage " + self.cage
+        if self.kind == "retire":
+            return text + "retire breeder " + self.animal_ID + " in cage "\
+                + self.cage
+        return text + self.animal_ID + " in cage " + self.cage\
+            + " has had no litter"
+
+    def __repr__(self):
+        return "<Task " + str(self) + ">"
+
+
+class Schedule(object):
+    """
+    Calendar of colony tasks.
+
+    calendar is a sorted list of (due, kind, record id); tasks maps
+    (kind, record id) to the Task.
+    """
+
+    def __init__(self, records=(), retirement_days=240, no_litter_days=60,
+                 animal_ID_col="Animal ID", cage_card_col="Cage Card",
+                 status_col="Status", gender_col="Gender", born_col="Born",
+                 weaning_date_col="Weaning Date",
+                 breeding_date_col="Breeding Date", breeding="B: Breeding",
+                 pups="P: With Pups", female="F"):
+        """
+        Args:
+            records: Mice records (every mouse, so litters are known).
+            retirement_days: Age in days at which breeders are retired.
+            no_litter_days: Days without a litter before a breeding female
+                            is flagged.
+            *_col: Column names.
+            breeding/pups/female: Status and gender entries.
+        """
+        self.retirement_days = retirement_days
+        self.no_litter_days = no_litter_days
+        self.animal_ID_col = animal_ID_col
+        self.cage_card_col = cage_card_col
+        self.status_col = status_col
+        self.gender_col = gender_col
+        self.born_col = born_col
+        self.weaning_date_col = weaning_date_col
+        self.breeding_date_col = breeding_date_col
+        self.breeding = breeding
+        self.pups = pups
+        self.female = female
+        # Record id --> the scheduled columns of the mouse
+        self.mice = {}
+        self.calendar = []
+        self.tasks = {}
+        # Parental cage --> birth date (ordinal) of its newest litter
+        self.litters = {}
+        # Cage --> record ids of the mice in it
+        self.cages = {}
+        self.cage_of = {}
+        self.dates = {}
+        for record in records:
+            self.mice[record["id"]] = dict(record["fields"])
+            self._add_litter(self.mice[record["id"]])
+        for record_id in self.mice:
+            self._reschedule(record_id)
+
+    def __len__(self):
+        return len(self.calendar)
+
+    def _ordinal(self, date):
+        # Most mice share a few dates, so each string is parsed once
+        if not date:
+            return MISSING
+        if date not in self.dates:
+            self.dates[date] = date_ordinal(date)
+        return self.dates[date]
+
+    def _add_litter(self, mouse):
+        # Returns the parental cage if the mouse is from a newer litter
+        animal_ID = str(mouse.get(self.animal_ID_col) or "")
+        born = self._ordinal(mouse.get(self.born_col))
+        cage = animal_ID.rsplit("-", 1)[0]
+        if cage == animal_ID or born == MISSING\
+                or born <= self.litters.get(cage, MISSING):
+            return None
+        self.litters[cage] = born
+        return cage
+
+    def _unschedule(self, record_id):
+        for kind in KINDS:
+            task = self.tasks.pop((kind, record_id), None)
+            if task is not None:
+                entry = (task.due, kind, record_id)
+                del self.calendar[bisect.bisect_left(self.calendar, entry)]
+
+    def _schedule(self, kind, due, record_id, mouse, cage):
+        task = Task(kind, due, record_id,
+                    str(mouse.get(self.animal_ID_col) or ""), cage)
+        self.tasks[(kind, record_id)] = task
+        bisect.insort(self.calendar, (due, kind, record_id))
+
+    def _reschedule(self, record_id):
+        self._unschedule(record_id)
+        mouse = self.mice[record_id]
+        cage = str(mouse.get(self.cage_card_col) or "")
+        old_cage = self.cage_of.get(record_id)
+        if old_cage != cage:
+            if old_cage is not None:
+                self.cages[old_cage].discard(record_id)
+            self.cages.setdefault(cage, set()).add(record_id)
+            self.cage_of[record_id] = cage
+
+        status = mouse.get(self.status_col)
+        if status not in (self.breeding, self.pups):
+            return
+        weaning = self._ordinal(mouse.get(self.weaning_date_col))
+        if status == self.pups and weaning != MISSING:
+            self._schedule("wean", weaning, record_id, mouse, cage)
+        born = self._ordinal(mouse.get(self.born_col))
+        if born != MISSING:
+            self._schedule("retire", born + self.retirement_days, record_id,
+                           mouse, cage)
+        bred = self._ordinal(mouse.get(self.breeding_date_col))
+        if status == self.breeding and bred != MISSING\
+                and mouse.get(self.gender_col) == self.female:
+            start = max(bred, self.litters.get(cage, MISSING))
+            self._schedule("no_litter", start + self.no_litter_days,
+                           record_id, mouse, cage)
+
+    def update(self, record_id, fields):
+        """
+        Reschedule a mouse after a write.
+
+        Args:
+            record_id: The mouse's record id.
+            fields: The fields written (merged with those already known).
+        """
+        mouse = self.mice.setdefault(record_id, {})
+        mouse.update(fields)
+        cage = self._add_litter(mouse)
+        self._reschedule(record_id)
+        # A new litter resets its parents' no litter task
+        if cage is not None:
+            for parent_id in list(self.cages.get(cage, ())):
+                self._reschedule(parent_id)
+
+    def remove(self, record_id):
+        """
+        Drop a deleted mouse.
+        """
+        if record_id in self.mice:
+            self._unschedule(record_id)
+            self.cages[self.cage_of.pop(record_id)].discard(record_id)
+            del self.mice[record_id]
+
+    def between(self, start, end, kinds=None):
+        """
+        Tasks due from start to end (datetime.date, both included), by due
+        date.
+
+        Args:
+            kinds: Kinds of task returned (default is all).
+        """
+        low = bisect.bisect_left(self.calendar, (start.toordinal(),))
+        high = bisect.bisect_left(self.calendar, (end.toordinal() + 1,))
+        return [self.tasks[(kind, record_id)] for _, kind, record_id
+                in self.calendar[low:high] if kinds is None or kind in kinds]
+
+    def due(self, date=None, kinds=None):
+        """
+        Tasks due on or before a date (default today), overdue ones first.
+
+        Args:
+            kinds: Kinds of task returned (default is all).
+        """
+        date = date or datetime.date.today()
+        high = bisect.bisect_left(self.calendar, (date.toordinal() + 1,))
+        return [self.tasks[(kind, record_id)] for _, kind, record_id
+                in self.calendar[:high] if kinds is None or kind in kinds]
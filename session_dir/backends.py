@@ -0,0 +1,407 @@
+"""
+Local stand-ins for an airtable base.
+
+A backend answers airtable's REST API in-process. Only the transport of
+the airtable wrapper is replaced, so search and match still send a
+filterByFormula, get_all still pages through 100 records at a time and
+batch writes are still chunked by 10, exactly as against airtable. Every
+Manipulate workflow therefore runs unchanged, and makes the same requests,
+against a backend. Requests can be delayed by a fixed latency, and request
+and byte counts are kept, so workflows can be tested and benchmarked
+without a live base.
+
+>>> backend = MemoryBackend(latency=0.2)
+>>> backend.add_records("Mice", [{"Animal ID": "1071-A1", "Cage Card": "5100"}])
+>>> mytable = Manipulate("base_key", "Mice", backend=backend)
+>>> mytable.SAC_cage(5100)
+>>> backend.stats()
+
+Classes:
+    LocalTable: Client whose requests are answered by a backend.
+    MemoryBackend: Base kept in dictionaries.
+    SQLiteBackend: Base kept in a SQLite database file.
+"""
+
+import datetime
+import http.client
+import json
+import posixpath
+import sqlite3
+import threading
+import time
+from urllib.parse import quote, urlencode
+
+import requests
+
+from session_dir.client import Client
+from session_dir.predicates import parse_formula
+from session_dir.snapshot import copy_record, sort_key
+from session_dir.write_buffer import MAX_BATCH_SIZE
+
+# Records per page of a list request, as on airtable
+PAGE_SIZE = 100
+
+
+def make_response(status, body, url=""):
+    """
+    Wrap a JSON body in a requests.Response.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.reason = http.client.responses.get(status, "")
+    response.url = url
+    response.encoding = "utf-8"
+    response._content = json.dumps(body).encode("utf-8")
+    return response
+
+
+def timestamp():
+    """
+    Current time in airtable's format, e.g. "2019-10-11T10:00:00.000Z".
+    """
+    return datetime.datetime.now(datetime.timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def error(status, error_type, message):
+    return status, {"error": {"type": error_type, "message": message}}
+
+
+def clean_fields(fields):
+    """
+    Drop empty cells, which airtable leaves out of a record.
+    """
+    return {name: value for name, value in fields.items()
+            if value is not None and value != "" and value != []}
+
+
+class LocalTable(Client):
+    """
+    Client for one table of a local backend.
+
+    Requests are handed to the backend instead of being sent over HTTP
+    and are not paced by a RequestScheduler.
+    """
+
+    def __init__(self, backend, base_id, table_name):
+        # Airtable.__init__ is skipped, it only sets up the HTTP session
+        self.backend = backend
+        self.table_name = table_name
+        self.url_table = posixpath.join(self.API_URL, base_id,
+                                        quote(table_name, safe=""))
+        self.timeout = None
+        self.scheduler = None
+        self.tracer = None
+        self.record_ids = None
+        self.closed = False
+
+    def _send(self, method, url, params, json_data, attempts):
+        attempts.append(1)
+        record_id = url[len(self.url_table):].strip("/")
+        return self.backend.handle(self.table_name, method, record_id,
+                                   params or {}, json_data)
+
+    def close(self):
+        self.closed = True
+
+
+class MemoryBackend(object):
+    """
+    An airtable base kept in memory.
+    """
+
+    def __init__(self, latency=0, views=None, sleep=time.sleep,
+                 modified_field=None):
+        """
+        Args:
+            latency: Seconds every request is delayed by.
+            views: Dictionary of view name --> predicate (or formula)
+                   selecting the view's records.
+            sleep: Function used to wait out the latency.
+            modified_field: Name of a "Last modified time" field to stamp
+                            on every created or updated record.
+        """
+        self.latency = latency
+        self.views = dict(views or {})
+        self.modified_field = modified_field
+        self.sleep = sleep
+        self.lock = threading.RLock()
+        self.tables = {}
+        self.count = 0
+        # Offset token --> (records of a paged list request, next position)
+        self.cursors = {}
+        self.cursor_count = 0
+        self.reset_stats()
+
+    def table(self, base_key, table_name):
+        """
+        Returns a client for one of the backend's tables.
+        """
+        return LocalTable(self, base_key, table_name)
+
+    def reset_stats(self):
+        self.requests = 0
+        self.methods = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.wait_time = 0.0
+
+    def stats(self):
+        """
+        Returns a dictionary of request, byte and latency counters.
+        """
+        with self.lock:
+            return {"requests": self.requests, "methods": dict(self.methods),
+                    "bytes_sent": self.bytes_sent,
+                    "bytes_received": self.bytes_received,
+                    "wait_time": self.wait_time}
+
+    def add_records(self, table_name, records):
+        """
+        Seed a table without counting requests.
+
+        Args:
+            records: List of field dictionaries.
+
+        Returns: The created records.
+        """
+        with self.lock:
+            return [copy_record(self._create(table_name, fields))
+                    for fields in records]
+
+    def handle(self, table_name, method, record_id, params, json_data):
+        """
+        Answer one REST request.
+
+        Args:
+            table_name: Table the request is for.
+            method: HTTP method.
+            record_id: Record id from the URL ("" for the table URL).
+            params: Query parameters, as encoded by the airtable wrapper.
+            json_data: Request body.
+
+        Returns: requests.Response
+        """
+        method = method.upper()
+        with self.lock:
+            self.requests += 1
+            self.methods[method] = self.methods.get(method, 0) + 1
+            self.bytes_sent += len(urlencode(params, doseq=True))
+            if json_data is not None:
+                self.bytes_sent += len(json.dumps(json_data))
+            status, body = self._dispatch(table_name, method, record_id,
+                                          params, json_data or {})
+            response = make_response(status, body, posixpath.join(
+                table_name, record_id))
+            self.bytes_received += len(response.content)
+            self.wait_time += self.latency
+        # Waiting outside the lock lets concurrent requests overlap
+        if self.latency:
+            self.sleep(self.latency)
+        return response
+
+    def _dispatch(self, table_name, method, record_id, params, json_data):
+        if method == "GET":
+            if not record_id:
+                return self._list(table_name, params)
+            record = self._get(table_name, record_id)
+            if record is None:
+                return self._not_found(record_id)
+            return 200, record
+
+        if method == "POST":
+            if "records" not in json_data:
+                return 200, self._create(table_name, json_data["fields"])
+            if len(json_data["records"]) > MAX_BATCH_SIZE:
+                return self._too_many()
+            return 200, {"records": [self._create(table_name, record["fields"])
+                                     for record in json_data["records"]]}
+
+        if method in ("PATCH", "PUT"):
+            replace = method == "PUT"
+            if record_id:
+                updates = [{"id": record_id, "fields": json_data["fields"]}]
+            else:
+                updates = json_data["records"]
+                if len(updates) > MAX_BATCH_SIZE:
+                    return self._too_many()
+            # Nothing is written if any record is missing
+            for update in updates:
+                if self._get(table_name, update["id"]) is None:
+                    return self._not_found(update["id"])
+            updated = [self._update(table_name, update["id"], update["fields"],
+                                    replace) for update in updates]
+            return 200, updated[0] if record_id else {"records": updated}
+
+        if method == "DELETE":
+            record_ids = [record_id] if record_id else params["records"]
+            if len(record_ids) > MAX_BATCH_SIZE:
+                return self._too_many()
+            for deleted_id in record_ids:
+                if self._get(table_name, deleted_id) is None:
+                    return self._not_found(deleted_id)
+            deleted = []
+            for deleted_id in record_ids:
+                self._delete(table_name, deleted_id)
+                deleted.append({"id": deleted_id, "deleted": True})
+            return 200, deleted[0] if record_id else {"records": deleted}
+
+        return error(405, "METHOD_NOT_ALLOWED", method + " is not supported")
+
+    def _not_found(self, record_id):
+        return error(404, "MODEL_ID_NOT_FOUND",
+                     "Could not find record " + str(record_id))
+
+    def _too_many(self):
+        return error(422, "INVALID_RECORDS", "At most "
+                     + str(MAX_BATCH_SIZE) + " records per request")
+
+    def _list(self, table_name, params):
+        # Later pages come from the records selected for the first one,
+        # instead of filtering the table again for every page
+        offset = params.get("offset")
+        if offset:
+            if offset not in self.cursors:
+                return error(422, "LIST_RECORDS_ITERATOR_NOT_AVAILABLE",
+                             "Unknown offset " + str(offset))
+            records, start = self.cursors.pop(offset)
+            return self._page(records, params, start)
+
+        records = self._records(table_name)
+        view = params.get("view")
+        if view is not None:
+            if view not in self.views:
+                return error(404, "VIEW_NAME_NOT_FOUND",
+                             "Could not find view " + str(view))
+            predicate = self.views[view]
+            if hasattr(predicate, "startswith"):
+                predicate = parse_formula(predicate)
+            records = [record for record in records
+                       if predicate.matches(record["fields"])]
+        if params.get("filterByFormula"):
+            try:
+                predicate = parse_formula(params["filterByFormula"])
+            except ValueError as exc:
+                return error(422, "INVALID_FILTER_BY_FORMULA", str(exc))
+            records = [record for record in records
+                       if predicate.matches(record["fields"])]
+
+        # sort[0][field], sort[0][direction], sort[1][field], ...
+        sort = []
+        while "sort[" + str(len(sort)) + "][field]" in params:
+            prefix = "sort[" + str(len(sort)) + "]"
+            sort.append((params[prefix + "[field]"],
+                         params.get(prefix + "[direction]") == "desc"))
+        for field_name, descending in reversed(sort):
+            records = sorted(records, reverse=descending, key=lambda r:
+                             sort_key(r["fields"].get(field_name)))
+        if params.get("maxRecords"):
+            records = records[:int(params["maxRecords"])]
+        return self._page(records, params)
+
+    def _page(self, records, params, start=0):
+        end = start + int(params.get("pageSize") or PAGE_SIZE)
+        fields = params.get("fields[]")
+        body = {"records": [copy_record(record, fields) for record
+                            in records[start:end]]}
+        if end < len(records):
+            self.cursor_count += 1
+            offset = "itr" + str(self.cursor_count)
+            self.cursors[offset] = (records, end)
+            body["offset"] = offset
+        return 200, body
+
+    def _create(self, table_name, fields):
+        self.count += 1
+        record = {"id": "rec" + str(self.count).zfill(14),
+                  "createdTime": timestamp(),
+                  "fields": self._stamp(clean_fields(fields))}
+        self._put(table_name, record)
+        return record
+
+    def _update(self, table_name, record_id, fields, replace=False):
+        record = self._get(table_name, record_id)
+        new_fields = {} if replace else dict(record["fields"])
+        new_fields.update(fields)
+        record = dict(record, fields=self._stamp(clean_fields(new_fields)))
+        self._put(table_name, record)
+        return record
+
+    def _stamp(self, fields):
+        if self.modified_field is not None:
+            fields[self.modified_field] = timestamp()
+        return fields
+
+    # Storage, overridden by SQLiteBackend. Records are kept in the order
+    # they were created.
+
+    def _records(self, table_name):
+        return list(self.tables.get(table_name, {}).values())
+
+    def _get(self, table_name, record_id):
+        return self.tables.get(table_name, {}).get(record_id)
+
+    def _put(self, table_name, record):
+        self.tables.setdefault(table_name, {})[record["id"]] = record
+
+    def _delete(self, table_name, record_id):
+        self.tables.get(table_name, {}).pop(record_id, None)
+
+
+class SQLiteBackend(MemoryBackend):
+    """
+    An airtable base kept in a SQLite database, so that a seeded base can
+    be reused between runs.
+    """
+
+    def __init__(self, path=":memory:", latency=0, views=None,
+                 sleep=time.sleep, modified_field=None):
+        """
+        Args:
+            path: SQLite database file (default: in memory).
+            latency/views/sleep/modified_field: As for MemoryBackend.
+        """
+        super(SQLiteBackend, self).__init__(latency, views, sleep,
+                                            modified_field)
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS records (table_name TEXT NOT NULL, "
+            "id TEXT NOT NULL, created_time TEXT NOT NULL, "
+            "fields TEXT NOT NULL, PRIMARY KEY (table_name, id))")
+        # Record ids continue from the ones already in the file
+        last_id = self.connection.execute(
+            "SELECT MAX(id) FROM records").fetchone()[0]
+        self.count = int(last_id[3:]) if last_id else 0
+
+    def close(self):
+        self.connection.close()
+
+    def _record(self, row):
+        return {"id": row[0], "createdTime": row[1],
+                "fields": json.loads(row[2])}
+
+    def _records(self, table_name):
+        # Ids are zero padded and increasing, so id order is creation order
+        rows = self.connection.execute(
+            "SELECT id, created_time, fields FROM records "
+            "WHERE table_name = ? ORDER BY id", (table_name,))
+        return [self._record(row) for row in rows]
+
+    def _get(self, table_name, record_id):
+        row = self.connection.execute(
+            "SELECT id, created_time, fields FROM records "
+            "WHERE table_name = ? AND id = ?", (table_name, record_id))\
+            .fetchone()
+        return None if row is None else self._record(row)
+
+    def _put(self, table_name, record):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+            (table_name, record["id"], record["createdTime"],
+             json.dumps(record["fields"])))
+
+    def _delete(self, table_name, record_id):
+        self.connection.execute(
+            "DELETE FROM records WHERE table_name = ? AND id = ?",
+            (table_name, record_id))
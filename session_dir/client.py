@@ -0,0 +1,147 @@
+"""
+Long-lived airtable client shared by every call of a session.
+
+Classes:
+    Client: Airtable object whose HTTP session keeps a pool of keep-alive
+            connections.
+"""
+
+import json
+import time
+from urllib.parse import unquote, urlencode
+
+from airtable import Airtable
+from requests.adapters import HTTPAdapter
+
+from session_dir.predicates import startswith
+from session_dir.scheduler import get_scheduler
+
+
+class Client(Airtable):
+    """
+    Airtable object meant to be created once per session and reused.
+
+    All requests go through one requests.Session with a connection pool,
+    so TLS and TCP setup is paid once instead of on every method call.
+    Requests are paced by the RequestScheduler shared by every client on
+    the same base, which also retries 429 responses, and 5xx responses to
+    requests that are safe to repeat (see idempotent()). Each request
+    is reported to the client's tracer, if it has one, and the records it
+    returns to its RecordIDMap (record_ids), if it has one.
+    """
+
+    # Pacing is done by the scheduler instead of sleeping after each page
+    API_LIMIT = 0
+
+    def __init__(self, base_id, table_name, api_key=None, timeout=None,
+                 pool_size=10, scheduler=None, tracer=None):
+        """
+        Args:
+            base_id: Airtable base key.
+            table_name: Airtable table name.
+            api_key: API key (AIRTABLE_API_KEY is used if not given).
+            timeout: Optional requests timeout.
+            pool_size: Maximum number of pooled keep-alive connections.
+            scheduler: RequestScheduler to use (default: shared per base).
+            tracer: Tracer requests are reported to.
+        """
+        super(Client, self).__init__(base_id, table_name, api_key,
+                                     timeout=timeout)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.scheduler = scheduler or get_scheduler(base_id)
+        self.tracer = tracer
+        self.record_ids = None
+        self.closed = False
+
+    def _request(self, method, url, params=None, json_data=None):
+        attempts = []
+        start = time.perf_counter()
+        response = self._send(method, url, params, json_data, attempts)
+        if self.tracer is not None:
+            sent = len(urlencode(params or {}, doseq=True))
+            if json_data is not None:
+                sent += len(json.dumps(json_data))
+            endpoint = unquote(url[len(self.API_URL):].lstrip("/"))
+            self.tracer.request(method, endpoint, time.perf_counter() - start,
+                                len(attempts) - 1, sent,
+                                len(response.content), response.status_code)
+        result = self._process_response(response)
+        if self.record_ids is not None:
+            self.record_ids.observe_response(result)
+        return result
+
+    def _send(self, method, url, params, json_data, attempts):
+        """
+        Send a request through the scheduler, appending to attempts once
+        per try.
+
+        Returns: requests.Response
+        """
+        def send_request():
+            attempts.append(1)
+            return self.session.request(method, url, params=params,
+                                        json=json_data, timeout=self.timeout)
+        return self.scheduler.send(send_request,
+                                   self.idempotent(method, url))
+
+    def idempotent(self, method, url):
+        """
+        True if a request can safely be sent again after a server error:
+        reads, and updates or deletes of a single record. Inserts (POST)
+        and batch writes are sent once.
+        """
+        method = method.upper()
+        if method == "GET":
+            return True
+        return method in ("PATCH", "DELETE") and url != self.url_table
+
+    def query(self, predicate, **options):
+        """
+        Returns the records matching a predicate, filtered by airtable.
+
+        Args:
+            predicate: A session_dir.predicates condition.
+
+        Keyword Args:
+            Same as get_all (fields, view, sort, max_records, ...).
+        """
+        options["formula"] = predicate.formula()
+        return self.get_all(**options)
+
+    def search_prefix(self, field_name, prefix, **options):
+        """
+        Returns all records whose field_name starts with prefix, in one
+        filtered query.
+        """
+        return self.query(startswith(field_name, prefix), **options)
+
+    def pages(self, offset=None, **options):
+        """
+        Like get_iter(), but yields (records, offset) pairs, where offset
+        is the token of the next page (None after the last page). Passing
+        a saved offset back in resumes the listing from that page, as long
+        as airtable still holds it.
+
+        Keyword Args:
+            Same as get_iter (fields, view, sort, formula, page_size, ...).
+        """
+        while True:
+            data = self._get(self.url_table, offset=offset, **options)
+            offset = data.get("offset")
+            yield data.get("records", []), offset
+            if not offset:
+                break
+
+    def close(self):
+        """
+        Close the pooled connections.
+        """
+        self.session.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
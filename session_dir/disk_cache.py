@@ -0,0 +1,159 @@
+"""
+Persistent on-disk copy of an airtable data table.
+
+A DiskCache keeps a table's records in a SQLite file that outlives the
+Python session. The first sync downloads the whole table; later syncs only
+ask airtable for the records whose "Last modified time" field is at or
+after the newest one already cached, so a warm start costs a few delta
+requests instead of a full paginated download. Deleted records do not show
+up in a delta, so every sweep_interval seconds a sync also lists the ids
+of all records (fetching a single field) and drops the ones that are gone.
+
+>>> cache = DiskCache(cache_path("base_key", "Mice"))
+>>> records = cache.sync(airtable)
+
+Classes:
+    DiskCache: SQLite copy of one table, synced by modification time.
+
+Functions:
+    cache_path:
+        The cache file used for a base and table.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+from session_dir.predicates import modified_since
+
+# Used when no cache directory is given
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                 "airtable-animal-database")
+# Seconds between sweeps for deleted records
+SWEEP_INTERVAL = 3600
+
+
+def cache_path(base_key, table_name, cache_dir=None):
+    """
+    Returns the cache file for a table: <cache_dir>/<base_key>/<table>.sqlite
+    """
+    cache_dir = os.path.expanduser(cache_dir or DEFAULT_CACHE_DIR)
+    directory = os.path.join(cache_dir, base_key)
+    return os.path.join(directory, quote(table_name, safe="") + ".sqlite")
+
+
+class DiskCache(object):
+    """
+    SQLite copy of one airtable table, kept current by delta syncs.
+
+    The table needs a "Last modified time" field (modified_field). Without
+    one every sync falls back to a full download.
+    """
+
+    def __init__(self, path, modified_field="Last Modified",
+                 sweep_interval=SWEEP_INTERVAL, clock=time.time):
+        """
+        Args:
+            path: SQLite file (its directory is created if needed).
+            modified_field: Name of the table's "Last modified time" field.
+            sweep_interval: Seconds between sweeps for deleted records.
+            clock: Function returning the current time in seconds.
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.modified_field = modified_field
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS records (id TEXT PRIMARY KEY, "
+                "created_time TEXT NOT NULL, fields TEXT NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, "
+                "value TEXT)")
+
+    def close(self):
+        self.connection.close()
+
+    def get_state(self, name):
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _set_state(self, name, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO state VALUES (?, ?)",
+            (name, json.dumps(value)))
+
+    def records(self):
+        """
+        Returns every cached record.
+        """
+        rows = self.connection.execute(
+            "SELECT id, created_time, fields FROM records ORDER BY rowid")
+        return [{"id": row[0], "createdTime": row[1],
+                 "fields": json.loads(row[2])} for row in rows]
+
+    def _save(self, records):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?)",
+            [(record["id"], record.get("createdTime", ""),
+              json.dumps(record["fields"])) for record in records])
+
+    def _newest(self, records, newest=None):
+        # Highest modification time among records (and newest)
+        for record in records:
+            modified = record["fields"].get(self.modified_field)
+            if modified and (newest is None or modified > newest):
+                newest = modified
+        return newest
+
+    def sync(self, airtable, full=False):
+        """
+        Bring the cache up to date with airtable.
+
+        Args:
+            airtable: Airtable object to sync from (must provide query()).
+            full: Download the whole table even if the cache is warm.
+
+        Returns: Every record of the table.
+        """
+        with self.lock, self.connection:
+            newest = self.get_state("newest")
+            now = self.clock()
+            if full or newest is None:
+                records = airtable.get_all()
+                self.connection.execute("DELETE FROM records")
+                self._save(records)
+                # Without a modification time the next sync is a full one
+                self._set_state("newest", self._newest(records))
+                self._set_state("swept", now)
+                return records
+
+            # Records modified at the newest cached time are fetched again,
+            # so an edit made in the same millisecond is not missed
+            changed = airtable.query(modified_since(self.modified_field,
+                                                    newest))
+            self._save(changed)
+            self._set_state("newest", self._newest(changed, newest))
+            swept = self.get_state("swept")
+            if swept is None or now - swept >= self.sweep_interval:
+                self._sweep(airtable)
+                self._set_state("swept", now)
+        return self.records()
+
+    def _sweep(self, airtable):
+        # Only the id and one small field of each record are downloaded
+        live = set(record["id"] for record
+                   in airtable.get_all(fields=[self.modified_field]))
+        cached = [row[0] for row
+                  in self.connection.execute("SELECT id FROM records")]
+        self.connection.executemany(
+            "DELETE FROM records WHERE id = ?",
+            [(record_id,) for record_id in cached if record_id not in live])
@@ -0,0 +1,123 @@
+"""
+Allocation of the numeric "ID" column for new records.
+
+Instead of running a sorted max-ID query before every insert, each table
+keeps a cached high-water mark and hands out contiguous blocks of IDs from
+it. Blocks never overlap within a process. Sessions in other processes can
+still pick the same IDs, so after inserting, the caller checks the block
+with one range query and moves its records if another session inserted
+the same IDs first.
+
+Classes:
+    IDAllocator: Cached high-water mark and block reservation.
+
+Functions:
+    get_allocator:
+        Returns the allocator shared by all sessions on a table.
+"""
+
+import threading
+
+
+def created_order(record):
+    """
+    Sort key putting the record created first (then lowest record id) first.
+    """
+    return (record.get("createdTime", ""), record["id"])
+
+
+class IDAllocator(object):
+    """
+    Hands out contiguous blocks of IDs above the highest ID seen.
+    """
+
+    def __init__(self):
+        self.high_water = None
+        # Set by forget(): the table's max ID should be read again
+        self.stale = False
+        self.lock = threading.Lock()
+
+    def needs_max(self):
+        """
+        True until the table's max ID has been observed, and again after
+        forget().
+        """
+        return self.high_water is None or self.stale
+
+    def observe(self, ID):
+        """
+        Raise the high-water mark to an ID seen in the table.
+        """
+        with self.lock:
+            self.stale = False
+            if self.high_water is None or int(ID) > self.high_water:
+                self.high_water = int(ID)
+
+    def forget(self):
+        """
+        Ask for the table's max ID to be observed again before the next
+        reservation, to move past IDs other processes have used. The mark
+        is kept as a floor, so blocks already handed out in this process
+        are never handed out again.
+        """
+        with self.lock:
+            self.stale = True
+
+    def reserve(self, count):
+        """
+        Reserve count consecutive IDs.
+
+        Returns: range of the reserved IDs.
+        """
+        with self.lock:
+            assert self.high_water is not None,\
+                   "Max ID must be observed before reserving IDs"
+            start = self.high_water + 1
+            self.high_water += count
+            return range(start, start + count)
+
+    def collisions(self, inserted, existing, ID_col="ID"):
+        """
+        Find which inserted records must give up their ID.
+
+        When two records share an ID the one created first keeps it.
+
+        Args:
+            inserted: Records this session inserted.
+            existing: Records in the table with IDs in the inserted range
+                      (from a query run after inserting).
+            ID_col: Name of the ID column.
+
+        Returns:
+            List of the inserted records that need a new ID.
+        """
+        holders = {}
+        for record in existing:
+            if ID_col in record["fields"]:
+                ID = int(record["fields"][ID_col])
+                holders.setdefault(ID, []).append(record)
+                self.observe(ID)
+        losers = []
+        for record in inserted:
+            others = [holder for holder
+                      in holders.get(int(record["fields"][ID_col]), [])
+                      if holder["id"] != record["id"]]
+            if any(created_order(other) < created_order(record)
+                   for other in others):
+                losers.append(record)
+        return losers
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(base_key, table_name):
+    """
+    Returns the IDAllocator shared by every session on a table.
+    """
+    with _allocators_lock:
+        allocator = _allocators.get((base_key, table_name))
+        if allocator is None:
+            allocator = _allocators[(base_key, table_name)] = IDAllocator()
+        return allocator
@@ -0,0 +1,344 @@
+"""
+Record conditions that can run on airtable or locally.
+
+A predicate compiles to an airtable filterByFormula expression, so only
+matching rows are downloaded, and can also be evaluated against a record's
+fields, so a TableSnapshot answers the same query without a request.
+
+>>> alive = AND(ne("Status", "S: Sacrificed"), ne("Status", "D: Died"))
+>>> alive.formula()
+"AND({Status}!='S: Sacrificed',{Status}!='D: Died')"
+>>> airtable.query(AND(eq("Cage Card", 5100), alive), fields=["Animal ID"])
+
+Functions:
+    eq, ne: Field equals / does not equal a value.
+    contains: Field contains a piece of text.
+    startswith: Field starts with a piece of text.
+    between: Field's numeric value lies in a range.
+    modified_since: Date field is at or after a time (or blank).
+    AND, OR, NOT: Combine predicates.
+    parse_formula: Read a formula written by these predicates (or by the
+                   airtable wrapper's search) back into a predicate.
+"""
+
+import re
+
+
+def quote(value):
+    """
+    Format a value as an airtable formula literal.
+    """
+    if isinstance(value, bool):
+        return "TRUE()" if value else "FALSE()"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + re.sub("(?<!\\\\)'", "\\\\'", str(value)) + "'"
+
+
+def text(fields, name):
+    """
+    A cell as text the way airtable compares it (blank cells are "").
+    """
+    value = fields.get(name)
+    return "" if value is None else str(value)
+
+
+class Predicate(object):
+    """
+    Base class of all predicates; combine them with &, | and ~.
+    """
+
+    def formula(self):
+        raise NotImplementedError
+
+    def matches(self, fields):
+        raise NotImplementedError
+
+    def fields(self):
+        """
+        Names of the fields the predicate reads.
+        """
+        return [self.field_name]
+
+    def __and__(self, other):
+        return AND(self, other)
+
+    def __or__(self, other):
+        return OR(self, other)
+
+    def __invert__(self):
+        return NOT(self)
+
+    def __repr__(self):
+        return "<Predicate " + self.formula() + ">"
+
+
+class Compare(Predicate):
+    def __init__(self, field_name, value, equal=True):
+        self.field_name = field_name
+        self.value = value
+        self.equal = equal
+
+    def formula(self):
+        operator = "=" if self.equal else "!="
+        return "{" + self.field_name + "}" + operator + quote(self.value)
+
+    def matches(self, fields):
+        same = text(fields, self.field_name) == str(self.value)
+        return same if self.equal else not same
+
+
+class Contains(Predicate):
+    def __init__(self, field_name, part, at_start=False):
+        self.field_name = field_name
+        self.part = part
+        self.at_start = at_start
+
+    def formula(self):
+        position = "=1" if self.at_start else ">0"
+        return "FIND(" + quote(str(self.part)) + ",{" + self.field_name\
+               + "})" + position
+
+    def matches(self, fields):
+        value = text(fields, self.field_name)
+        if self.at_start:
+            return value.startswith(str(self.part))
+        return str(self.part) in value
+
+
+class Number(Predicate):
+    # Numeric comparisons, evaluated the way airtable's VALUE() reads a cell
+    operators = {
+        "=": lambda a, b: a == b, "!=": lambda a, b: a != b,
+        ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+        "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    }
+
+    def __init__(self, field_name, operator, value):
+        assert operator in self.operators, "Unknown operator: " + operator
+        self.field_name = field_name
+        self.operator = operator
+        self.value = value
+
+    def formula(self):
+        # Concatenating '' makes VALUE() work for number and text columns
+        return "VALUE({" + self.field_name + "}&'')" + self.operator\
+               + quote(self.value)
+
+    def matches(self, fields):
+        try:
+            number = float(text(fields, self.field_name))
+        except ValueError:
+            return False
+        return self.operators[self.operator](number, float(self.value))
+
+
+class DateCompare(Predicate):
+    # Date cells are compared as airtable ISO 8601 UTC strings
+    # (e.g. "2019-10-11T10:00:00.000Z"), which sort chronologically
+    def __init__(self, field_name, timestamp, before=True):
+        self.field_name = field_name
+        self.timestamp = timestamp
+        self.before = before
+
+    def formula(self):
+        name = "IS_BEFORE" if self.before else "IS_AFTER"
+        return name + "({" + self.field_name + "}," + quote(self.timestamp)\
+               + ")"
+
+    def matches(self, fields):
+        value = text(fields, self.field_name)
+        if not value:
+            return False
+        if self.before:
+            return value < self.timestamp
+        return value > self.timestamp
+
+
+class Combine(Predicate):
+    def __init__(self, name, predicates):
+        self.name = name
+        self.predicates = list(predicates)
+
+    def formula(self):
+        return self.name + "(" + ",".join(predicate.formula() for predicate
+                                          in self.predicates) + ")"
+
+    def matches(self, fields):
+        if self.name == "AND":
+            return all(predicate.matches(fields)
+                       for predicate in self.predicates)
+        if self.name == "OR":
+            return any(predicate.matches(fields)
+                       for predicate in self.predicates)
+        return not self.predicates[0].matches(fields)
+
+    def fields(self):
+        names = []
+        for predicate in self.predicates:
+            names += [name for name in predicate.fields()
+                      if name not in names]
+        return names
+
+
+def eq(field_name, value):
+    return Compare(field_name, value)
+
+
+def ne(field_name, value):
+    return Compare(field_name, value, equal=False)
+
+
+def contains(field_name, part):
+    return Contains(field_name, part)
+
+
+def startswith(field_name, prefix):
+    return Contains(field_name, prefix, at_start=True)
+
+
+def between(field_name, low, high):
+    return AND(Number(field_name, ">=", low), Number(field_name, "<=", high))
+
+
+def modified_since(field_name, timestamp):
+    return NOT(DateCompare(field_name, timestamp, before=True))
+
+
+def AND(*predicates):
+    return Combine("AND", predicates)
+
+
+def OR(*predicates):
+    return Combine("OR", predicates)
+
+
+def NOT(predicate):
+    return Combine("NOT", [predicate])
+
+
+TOKENS = re.compile(r"\s*(\{[^}]*\}|'(?:\\.|[^'\\])*'|-?\d+(?:\.\d+)?"
+                    r"|!=|>=|<=|[=<>&(),]|[A-Z_]+)")
+
+
+def parse_formula(formula):
+    """
+    Read a formula back into a predicate.
+
+    Only the formulas the predicates above compile to, plus the
+    {Field}=value formulas of the airtable wrapper's search() and match(),
+    are understood.
+
+    Raises:
+        ValueError: The formula uses anything else.
+    """
+    tokens = []
+    position = 0
+    formula = formula.strip()
+    while position < len(formula):
+        match = TOKENS.match(formula, position)
+        if match is None:
+            raise ValueError("Unsupported formula: " + formula)
+        tokens.append(match.group(1))
+        position = match.end()
+    parser = FormulaParser(formula, tokens)
+    predicate = parser.expression()
+    if parser.position != len(tokens):
+        raise ValueError("Unsupported formula: " + formula)
+    return predicate
+
+
+class FormulaParser(object):
+    def __init__(self, formula, tokens):
+        self.formula = formula
+        self.tokens = tokens
+        self.position = 0
+
+    def fail(self):
+        raise ValueError("Unsupported formula: " + self.formula)
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            self.fail()
+        self.position += 1
+        return token
+
+    def expression(self):
+        name = self.peek()
+        if name in ("AND", "OR", "NOT"):
+            self.take()
+            self.take("(")
+            predicates = [self.expression()]
+            while self.peek() == ",":
+                self.take()
+                predicates.append(self.expression())
+            self.take(")")
+            return Combine(name, predicates)
+        return self.comparison()
+
+    def comparison(self):
+        token = self.take()
+        if token == "FIND":
+            self.take("(")
+            part = self.literal()
+            self.take(",")
+            field_name = self.field()
+            self.take(")")
+            position = self.take() + self.take()
+            if position not in ("=1", ">0"):
+                self.fail()
+            return Contains(field_name, part, at_start=position == "=1")
+        if token in ("IS_BEFORE", "IS_AFTER"):
+            self.take("(")
+            field_name = self.field()
+            self.take(",")
+            timestamp = self.literal()
+            self.take(")")
+            return DateCompare(field_name, timestamp,
+                               before=token == "IS_BEFORE")
+        if token == "VALUE":
+            self.take("(")
+            field_name = self.field()
+            self.take("&")
+            if self.take() != "''":
+                self.fail()
+            self.take(")")
+            operator = self.take()
+            if operator not in Number.operators:
+                self.fail()
+            return Number(field_name, operator, self.literal())
+        self.position -= 1
+        field_name = self.field()
+        operator = self.take()
+        if operator not in ("=", "!="):
+            self.fail()
+        return Compare(field_name, self.literal(), equal=operator == "=")
+
+    def field(self):
+        token = self.take()
+        if not token.startswith("{"):
+            self.fail()
+        return token[1:-1]
+
+    def literal(self):
+        token = self.take()
+        if token.startswith("'"):
+            return re.sub(r"\\(.)", r"\1", token[1:-1])
+        if token in ("TRUE", "FALSE"):
+            self.take("(")
+            self.take(")")
+            return token == "TRUE"
+        try:
+            return int(token)
+        except ValueError:
+            pass
+        try:
+            return float(token)
+        except ValueError:
+            self.fail()
@@ -0,0 +1,97 @@
+"""
+Cache of record ids by a key field.
+
+Updating a record by a field value (update_by_field) costs a search and a
+PATCH. A RecordIDMap remembers the record id behind each value of one
+field (e.g. "Animal ID") from every record a session's clients receive,
+so a later update can PATCH the id directly. Records a response reports
+deleted are dropped, and a record that comes back with a new value (a
+rename) is moved to it.
+
+Only responses seen by the session update the map: an id may go stale if
+another session deletes or renames the record, so callers should fall back
+to a search when an update by a cached id fails.
+
+>>> record_ids = RecordIDMap("Animal ID")
+>>> client.record_ids = record_ids
+>>> record_ids.get("4881-D3")
+'recwPQIfs4wKPyc9D'
+
+Classes:
+    RecordIDMap: Field value --> record id.
+"""
+
+import threading
+
+
+class RecordIDMap(object):
+    """
+    Field value --> record id for one field, filled from responses.
+    """
+
+    def __init__(self, field_name):
+        """
+        Args:
+            field_name: The field whose values identify records.
+        """
+        self.field_name = field_name
+        self.lock = threading.Lock()
+        self.ids = {}
+        # Record id --> its value, to spot renames and deletions
+        self.values = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, value):
+        """
+        Returns the record id last seen with the value, or None.
+        """
+        return self.ids.get(str(value))
+
+    def observe(self, records):
+        """
+        Remember the ids of records. Records read without the field are
+        ignored.
+        """
+        with self.lock:
+            for record in records:
+                value = record.get("fields", {}).get(self.field_name)
+                if value is None:
+                    continue
+                self._forget(record["id"])
+                self.ids[str(value)] = record["id"]
+                self.values[record["id"]] = str(value)
+
+    def discard(self, record_id):
+        """
+        Forget a record (e.g. after deleting it).
+        """
+        with self.lock:
+            self._forget(record_id)
+
+    def _forget(self, record_id):
+        value = self.values.pop(record_id, None)
+        if value is not None and self.ids.get(value) == record_id:
+            del self.ids[value]
+
+    def observe_response(self, result):
+        """
+        Update the map from a decoded airtable response: a record, a list
+        of records, or deletion results.
+        """
+        if not isinstance(result, dict):
+            return
+        records = result.get("records", [result])
+        for record in records:
+            if not isinstance(record, dict) or "id" not in record:
+                continue
+            if record.get("deleted"):
+                self.discard(record["id"])
+            elif "fields" in record:
+                self.observe([record])
+
+    def clear(self):
+        with self.lock:
+            self.ids = {}
+            self.values = {}
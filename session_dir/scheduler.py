@@ -0,0 +1,189 @@
+"""
+Rate limiting for airtable requests.
+
+Airtable allows about 5 requests per second per base. Every Client that
+targets the same base key shares one RequestScheduler, which paces requests
+with a token bucket and retries throttled (429) and server error (5xx)
+responses with jittered exponential backoff. A throttled request was
+never processed, so it is always retried; after a server error the
+request may have gone through, so it is only retried if sending it again
+is safe (idempotent), never for an insert.
+
+Classes:
+    TokenBucket: Thread safe token bucket.
+    RequestScheduler: Paces and retries requests for one base.
+
+Functions:
+    get_scheduler:
+        Returns the scheduler shared by all sessions on a base key.
+"""
+
+import random
+import threading
+import time
+
+# Airtable's documented limit is 5 requests per second per base
+RATE_LIMIT = 5.0
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled at rate tokens per second up to capacity.
+
+    A caller that finds the bucket empty reserves the next token and sleeps
+    until it is due, so concurrent callers are served in arrival order.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, capacity=RATE_LIMIT,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, waiting if necessary.
+
+        Returns: Seconds spent waiting.
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class RequestScheduler(object):
+    """
+    Paces requests to one base and retries 429 responses, and 5xx
+    responses to idempotent requests.
+
+    Counters:
+        requests: Requests sent (including retries).
+        retries: Requests that were retried.
+        throttled: 429 responses received.
+        queue_depth: Callers currently waiting for a token.
+        max_queue_depth: Largest queue_depth seen.
+        wait_time: Total seconds spent waiting for tokens and backoff.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_LIMIT, max_retries=5,
+                 backoff=0.5, max_backoff=30.0, clock=time.monotonic,
+                 sleep=time.sleep):
+        """
+        Args:
+            rate: Requests per second.
+            burst: Requests that may be sent back to back.
+            max_retries: Retries per request before the error is returned.
+            backoff: Base delay in seconds of the exponential backoff.
+            max_backoff: Longest delay between retries.
+        """
+        self.bucket = TokenBucket(rate, burst, clock, sleep)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.wait_time = 0.0
+
+    def _acquire(self):
+        with self.lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            waited = self.bucket.acquire()
+        finally:
+            with self.lock:
+                self.queue_depth -= 1
+                self.wait_time += waited
+                self.requests += 1
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Full-jitter exponential backoff, never shorter than Retry-After.
+        """
+        delay = random.uniform(0, min(self.max_backoff,
+                                      self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @staticmethod
+    def should_retry(response, idempotent=True):
+        if response.status_code == 429:
+            return True
+        return idempotent and response.status_code >= 500
+
+    def send(self, send_request, idempotent=True):
+        """
+        Send a request, pacing it and retrying throttled or failed ones.
+
+        Args:
+            send_request: Callable sending the request and returning a
+                          requests.Response.
+            idempotent: The request may be sent again after a server error
+                        (False for an insert, which could be written
+                        twice).
+
+        Returns: The final response (which may still be an error).
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            response = send_request()
+            if not self.should_retry(response, idempotent)\
+                    or attempt >= self.max_retries:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after)
+            except (TypeError, ValueError):
+                retry_after = None
+            delay = self.delay(attempt, retry_after)
+            with self.lock:
+                self.retries += 1
+                if response.status_code == 429:
+                    self.throttled += 1
+                self.wait_time += delay
+            self.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        """
+        Returns the counters as a dictionary.
+        """
+        with self.lock:
+            return {"requests": self.requests, "retries": self.retries,
+                    "throttled": self.throttled,
+                    "queue_depth": self.queue_depth,
+                    "max_queue_depth": self.max_queue_depth,
+                    "wait_time": self.wait_time}
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(base_key):
+    """
+    Returns the RequestScheduler shared by every session on base_key.
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(base_key)
+        if scheduler is None:
+            scheduler = _schedulers[base_key] = RequestScheduler()
+        return scheduler
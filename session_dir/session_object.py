@@ -1,16 +1,227 @@
-from airtable import Airtable
+import contextlib
+
+from session_dir.client import Client
+from session_dir.disk_cache import DiskCache, cache_path
+from session_dir.scheduler import get_scheduler
+from session_dir.snapshot import TableSnapshot
+from session_dir.staging import StagedTable
+from session_dir.tracing import Tracer
+from session_dir.unit_of_work import UnitOfWork
 
 class Session(object):
-    def __init__(self, base_key, table_name, API_key=None):
-        self.base_key = base_key 
-        self.table_name = table_name 
-        self.API_key = API_key 
+    """
+    Connection to one airtable data table.
+
+    The session owns a pooled Client per table that every method shares.
+    Close it when done, or use the session as a context manager:
+
+    >>> with Manipulate('base_key', 'table_name', 'API_key') as mytable:
+    ...     mytable.SAC_cage(5332)
+
+    Pass a backend (see session_dir/backends.py) to run against a local
+    stand-in for airtable instead.
+
+    Requests are recorded by the session's tracer (see
+    session_dir/tracing.py); pass tracer to share one between sessions.
+
+    Pass cache_dir to keep the snapshot in a DiskCache under that directory,
+    so a new session downloads only the records changed since the last one.
+
+    Writes made inside unit_of_work() are merged per record and sent when
+    the block exits.
+    """
+
+    def __init__(self, base_key, table_name, API_key=None, snapshot=False,
+                 pool_size=10, backend=None, tracer=None, cache_dir=None):
+        self.base_key = base_key
+        self.table_name = table_name
+        self.API_key = API_key
+        # Snapshot mode keeps an indexed local copy of the table, on disk
+        # if a cache directory is given
+        self.snapshot = snapshot or cache_dir is not None
+        self.cache_dir = cache_dir
+        self.indexed_fields = []
+        # Views the snapshot answers locally: view name --> predicate
+        self.local_views = {}
+        # "Last modified time" field used to sync the disk cache
+        self.modified_field = "Last Modified"
+        self._cache = None
+        self.pool_size = pool_size
+        # Local stand-in for airtable, if any
+        self.backend = backend
+        self._snapshot = None
+        self._staged = None
+        self._unit = None
+        self._clients = {}
+        # Shared with every session on the same base
+        self.scheduler = get_scheduler(base_key)
+        self.tracer = tracer or Tracer()
+        # RecordIDMap the session's table fills from every response, if any
+        self.record_ids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def Authenticate(self, base_key, table_name, API_key=None):
         """
         Authenticate airtable API with entry table.
 
+        The same pooled client is returned on every call for a table.
+        In snapshot mode the session's own table is answered by a shared
+        TableSnapshot, loaded on first use, or by the StagedTable while
+        writes are being staged.
+
         Returns: Airtable class object
         """
+        client = self.client(base_key, table_name, API_key)
+        if self._unit is not None and (base_key, table_name)\
+                == (self.base_key, self.table_name):
+            return self._unit
+        if self.snapshot and (base_key, table_name) == (self.base_key,
+                                                        self.table_name):
+            if self._staged is not None:
+                return self._staged
+            if self._snapshot is None:
+                if self.cache_dir is not None:
+                    self._cache = DiskCache(
+                        cache_path(base_key, table_name, self.cache_dir),
+                        self.modified_field)
+                self._snapshot = TableSnapshot(client, self.indexed_fields,
+                                               self._cache, self.local_views,
+                                               self.record_model())
+            return self._snapshot
+
+        return client
+
+    def record_model(self):
+        """
+        Model the snapshot keeps records in (see TableSnapshot), or None to
+        keep the dictionaries airtable returns.
+        """
+        return None
+
+    def client(self, base_key, table_name, API_key=None):
+        """
+        Returns the session's pooled client for a table, creating it once.
+        """
+        key = (base_key, table_name, API_key)
+        client = self._clients.get(key)
+        if client is None or client.closed:
+            if self.backend is not None:
+                client = self.backend.table(base_key, table_name)
+            else:
+                client = Client(base_key, table_name, API_key,
+                                pool_size=self.pool_size,
+                                scheduler=get_scheduler(base_key))
+            client.tracer = self.tracer
+            self._clients[key] = client
+            if (base_key, table_name) == (self.base_key, self.table_name):
+                client.record_ids = self.record_ids
+                if self._snapshot is not None:
+                    self._snapshot.airtable = client
+        return client
+
+    def stage(self, batch=True):
+        """
+        Stage every write to the session's table until commit() or
+        discard() (snapshot mode only).
+
+        Returns: The StagedTable holding the staged writes.
+        """
+        assert self.snapshot, "Staging writes requires snapshot mode"
+        assert self._staged is None, "Writes are already being staged"
+        snapshot = self.Authenticate(self.base_key, self.table_name,
+                                     self.API_key)
+        self._staged = StagedTable(snapshot, batch=batch)
+        return self._staged
+
+    def commit(self):
+        """
+        Send the staged writes and stop staging.
 
-        return Airtable(base_key, table_name, API_key)
\ No newline at end of file
+        Returns: Dictionary of staged record id --> written record.
+        """
+        staged, self._staged = self._staged, None
+        return staged.commit() if staged is not None else {}
+
+    def discard(self):
+        """
+        Drop the staged writes and stop staging.
+        """
+        staged, self._staged = self._staged, None
+        if staged is not None:
+            staged.rollback()
+            self.rolled_back()
+
+    @contextlib.contextmanager
+    def unit_of_work(self, batch=True):
+        """
+        Context manager merging the writes made to the session's table in
+        the block, one write per record, sent when the block exits.
+
+        Nothing is sent if the block raises. If sending fails partway, the
+        writes already sent are undone (see session_dir/unit_of_work.py).
+        In snapshot mode the writes are staged on the snapshot (stage()).
+        A unit inside a unit, or inside stage(), joins the outer one.
+
+        Yields: The table wrapper holding the writes.
+        """
+        if self._unit is not None or self._staged is not None:
+            yield self.Authenticate(self.base_key, self.table_name,
+                                    self.API_key)
+            return
+        if self.snapshot:
+            unit = self.stage(batch)
+        else:
+            unit = self._unit = UnitOfWork(
+                self.client(self.base_key, self.table_name, self.API_key),
+                batch)
+        try:
+            yield unit
+        except BaseException:
+            self._unit = self._staged = None
+            unit.rollback()
+            self.rolled_back()
+            raise
+        self._unit = self._staged = None
+        self.committed(unit.commit())
+
+    def committed(self, written):
+        """
+        Called after unit_of_work() sends its writes.
+
+        Args:
+            written: Dictionary of record id (staged id for inserts) -->
+                     record returned by airtable.
+        """
+
+    def rolled_back(self):
+        """
+        Called after held writes are dropped (a failed unit_of_work(),
+        discard(), or a StagedTable rolled back to a savepoint).
+        """
+
+    def refresh(self):
+        """
+        Reload the snapshot (if any) to pick up changes made by others.
+
+        With a disk cache only the changed records are downloaded.
+        """
+        if self._snapshot is not None:
+            self._snapshot.load()
+
+    def close(self):
+        """
+        Close the pooled connections held by the session.
+        """
+        for client in self._clients.values():
+            client.close()
+        self._clients = {}
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+            # A later call reopens the cache through a new snapshot
+            self._snapshot = None
@@ -0,0 +1,344 @@
+"""
+In-memory snapshot of an airtable data table.
+
+The snapshot loads every record of a table once and answers search style
+lookups from hash indexes instead of sending a request per lookup. Writes
+are still sent to airtable, and the record airtable returns is applied to
+the snapshot so it stays current with the changes the session makes.
+With a DiskCache the snapshot is loaded from disk and only the records
+changed since the last sync are downloaded. With a record model (e.g.
+mouse_record.MouseSchema) records are kept in a compact form, converted
+page by page as they are downloaded.
+
+Classes:
+    TableSnapshot: Indexed local copy of a table exposing the Airtable
+                   methods used by Manipulate.
+"""
+
+import heapq
+
+from session_dir.predicates import Combine, Compare
+
+
+def index_key(value):
+    """
+    Normalize a cell value so that 5100 and "5100" hit the same index entry.
+    """
+    return str(value)
+
+
+def sort_key(value):
+    """
+    Sort numeric looking values numerically and everything else as text.
+    """
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0, str(value))
+
+
+def parse_sort(sort):
+    """
+    Convert an Airtable sort option into a list of (field, descending) pairs.
+
+    Accepts the same forms as the airtable wrapper: "Col", "-Col",
+    ["Col", "-Col2"] or [("Col", "asc"), ("Col2", "desc")].
+    """
+    if hasattr(sort, "startswith"):
+        sort = [sort]
+    parsed = []
+    for item in sort:
+        if hasattr(item, "startswith"):
+            if item.startswith("-"):
+                parsed.append((item[1:], True))
+            else:
+                parsed.append((item, False))
+        else:
+            field_name, direction = item
+            parsed.append((field_name, direction == "desc"))
+    return parsed
+
+
+def copy_record(record, fields=None):
+    """
+    Return a copy of a record so callers cannot mutate the snapshot,
+    optionally keeping only the given fields.
+    """
+    if fields is None:
+        record_fields = dict(record["fields"])
+    else:
+        if hasattr(fields, "startswith"):
+            fields = [fields]
+        record_fields = {field: record["fields"][field] for field in fields
+                         if field in record["fields"]}
+    copy = {"id": record["id"], "fields": record_fields}
+    if "createdTime" in record:
+        copy["createdTime"] = record["createdTime"]
+    return copy
+
+
+class TableSnapshot(object):
+    """
+    Local indexed copy of an airtable data table.
+
+    Lookups on indexed fields are dictionary hits; lookups on any other
+    field scan the local records. Options airtable evaluates server side
+    (formulas, and views the snapshot has no predicate for) are passed
+    through to the wrapped table.
+    """
+
+    def __init__(self, airtable, indexed_fields=(), cache=None, views=None,
+                 model=None):
+        """
+        Args:
+            airtable: The Airtable object requests are sent through.
+            indexed_fields: Column names to keep hash indexes on.
+            cache: DiskCache to load the table from and sync, if any.
+            views: Dictionary of view name --> predicate selecting the
+                   view's records, for views answered locally.
+            model: Keeps records as model.load(record), which must read like
+                   the record's fields dictionary (get, [] and in);
+                   model.dump(stored, fields) gives the record back.
+        """
+        self.airtable = airtable
+        self.indexed_fields = list(indexed_fields)
+        self.cache = cache
+        self.views = dict(views or {})
+        self.model = model
+        self.records = {}
+        self.indexes = {field: {} for field in self.indexed_fields}
+        self.loaded = False
+
+    def __getattr__(self, name):
+        # Anything the snapshot does not answer itself goes to airtable
+        return getattr(self.__dict__["airtable"], name)
+
+    def __len__(self):
+        return len(self.records)
+
+    def load(self):
+        """
+        (Re)load every record of the table and rebuild the indexes.
+        """
+        if self.cache is not None:
+            pages = [self.cache.sync(self.airtable)]
+        elif self.model is not None:
+            pages = self.airtable.get_iter()
+        else:
+            pages = [self.airtable.get_all()]
+        self.records = {}
+        self.indexes = {field: {} for field in self.indexed_fields}
+        for page in pages:
+            for record in page:
+                self._add(record)
+        self.loaded = True
+        return self
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def _fields(self, record):
+        # Fields of a stored record
+        return record["fields"] if self.model is None else record
+
+    def _dump(self, record, fields=None):
+        if self.model is None:
+            return copy_record(record, fields)
+        return self.model.dump(record, fields)
+
+    def _add(self, record):
+        if self.model is not None:
+            record = self.model.load(record)
+            self.records[record.id] = record
+        else:
+            self.records[record["id"]] = record
+        record_fields = self._fields(record)
+        for field, index in self.indexes.items():
+            value = record_fields.get(field)
+            if value is not None:
+                index.setdefault(index_key(value), []).append(record)
+
+    def _remove(self, record_id):
+        record = self.records.pop(record_id, None)
+        if record is None:
+            return None
+        record_fields = self._fields(record)
+        for field, index in self.indexes.items():
+            value = record_fields.get(field)
+            if value is not None:
+                key = index_key(value)
+                matches = index.get(key, [])
+                matches[:] = [match for match in matches
+                              if match is not record]
+                if not matches:
+                    index.pop(key, None)
+        return record
+
+    def record(self, record_id):
+        """
+        Returns a copy of the record with the id, or None.
+        """
+        self._ensure_loaded()
+        record = self.records.get(record_id)
+        return None if record is None else self._dump(record)
+
+    def apply(self, record):
+        """
+        Insert or replace a record returned by airtable.
+        """
+        self._remove(record["id"])
+        self._add(record)
+
+    def discard(self, record_id):
+        """
+        Drop a deleted record from the snapshot.
+        """
+        self._remove(record_id)
+
+    def _matches(self, field_name, field_value):
+        self._ensure_loaded()
+        if field_name in self.indexes:
+            return list(self.indexes[field_name].get(index_key(field_value),
+                                                     []))
+        key = index_key(field_value)
+        return [record for record in self.records.values()
+                if field_name in self._fields(record)
+                and index_key(self._fields(record)[field_name]) == key]
+
+    def _select(self, records, fields=None, sort=None, max_records=None,
+                view=None, **options):
+        if view is not None:
+            predicate = self.views[view]
+            records = [record for record in records
+                       if predicate.matches(self._fields(record))]
+        sort = parse_sort(sort) if sort else []
+        if len(sort) == 1 and max_records:
+            # e.g. get_max_ID only needs the top record, not a full sort
+            field_name, descending = sort[0]
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            records = pick(max_records, records, key=lambda r:
+                           sort_key(self._fields(r).get(field_name)))
+        else:
+            # Stable sorts applied from the last key to the first
+            for field_name, descending in reversed(sort):
+                records = sorted(records, reverse=descending,
+                                 key=lambda r: sort_key(
+                                     self._fields(r).get(field_name)))
+        if max_records:
+            records = records[:max_records]
+        return [self._dump(record, fields) for record in records]
+
+    def _server_side(self, options):
+        return options.get("view") is not None\
+            and options["view"] not in self.views\
+            or "formula" in options or "filterByFormula" in options
+
+    def search(self, field_name, field_value, record=None, **options):
+        """
+        Returns all records whose field_name equals field_value.
+        """
+        if self._server_side(options):
+            return self.airtable.search(field_name, field_value, **options)
+        return self._select(self._matches(field_name, field_value), **options)
+
+    def search_prefix(self, field_name, prefix, **options):
+        """
+        Returns all records whose field_name starts with prefix.
+        """
+        if self._server_side(options):
+            return self.airtable.search_prefix(field_name, prefix, **options)
+        self._ensure_loaded()
+        prefix = str(prefix)
+        if field_name in self.indexes:
+            matches = [record for key, records
+                       in self.indexes[field_name].items()
+                       if key.startswith(prefix) for record in records]
+        else:
+            matches = [record for record in self.records.values()
+                       if index_key(self._fields(record).get(field_name, ""))
+                       .startswith(prefix)]
+        return self._select(matches, **options)
+
+    def query(self, predicate, **options):
+        """
+        Returns the records matching a predicate, evaluated locally.
+        """
+        if self._server_side(options):
+            return self.airtable.query(predicate, **options)
+        self._ensure_loaded()
+        return self._select([record for record in self._candidates(predicate)
+                             if predicate.matches(self._fields(record))],
+                            **options)
+
+    def _candidates(self, predicate):
+        # Narrow the scan with an index when the predicate requires an
+        # indexed field to equal a value
+        terms = [predicate]
+        if isinstance(predicate, Combine) and predicate.name == "AND":
+            terms = predicate.predicates
+        for term in terms:
+            if isinstance(term, Compare) and term.equal\
+                    and term.field_name in self.indexes:
+                return list(self.indexes[term.field_name].get(
+                    index_key(term.value), []))
+        return list(self.records.values())
+
+    def match(self, field_name, field_value, **options):
+        """
+        Returns the first record whose field_name equals field_value.
+        """
+        for record in self.search(field_name, field_value, **options):
+            return record
+        return {}
+
+    def get_all(self, **options):
+        """
+        Returns all records, honouring sort, fields and max_records locally.
+        """
+        if self._server_side(options):
+            return self.airtable.get_all(**options)
+        self._ensure_loaded()
+        return self._select(list(self.records.values()), **options)
+
+    def insert(self, fields, typecast=False):
+        record = self.airtable.insert(fields, typecast)
+        self.apply(record)
+        return copy_record(record)
+
+    def batch_insert(self, records, typecast=False):
+        inserted = self.airtable.batch_insert(records, typecast)
+        for record in inserted:
+            self.apply(record)
+        return [copy_record(record) for record in inserted]
+
+    def update(self, record_id, fields, typecast=False):
+        record = self.airtable.update(record_id, fields, typecast)
+        self.apply(record)
+        return copy_record(record)
+
+    def batch_update(self, records, typecast=False):
+        updated = self.airtable.batch_update(records, typecast)
+        for record in updated:
+            self.apply(record)
+        return [copy_record(record) for record in updated]
+
+    def update_by_field(self, field_name, field_value, fields,
+                        typecast=False, **options):
+        """
+        Updates the first record matching field_value, found locally.
+        """
+        record = self.match(field_name, field_value, **options)
+        return {} if not record else self.update(record["id"], fields,
+                                                 typecast)
+
+    def delete(self, record_id):
+        deleted = self.airtable.delete(record_id)
+        self.discard(record_id)
+        return deleted
+
+    def batch_delete(self, record_ids):
+        deleted = self.airtable.batch_delete(record_ids)
+        for record_id in record_ids:
+            self.discard(record_id)
+        return deleted
@@ -0,0 +1,166 @@
+"""
+Staging of writes against a table snapshot.
+
+A StagedTable answers reads from a loaded TableSnapshot and applies writes
+to the snapshot locally instead of sending them. Later reads therefore see
+earlier staged writes, and several changes to the same record are merged.
+Nothing reaches airtable until commit(), which sends one write per record
+through batch requests. Savepoints let a caller undo the writes of a
+single failed operation.
+
+Classes:
+    StagedTable: Snapshot wrapper that stages writes until commit.
+"""
+
+import datetime
+
+from session_dir.snapshot import copy_record
+from session_dir.write_buffer import StagedWrites
+
+
+class StagedTable(StagedWrites):
+    """
+    Stages inserts and updates on a TableSnapshot until commit().
+
+    >>> staged = StagedTable(snapshot)
+    >>> staged.update(record_id, {"Status": "B: Breeding"})
+    >>> staged.update(record_id, {"Weaning Date": None})
+    >>> staged.commit()   # one PATCH with both fields
+    """
+
+    def __init__(self, snapshot, batch=True):
+        """
+        Args:
+            snapshot: TableSnapshot reads are answered from.
+            batch: Send the staged writes through batch requests.
+        """
+        self.snapshot = snapshot
+        self.batch = batch
+        if not snapshot.loaded:
+            snapshot.load()
+        self._reset()
+        self._count = 0
+
+    def _reset(self):
+        # Record ids in the order they were first written
+        self.order = []
+        # Staged id --> fields to insert
+        self.inserts = {}
+        # Record id --> merged fields to update
+        self.updates = {}
+        # Record id --> record before staging (None for inserts)
+        self.before = {}
+        # (record id, previous record, previous pending fields, first write)
+        self.undo = []
+
+    def __getattr__(self, name):
+        # Reads (search, get_all, ...) are answered by the snapshot
+        return getattr(self.__dict__["snapshot"], name)
+
+    def __len__(self):
+        return len(self.order)
+
+    def savepoint(self):
+        """
+        Returns a marker that rollback() can undo writes back to.
+        """
+        return len(self.undo)
+
+    def rollback(self, savepoint=0):
+        """
+        Undo the writes staged since savepoint (default: all of them).
+        """
+        while len(self.undo) > savepoint:
+            record_id, previous, previous_fields, first = self.undo.pop()
+            if previous is None:
+                self.snapshot.discard(record_id)
+            else:
+                self.snapshot.apply(previous)
+            pending = self.inserts if record_id in self.inserts\
+                else self.updates
+            if previous_fields is None:
+                pending.pop(record_id, None)
+            else:
+                pending[record_id] = previous_fields
+            if first:
+                self.order.remove(record_id)
+                self.before.pop(record_id, None)
+
+    def insert(self, fields, typecast=False):
+        record_id = self._staged_id()
+        record = {"id": record_id,
+                  "createdTime": datetime.datetime.now(
+                      datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                  "fields": {name: value for name, value in fields.items()
+                             if value is not None}}
+        self.undo.append((record_id, None, None, True))
+        self.order.append(record_id)
+        self.before[record_id] = None
+        self.inserts[record_id] = dict(fields)
+        self.snapshot.apply(record)
+        return copy_record(record)
+
+    def batch_insert(self, records, typecast=False):
+        return [self.insert(fields, typecast) for fields in records]
+
+    def update(self, record_id, fields, typecast=False):
+        current = self.snapshot.record(record_id)
+        assert current is not None, "Record " + str(record_id)\
+            + " does not exist"
+        pending = self.inserts if record_id in self.inserts else self.updates
+        first = record_id not in self.before
+        previous_fields = dict(pending[record_id]) if record_id in pending\
+            else None
+        self.undo.append((record_id, current, previous_fields, first))
+        if first:
+            self.order.append(record_id)
+            self.before[record_id] = current
+        pending.setdefault(record_id, {}).update(fields)
+        new_fields = dict(current["fields"])
+        new_fields.update(fields)
+        record = dict(current, fields={name: value for name, value
+                                       in new_fields.items()
+                                       if value is not None})
+        self.snapshot.apply(record)
+        return copy_record(record)
+
+    def batch_update(self, records, typecast=False):
+        return [self.update(record["id"], record["fields"], typecast)
+                for record in records]
+
+    def update_by_field(self, field_name, field_value, fields,
+                        typecast=False, **options):
+        record = self.snapshot.match(field_name, field_value, **options)
+        return {} if not record else self.update(record["id"], fields,
+                                                 typecast)
+
+    def _target(self):
+        return self.snapshot.airtable
+
+    def _previous(self, record_id, names):
+        before = self.before[record_id]
+        return {name: before["fields"].get(name) for name in names}
+
+    def _abandon(self):
+        # Put the snapshot back as it was before staging
+        self.rollback()
+
+    def commit(self):
+        """
+        Send the staged writes, one per record, in batches.
+
+        If a write fails, the writes already sent are undone and the
+        snapshot is put back as it was before staging, then the error is
+        raised.
+
+        Returns:
+            Dictionary of staged record id --> record returned by airtable.
+            Inserted records are keyed by their staged id.
+        """
+        written = self._send()
+        # Swap the staged records for the ones airtable returned
+        for record_id, record in written.items():
+            self.snapshot.discard(record_id)
+            self.snapshot.apply(record)
+        self._reset()
+        return written
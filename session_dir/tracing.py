@@ -0,0 +1,203 @@
+"""
+Tracing and metrics for airtable requests.
+
+Every request a session's clients send is recorded as a span (method,
+endpoint, latency, retries, payload sizes and status) and attributed to the
+public operation that made it (weaned, SAC_cage, ...). Spans are passed to
+hooks as they finish, and aggregated counters are kept for export to a
+monitoring system.
+
+>>> mytable = Manipulate('base_key', 'table_name', 'API_key')
+>>> with mytable.tracer.collect() as spans:
+...     mytable.weaned(5303, 'WT', female_num=4, female_cage=5401)
+>>> [span.as_dict() for span in spans]
+>>> mytable.tracer.metrics()["requests.weaned"]
+
+Classes:
+    Span: One request or operation.
+    Tracer: Records spans, calls hooks and keeps counters.
+
+Functions:
+    traced:
+        Decorator recording a session method as an operation.
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+# Operation span requests are attributed to, in the current thread or task
+_operation = contextvars.ContextVar("operation", default=None)
+
+
+class Span(object):
+    """
+    One request (kind "request") or one public operation (kind
+    "operation"). Operation spans total the requests made within them.
+    """
+
+    def __init__(self, kind, name, operation=None):
+        self.kind = kind
+        self.name = name
+        self.operation = operation
+        self.method = None
+        self.endpoint = None
+        self.status = None
+        self.error = None
+        self.latency = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return "<Span " + self.kind + " " + self.name + " "\
+               + "{:.3f}".format(self.latency) + "s>"
+
+
+class Tracer(object):
+    """
+    Records request and operation spans.
+
+    Hooks are callables taking a finished Span; they run in the thread
+    that made the request and should be quick.
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    @contextlib.contextmanager
+    def collect(self):
+        """
+        Context manager yielding a list that fills with the spans
+        finished inside the block.
+        """
+        spans = []
+        self.add_hook(spans.append)
+        try:
+            yield spans
+        finally:
+            self.remove_hook(spans.append)
+
+    @contextlib.contextmanager
+    def operation(self, name):
+        """
+        Context manager recording an operation span.
+
+        Operations started inside another operation are part of it, so
+        requests are counted once, against the outermost operation.
+        """
+        if _operation.get() is not None:
+            yield _operation.get()
+            return
+        span = Span("operation", name, name)
+        token = _operation.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as error:
+            span.error = str(error) or error.__class__.__name__
+            raise
+        finally:
+            _operation.reset(token)
+            span.latency = time.perf_counter() - start
+            self._finish(span)
+
+    def request(self, method, endpoint, latency, retries=0, bytes_sent=0,
+                bytes_received=0, status=None):
+        """
+        Record a finished request.
+
+        Returns: The request's Span.
+        """
+        operation = _operation.get()
+        span = Span("request", method.upper() + " " + endpoint,
+                    operation.name if operation is not None else None)
+        span.method = method.upper()
+        span.endpoint = endpoint
+        span.latency = latency
+        span.status = status
+        span.requests = 1
+        span.retries = retries
+        span.bytes_sent = bytes_sent
+        span.bytes_received = bytes_received
+        if operation is not None:
+            with self.lock:
+                operation.requests += 1
+                operation.retries += retries
+                operation.bytes_sent += bytes_sent
+                operation.bytes_received += bytes_received
+        self._finish(span)
+        return span
+
+    def _count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def _finish(self, span):
+        with self.lock:
+            if span.kind == "request":
+                for suffix in ["", "." + span.method]:
+                    self._count("requests" + suffix, 1)
+                    self._count("retries" + suffix, span.retries)
+                    self._count("bytes_sent" + suffix, span.bytes_sent)
+                    self._count("bytes_received" + suffix,
+                                span.bytes_received)
+                    self._count("request_seconds" + suffix, span.latency)
+                if span.status is not None and span.status >= 400:
+                    self._count("errors." + str(span.status), 1)
+            else:
+                suffix = "." + span.name
+                self._count("operations" + suffix, 1)
+                self._count("operation_seconds" + suffix, span.latency)
+                self._count("requests" + suffix, span.requests)
+                self._count("retries" + suffix, span.retries)
+                self._count("bytes" + suffix,
+                            span.bytes_sent + span.bytes_received)
+                if span.error is not None:
+                    self._count("operation_errors" + suffix, 1)
+        for hook in list(self.hooks):
+            hook(span)
+
+    def metrics(self):
+        """
+        Returns the aggregated counters as a flat dictionary, e.g.
+        {"requests": 12, "requests.GET": 9, "requests.weaned": 10, ...}.
+        """
+        with self.lock:
+            return dict(self.counters)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+
+
+def traced(method):
+    """
+    Decorator recording a session method (or coroutine) as an operation of
+    the session's tracer.
+    """
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            with self.tracer.operation(method.__name__):
+                return await method(self, *args, **kwargs)
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.operation(method.__name__):
+                return method(self, *args, **kwargs)
+    return wrapper
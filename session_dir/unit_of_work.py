@@ -0,0 +1,201 @@
+"""
+Unit of work over an airtable data table.
+
+A UnitOfWork wraps a table and holds back its inserts and updates. Every
+change to the same record, from one operation or several, is merged, and
+commit() sends one write per record through batch requests. Reads still go
+to airtable, and the staged values of the records they return are laid
+over the result. Filters run on airtable's values, and staged inserts do
+not show up in reads. Snapshot mode stages writes on the snapshot instead
+(see staging.py), where they do.
+
+If a commit fails partway, the writes that already landed are undone with
+compensating writes: updated fields get back the values the unit read
+before changing them, and inserted records are deleted.
+
+>>> with mytable.unit_of_work():
+...     mytable.birth(5100, 10, 11, 2019)
+...     mytable.SAC_mouse("4881-D4")
+
+Classes:
+    UnitOfWork: Table wrapper that merges writes until commit().
+"""
+
+from session_dir.write_buffer import StagedWrites
+
+
+class UnitOfWork(StagedWrites):
+    """
+    Merges the writes to a table until commit().
+
+    >>> unit = UnitOfWork(airtable)
+    >>> unit.update_by_field("Animal ID", "4727-A2", {"Status": "P: ..."})
+    >>> unit.update_by_field("Animal ID", "4727-A2", {"Weaning Date": ...})
+    >>> unit.commit()   # one PATCH with both fields
+    """
+
+    def __init__(self, airtable, batch=True):
+        """
+        Args:
+            airtable: The Airtable object reads and writes go through.
+            batch: Send the writes through batch requests.
+        """
+        self.airtable = airtable
+        self.batch = batch
+        self._count = 0
+        self._reset()
+
+    def _reset(self):
+        # Record ids in the order they were first written
+        self.order = []
+        # Staged id --> fields to insert
+        self.inserts = {}
+        # Record id --> merged fields to update
+        self.updates = {}
+        # Record id --> values read before the unit changed them
+        # (None for a blank cell)
+        self.before = {}
+        # Records read with every field
+        self.complete = set()
+
+    def __getattr__(self, name):
+        # Anything else (get_iter, delete, ...) goes straight to airtable
+        return getattr(self.__dict__["airtable"], name)
+
+    def __len__(self):
+        return len(self.order)
+
+    def _read(self, records, fields=None):
+        # Remember what airtable holds, then lay the staged values over it
+        if hasattr(fields, "startswith"):
+            fields = [fields]
+        result = []
+        for record in records:
+            record_id = record["id"]
+            known = self.before.setdefault(record_id, {})
+            if fields is None:
+                self.complete.add(record_id)
+            for name in (record["fields"] if fields is None else fields):
+                known.setdefault(name, record["fields"].get(name))
+            if record_id in self.updates:
+                record = self._overlay(record, self.updates[record_id],
+                                       fields)
+            result.append(record)
+        return result
+
+    def _overlay(self, record, changes, fields=None):
+        record_fields = dict(record["fields"])
+        for name, value in changes.items():
+            if fields is not None and name not in fields:
+                continue
+            if value is None:
+                record_fields.pop(name, None)
+            else:
+                record_fields[name] = value
+        return dict(record, fields=record_fields)
+
+    def search(self, field_name, field_value, **options):
+        return self._read(self.airtable.search(field_name, field_value,
+                                               **options),
+                          options.get("fields"))
+
+    def search_prefix(self, field_name, prefix, **options):
+        return self._read(self.airtable.search_prefix(field_name, prefix,
+                                                      **options),
+                          options.get("fields"))
+
+    def query(self, predicate, **options):
+        return self._read(self.airtable.query(predicate, **options),
+                          options.get("fields"))
+
+    def get_all(self, **options):
+        return self._read(self.airtable.get_all(**options),
+                          options.get("fields"))
+
+    def get(self, record_id):
+        if record_id in self.inserts:
+            return self._staged(record_id)
+        return self._read([self.airtable.get(record_id)])[0]
+
+    def match(self, field_name, field_value, **options):
+        for record in self.search(field_name, field_value, **options):
+            return record
+        return {}
+
+    def _staged(self, record_id):
+        return {"id": record_id,
+                "fields": {name: value for name, value
+                           in self.inserts[record_id].items()
+                           if value is not None}}
+
+    def insert(self, fields, typecast=False):
+        record_id = self._staged_id()
+        self.order.append(record_id)
+        self.inserts[record_id] = dict(fields)
+        return self._staged(record_id)
+
+    def batch_insert(self, records, typecast=False):
+        return [self.insert(fields, typecast) for fields in records]
+
+    def update(self, record_id, fields, typecast=False):
+        if record_id in self.inserts:
+            self.inserts[record_id].update(fields)
+            return self._staged(record_id)
+        if record_id not in self.updates:
+            self.order.append(record_id)
+        self.updates.setdefault(record_id, {}).update(fields)
+        known = self.before.get(record_id, {})
+        return self._overlay({"id": record_id, "fields": {
+            name: value for name, value in known.items()
+            if value is not None}}, self.updates[record_id])
+
+    def batch_update(self, records, typecast=False):
+        return [self.update(record["id"], record["fields"], typecast)
+                for record in records]
+
+    def update_by_field(self, field_name, field_value, fields,
+                        typecast=False, **options):
+        record = self.match(field_name, field_value, **options)
+        return {} if not record else self.update(record["id"], fields,
+                                                 typecast)
+
+    def _fetch_before(self):
+        # Read the records whose changed fields the unit has not seen, so
+        # a failed commit can restore them
+        for record_id, changes in self.updates.items():
+            known = self.before.get(record_id, {})
+            if record_id not in self.complete\
+                    and any(name not in known for name in changes):
+                self._read([self.airtable.get(record_id)])
+
+    def rollback(self):
+        """
+        Drop the staged writes.
+        """
+        self._reset()
+
+    def _target(self):
+        return self.airtable
+
+    def _previous(self, record_id, names):
+        known = self.before.get(record_id, {})
+        return {name: known.get(name) for name in names}
+
+    def _abandon(self):
+        self._reset()
+
+    def commit(self):
+        """
+        Send the staged writes, one per record, in batches.
+
+        If a write fails, the writes already sent are undone before the
+        error is raised.
+
+        Returns:
+            Dictionary of record id --> record returned by airtable.
+            Inserted records are keyed by their staged id.
+        """
+        self._fetch_before()
+        written = self._send()
+        self._reset()
+        return written
@@ -0,0 +1,190 @@
+"""
+Buffer for airtable writes.
+
+Inserts and updates are collected and sent through the batch endpoints,
+up to 10 records per request, instead of one request per record.
+
+Classes:
+    WriteBuffer: Collects writes and flushes them in order.
+    StagedWrites: Base of the table wrappers that hold writes until commit.
+
+Functions:
+    compensate:
+        Undo writes that already reached airtable.
+"""
+
+# Airtable accepts at most 10 records per batch request
+MAX_BATCH_SIZE = 10
+# Record ids given to staged inserts until airtable assigns real ones
+STAGED_PREFIX = "staged"
+
+
+class WriteBuffer(object):
+    """
+    Collects inserts and updates for a table and flushes them in batches.
+
+    Writes are sent in the order they were added: consecutive inserts are
+    grouped into batch inserts and consecutive updates into batch updates.
+    Used as a context manager the buffer flushes on a clean exit and drops
+    the pending writes if an exception is raised.
+
+    >>> with WriteBuffer(airtable) as buffer:
+    ...     buffer.insert({"Animal ID": "1071-A1"})
+    ...     buffer.update("recwPQIfs4wKPyc9D", {"Status": "S: Sacrificed"})
+    """
+
+    def __init__(self, airtable, batch=True, batch_size=MAX_BATCH_SIZE):
+        """
+        Args:
+            airtable: The Airtable object writes are sent through.
+            batch: If False, every write is sent immediately on its own.
+            batch_size: Records per batch request (max 10).
+        """
+        assert 0 < batch_size <= MAX_BATCH_SIZE,\
+               "Batch size must be between 1 and 10"
+        self.airtable = airtable
+        self.batch = batch
+        self.batch_size = batch_size
+        self.pending = []
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.pending = []
+
+    def __len__(self):
+        return len(self.pending)
+
+    def insert(self, fields):
+        """
+        Queue a new record.
+        """
+        self._add("insert", None, fields)
+
+    def update(self, record_id, fields):
+        """
+        Queue an update of the given fields of an existing record.
+        """
+        self._add("update", record_id, fields)
+
+    def _add(self, kind, record_id, fields):
+        self.pending.append((kind, record_id, dict(fields)))
+        if not self.batch:
+            self.flush()
+
+    def flush(self):
+        """
+        Send all pending writes.
+
+        Returns:
+            The records airtable returned for the flushed writes, in the
+            order the writes were added.
+        """
+        flushed = []
+        pending, self.pending = self.pending, []
+        start = 0
+        while start < len(pending):
+            # Group a run of writes of the same kind into one chunk
+            kind = pending[start][0]
+            end = start
+            while end < len(pending) and end - start < self.batch_size\
+                    and pending[end][0] == kind:
+                end += 1
+            sent = self._send(kind, pending[start:end])
+            # Results are kept as each chunk lands so that a caller can
+            # tell what was written if a later chunk fails
+            flushed += sent
+            self.results += sent
+            start = end
+        return flushed
+
+    def _send(self, kind, chunk):
+        if kind == "insert":
+            if len(chunk) == 1:
+                return [self.airtable.insert(chunk[0][2])]
+            return self.airtable.batch_insert([fields for _, _, fields
+                                               in chunk])
+        if len(chunk) == 1:
+            return [self.airtable.update(chunk[0][1], chunk[0][2])]
+        return self.airtable.batch_update([{"id": record_id, "fields": fields}
+                                           for _, record_id, fields in chunk])
+
+
+def compensate(airtable, undo, batch=True):
+    """
+    Undo writes that already reached airtable, e.g. after a commit failed
+    partway.
+
+    Args:
+        airtable: The Airtable object the writes were sent through.
+        undo: List of (record id, fields) pairs, in the order the writes
+              were sent: fields holds the values to restore (None to clear
+              a field), or is None to delete an inserted record.
+        batch: Send the compensating writes through batch requests.
+    """
+    with WriteBuffer(airtable, batch=batch) as buffer:
+        for record_id, fields in reversed(undo):
+            if fields is not None:
+                buffer.update(record_id, fields)
+    deleted = [record_id for record_id, fields in undo if fields is None]
+    if deleted:
+        airtable.batch_delete(deleted)
+
+
+class StagedWrites(object):
+    """
+    Base of the table wrappers that hold writes back until they commit
+    (UnitOfWork, StagedTable).
+
+    A subclass keeps its pending writes in order (record ids in the order
+    they were first written), inserts (staged id --> fields) and updates
+    (record id --> merged fields), and provides:
+        _target(): The Airtable object the writes are sent through.
+        _previous(record_id, names): Values of the named fields before the
+                                     record was changed.
+        _abandon(): Drop the pending writes after a failed commit.
+    """
+
+    def _staged_id(self):
+        # Record id for a new staged insert
+        self._count += 1
+        return STAGED_PREFIX + str(self._count)
+
+    def _send(self):
+        """
+        Send the pending writes, one per record, in batches.
+
+        If a write fails, the writes already sent are undone before the
+        error is raised.
+
+        Returns:
+            Dictionary of record id --> record returned by airtable.
+            Inserted records are keyed by their staged id.
+        """
+        keys = list(self.order)
+        airtable = self._target()
+        buffer = WriteBuffer(airtable, batch=self.batch)
+        try:
+            for record_id in keys:
+                if record_id in self.inserts:
+                    buffer.insert(self.inserts[record_id])
+                else:
+                    buffer.update(record_id, self.updates[record_id])
+            buffer.flush()
+        except Exception:
+            undo = []
+            for record_id, record in zip(keys, buffer.results):
+                if record_id in self.inserts:
+                    undo.append((record["id"], None))
+                else:
+                    undo.append((record_id, self._previous(
+                        record_id, self.updates[record_id])))
+            self._abandon()
+            compensate(airtable, undo, self.batch)
+            raise
+        return dict(zip(keys, buffer.results))
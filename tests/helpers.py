@@ -0,0 +1,29 @@
+"""
+Colony fixtures shared by the test modules.
+"""
+
+from ADP import Manipulate
+
+
+def colony(backend):
+    """
+    A breeding cage (5100) with a litter due to be weaned
+    """
+    return backend.add_records("Mice", [
+        {"ID": "10", "Animal ID": "4881-D3", "Gender": "M", "Strain": "WT",
+         "Status": "B: Breeding", "Cage Card": "5100"},
+        {"ID": "11", "Animal ID": "4727-A2", "Gender": "F", "Strain": "WT",
+         "Status": "P: With Pups", "Cage Card": "5100",
+         "Weaning Date": "7/21/2019"},
+        {"ID": "12", "Animal ID": "4727-A3", "Gender": "F", "Strain": "WT",
+         "Status": "D: Died", "Cage Card": "5100"},
+        {"ID": "13", "Animal ID": "5001-A1", "Gender": "M", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5200"},
+    ])
+
+
+def manipulate(backend, base_key):
+    # A base key per test keeps the shared ID allocators apart
+    mytable = Manipulate(base_key, "Mice", backend=backend)
+    backend.views[mytable.main_view] = mytable.alive()
+    return mytable
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from ADP_async import AsyncManipulate
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony
+
+
+class FakeTransport(object):
+    """
+    Async transport over a list of records that tracks concurrency
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _request(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+    async def search(self, field_name, field_value, **options):
+        await self._request()
+        return [r for r in self.records
+                if str(r["fields"].get(field_name)) == str(field_value)]
+
+    async def query(self, predicate, **options):
+        await self._request()
+        return [r for r in self.records if predicate.matches(r["fields"])]
+
+    async def search_prefix(self, field_name, prefix, **options):
+        await self._request()
+        return [r for r in self.records
+                if str(r["fields"].get(field_name)).startswith(prefix)]
+
+    async def get_all(self, **options):
+        await self._request()
+        return sorted(self.records, key=lambda r: -int(r["fields"]["ID"]))
+
+    async def update(self, record_id, fields, typecast=False):
+        await self._request()
+        for record in self.records:
+            if record["id"] == record_id:
+                record["fields"].update(fields)
+                return record
+
+    async def batch_update(self, records, typecast=False):
+        return [await self.update(r["id"], r["fields"]) for r in records]
+
+    async def batch_insert(self, records, typecast=False):
+        await self._request()
+        inserted = [{"id": "rec" + r["ID"], "fields": r} for r in records]
+        self.records += inserted
+        return inserted
+
+
+def breeding_cage():
+    return [
+        {"id": "rec1", "fields": {"ID": 1, "Status": "B: Breeding",
+                                  "Strain": "WT", "Cage Card": "5303",
+                                  "Animal ID": "1071-A1", "Gender": "M"}},
+        {"id": "rec2", "fields": {"ID": 2, "Status": "P: With Pups",
+                                  "Strain": "WT", "Cage Card": "5303",
+                                  "Animal ID": "1071-A2", "Gender": "F",
+                                  "Weaning Date": "7/21/2019"}},
+    ]
+
+
+def test_weaned_runs_lookups_concurrently():
+    """
+    Verify validation lookups overlap and pups are inserted in order
+    """
+    transport = FakeTransport(breeding_cage())
+    mytable = AsyncManipulate("base_key", "table_name", "API_key",
+                              transport=transport)
+    inserted = asyncio.run(mytable.weaned(5303, "WT", female_num=2,
+                                          female_cage=5401, male_num=1,
+                                          male_cage=5402))
+    assert transport.max_in_flight >= 5
+    assert [r["fields"]["Animal ID"] for r in inserted]\
+        == ["5303-A1", "5303-A2", "5303-A3"]
+    assert [r["fields"]["Cage Card"] for r in inserted]\
+        == ["5401", "5401", "5402"]
+    assert transport.records[1]["fields"]["Status"] == "B: Breeding"
+
+
+def test_set_breeding_keeps_error_messages():
+    transport = FakeTransport(breeding_cage())
+    mytable = AsyncManipulate("base_key", "table_name", "API_key",
+                              transport=transport)
+    with pytest.raises(AssertionError, match="Male Animal ID does not belong"):
+        asyncio.run(mytable.set_breeding(5500, 10, 11, 2019, "1071-A2",
+                                         "1071-A2"))
+
+
+def test_transport_follows_the_unit_of_work():
+    """
+    Verify writes made through the default transport go to the unit of work
+    active at the time, before, inside and after the unit
+    """
+    backend = MemoryBackend()
+    colony(backend)
+    backend.add_records("Mice", [
+        {"ID": "14", "Animal ID": "5001-A2", "Gender": "F", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5200"}])
+    mytable = AsyncManipulate("test_async_unit", "Mice", backend=backend)
+    backend.views[mytable.main_view] = mytable.alive()
+    # The transport is first used outside the unit
+    asyncio.run(mytable.set_breeding(5300, 8, 1, 2019, "5001-A1",
+                                     "5001-A2"))
+    with mytable.unit_of_work():
+        inserted = asyncio.run(mytable.weaned(5100, "WT", female_num=2,
+                                              female_cage=5401))
+        # Held by the unit, IDs unchecked until it commits
+        assert inserted[0]["id"].startswith("staged")
+        assert backend.table("test_async_unit", "Mice")\
+            .search_prefix("Animal ID", "5100-") == []
+    airtable = mytable.Authenticate("test_async_unit", "Mice")
+    assert len(airtable.search_prefix("Animal ID", "5100-")) == 2
+    # The unit has finished; writes are sent straight away again
+    asyncio.run(mytable.set_breeding(5301, 8, 2, 2019, "5001-A1",
+                                     "5001-A2"))
+    assert airtable.match("Animal ID", "5001-A1")["fields"]["Cage Card"]\
+        == "5301"
+    mytable.close()
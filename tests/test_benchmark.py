@@ -0,0 +1,22 @@
+import benchmark
+
+
+def test_workflows_within_recorded_budgets():
+    """
+    Verify no workflow makes more requests or moves more bytes than its
+    recorded budget at 1k rows
+    """
+    results = benchmark.run_benchmarks([1000], latency=0)
+    budgets = benchmark.load_budgets()["direct"]
+    over = benchmark.check_budgets(results, budgets, ["requests", "bytes"])
+    assert [result.summary() for result in over] == []
+    assert all(result.budget is not None for result in results)
+
+
+def test_over_budget_is_reported():
+    results = [benchmark.Measurement("weaned_40", 1000, 16, 100, 1.0)]
+    budgets = benchmark.record_budgets([benchmark.Measurement(
+        "weaned_40", 1000, 15, 100, 1.0)])
+    assert budgets["1000"]["weaned_40"]["requests"] == 15
+    assert benchmark.check_budgets(results, budgets) == results
+    assert results[0].over == ["requests"]
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import pytest
+
+from ADP_async import AsyncManipulate
+from cages import CageIndex
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony, manipulate
+
+
+def test_free_cages():
+    cages = CageIndex([
+        {"id": "rec1", "fields": {"Cage Card": "5001"}},
+        {"id": "rec2", "fields": {"Cage Card": "5001"}},
+        {"id": "rec3", "fields": {"Cage Card": "5003"}},
+        {"id": "rec4", "fields": {"Cage Card": "Quarantine"}},
+        {"id": "rec5", "fields": {}}])
+    assert not cages.is_free("5001") and not cages.is_free(5003)
+    assert not cages.is_free("Quarantine")
+    assert cages.free(3, 5000, 5999) == [5000, 5002, 5004]
+    assert cages.free(2, 5000, 5999, exclude=[5000]) == [5002, 5004]
+    # 5001 is free once both of its mice have moved
+    cages.update("rec1", {"Cage Card": "5002"})
+    assert not cages.is_free(5001)
+    cages.update("rec2", {"Cage Card": "5002", "Status": "B: Breeding"})
+    assert cages.is_free(5001) and not cages.is_free(5002)
+    cages.remove("rec3")
+    assert cages.free(2, 5000, 5003) == [5000, 5001]
+
+
+def test_weaned_allocates_cages():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_cages")
+    mytable.cage_range = (5100, 5300)
+    mytable.get_cages()
+    backend.reset_stats()
+    mytable.weaned(5100, "WT", female_num=2, male_num=6, male_cage=5102)
+    # The given cage and the allocated ones are each checked with a single
+    # query, instead of a search per cage
+    assert backend.stats()["methods"]["GET"] == 8
+    airtable = mytable.Authenticate("test_cages", "Mice")
+    cages = [record["fields"]["Cage Card"]
+             for record in airtable.search_prefix("Animal ID", "5100-")]
+    assert cages == ["5101"] * 2 + ["5102"] * 5 + ["5103"]
+    mytable.set_breeding(None, 8, 1, 2019, "5100-A3", "5100-A1")
+    assert airtable.match("Animal ID", "5100-A3")["fields"]["Cage Card"]\
+        == "5104"
+
+
+def test_given_cages_are_checked_against_the_table():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_cages_given")
+    mytable.get_cages()
+    # Another session puts a mouse in cage 5402 after the index was built
+    backend.add_records("Mice", [
+        {"ID": "14", "Animal ID": "5001-A2", "Gender": "F", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5402"}])
+    with pytest.raises(AssertionError, match="Cage already alocated"):
+        mytable.weaned(5100, "WT", female_num=2, female_cage=5401,
+                       male_num=1, male_cage=5402)
+    assert not mytable.get_cages().is_free(5402)
+
+
+def test_async_set_breeding_allocates_a_cage():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = AsyncManipulate("test_cages_async", "Mice", backend=backend)
+    mytable.cage_range = (5100, 5300)
+    backend.add_records("Mice", [
+        {"ID": "14", "Animal ID": "5001-A2", "Gender": "F", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5200"}])
+    threads = []
+    allocate_cages = mytable.allocate_cages
+
+    def spy(count, exclude=()):
+        threads.append(threading.current_thread())
+        return allocate_cages(count, exclude)
+
+    mytable.allocate_cages = spy
+    asyncio.run(mytable.set_breeding(None, 8, 1, 2019, "5001-A1", "5001-A2"))
+    # Allocated off the event loop's thread
+    assert threads and threading.main_thread() not in threads
+    airtable = mytable.Authenticate("test_cages_async", "Mice")
+    assert airtable.match("Animal ID", "5001-A2")["fields"]["Cage Card"]\
+        == "5101"
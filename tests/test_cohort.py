@@ -0,0 +1,26 @@
+from ADP import Manipulate, next_cohort, parse_animal_ID
+
+
+def test_next_cohort_past_Z():
+    assert next_cohort("A") == "B"
+    assert next_cohort("Z") == "AA"
+    assert next_cohort("AZ") == "BA"
+    assert next_cohort("ZZ") == "AAA"
+
+
+def test_parse_animal_ID():
+    assert parse_animal_ID("1057-B4") == ("1057", "B", 4)
+    assert parse_animal_ID("5303-AA10") == ("5303", "AA", 10)
+    assert parse_animal_ID("unknown") is None
+
+
+def test_next_cohort_from_one_result_set():
+    """
+    Verify the first cohort without a "<cage>-<letter>1" mouse is chosen
+    """
+    mytable = Manipulate("base_key", "table_name", "API_key")
+    matches = [{"fields": {"Animal ID": "5303-" + letter + "1"}}
+               for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"]
+    matches.append({"fields": {"Animal ID": "53030-AA1"}})
+    assert mytable.next_cohort_from(5303, matches) == "AA"
+    assert mytable.next_cohort_from(5303, matches[:2]) == "C"
@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from columns import MISSING, date_ordinal
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony, manipulate
+
+
+def test_date_ordinal():
+    assert date_ordinal("7/21/2019") == datetime.date(2019, 7, 21).toordinal()
+    assert date_ordinal("2019-07-21") == MISSING
+    assert date_ordinal("") == MISSING
+
+
+def test_colony_reports():
+    backend = MemoryBackend()
+    colony(backend)
+    backend.add_records("Mice", [
+        {"ID": "14", "Animal ID": "5100-A1", "Gender": "F", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5401", "Born": "6/30/2019"},
+        {"ID": "15", "Animal ID": "5100-A2", "Gender": "F",
+         "Strain": "Ai14-Cren", "Status": "A: Available",
+         "Cage Card": "5401", "Born": "6/30/2019"},
+        {"ID": "16", "Animal ID": "5100-A3", "Gender": "M",
+         "Strain": "Ai14-Cren", "Status": "A: Available",
+         "Cage Card": "5402", "Born": "6/16/2019"},
+    ])
+    columns = manipulate(backend, "test_colony_reports").get_columns()
+    assert len(columns) == 7
+    assert list(columns.ID) == list(range(10, 17))
+    assert columns.counts("status") == {"B: Breeding": 1, "P: With Pups": 1,
+                                        "D: Died": 1, "A: Available": 4}
+    assert columns.counts("gender", columns.alive()) == {"M": 3, "F": 3}
+    assert columns.cage_occupancy() == {5100: 2, 5200: 1, 5401: 2, 5402: 1}
+    assert columns.count_by_cage(columns.where("strain", "WT")) == {
+        5100: 3, 5200: 1, 5401: 1}
+    assert columns.cages_where(columns.where("strain", "Ai14-Cren")) == [5402]
+    histogram = columns.age_histogram(datetime.date(2019, 7, 21))
+    assert list(histogram) == [0, 0, 0, 2, 0, 1]
+
+
+def test_cages_where_counts_dead_mice():
+    backend = MemoryBackend()
+    backend.add_records("Mice", [
+        {"ID": "1", "Animal ID": "6001-A1", "Gender": "F",
+         "Strain": "Ai14-Cren", "Status": "A: Available", "Cage Card": "6001"},
+        {"ID": "2", "Animal ID": "6001-A2", "Gender": "F",
+         "Strain": "Ai14-Cre", "Status": "S: Sacrificed", "Cage Card": "6001"},
+        {"ID": "3", "Animal ID": "6002-A1", "Gender": "F",
+         "Strain": "Ai14-Cren", "Status": "A: Available", "Cage Card": "6002"},
+    ])
+    mytable = manipulate(backend, "test_cages_where_dead")
+    columns = mytable.get_columns()
+    negative = columns.where("strain", "Ai14-Cren")
+    # The SACed -Cre mouse still carries the card of cage 6001
+    assert columns.cages_where(negative) == [6002]
+    assert columns.cages_where(negative, among=columns.alive())\
+        == [6001, 6002]
+    assert [int(cage) for cage in mytable.get_negatives()] == [6002]
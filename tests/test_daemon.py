@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from ADP import Manipulate
+from colony import main, send
+from daemon import ColonyDaemon
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = Manipulate("test_daemon", "Mice", backend=backend,
+                         snapshot=True)
+    backend.views[mytable.main_view] = mytable.alive()
+    server = ColonyDaemon(mytable, str(tmp_path / "daemon.sock"),
+                          refresh_interval=None)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server, backend
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_requests_run_against_the_warm_session(daemon):
+    server, backend = daemon
+    path = server.server_address
+    backend.reset_stats()
+    response = send({"event": "weaned", "cage": "5100", "strain": "WT",
+                     "female_num": "2", "female_cage": "5401"}, path)
+    assert response["status"] == "ok", response["message"]
+    assert "5100-A1 goes to cage 5401" in response["output"]
+    # Lookups are answered by the snapshot; only the check of the new IDs,
+    # once they are written, reads the table
+    assert backend.stats()["methods"] == {"GET": 1, "PATCH": 1, "POST": 1}
+    assert send({"event": "sac_mouse", "animal": "5100-A1"},
+                path)["status"] == "ok"
+    assert send({"event": "negatives"}, path)["result"] == []
+    # A failed operation writes nothing
+    backend.reset_stats()
+    response = send({"event": "birth", "cage": "5200", "date": "8/1/2019"},
+                    path)
+    assert response["status"] == "failed"
+    assert backend.stats()["requests"] == 0
+
+
+def test_confirmation_prompts(daemon):
+    server, _ = daemon
+    path = server.server_address
+    request = {"event": "breeding", "cage": "5200", "date": "8/1/2019",
+               "male": "4881-D3", "female": "4727-A2"}
+    assert send(request, path)["status"] == "declined"
+    assert main(["breeding", "cage=5200", "date=8/1/2019", "male=4881-D3",
+                 "female=4727-A2", "--yes", "--socket", path]) == 0
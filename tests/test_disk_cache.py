@@ -0,0 +1,45 @@
+import itertools
+
+from ADP import Manipulate
+from session_dir import backends
+from session_dir.backends import MemoryBackend
+from session_dir.disk_cache import DiskCache
+from tests.helpers import colony
+
+
+def test_warm_start_downloads_only_changes(tmp_path, monkeypatch):
+    """
+    Verify a second session syncs changed records with one delta request
+    and drops deleted records on a sweep
+    """
+    # Every write gets its own millisecond, as on a real base
+    clock = itertools.count()
+    monkeypatch.setattr(backends, "timestamp", lambda: "2019-10-11T10:00:"
+                        + "{:06.3f}".format(next(clock) / 1000.0) + "Z")
+    backend = MemoryBackend(modified_field="Last Modified")
+    records = colony(backend)
+    backend.add_records("Mice", [{"ID": str(ID), "Cage Card": str(ID)}
+                                 for ID in range(100, 350)])
+    with Manipulate("test_disk_cache", "Mice", backend=backend,
+                    cache_dir=str(tmp_path)) as mytable:
+        assert mytable.get_negatives() == []
+    assert backend.stats()["requests"] == 3
+
+    table = backend.table("test_disk_cache", "Mice")
+    table.update(records[0]["id"], {"Status": "S: Sacrificed"})
+    table.delete(records[3]["id"])
+    backend.reset_stats()
+    with Manipulate("test_disk_cache", "Mice", backend=backend,
+                    cache_dir=str(tmp_path)) as mytable:
+        airtable = mytable.Authenticate("test_disk_cache", "Mice")
+        assert airtable.match("Animal ID", "4881-D3")["fields"]["Status"]\
+            == "S: Sacrificed"
+        # The deleted mouse stays cached until the next sweep
+        assert len(airtable.get_all()) == 254
+    # One delta request, no sweep yet
+    assert backend.stats()["requests"] == 1
+
+    cache = DiskCache(str(tmp_path / "test_disk_cache" / "Mice.sqlite"),
+                      sweep_interval=0)
+    assert len(cache.sync(table)) == 253
+    cache.close()
@@ -0,0 +1,115 @@
+import pytest
+
+from ADP import Manipulate
+from events import process_events, read_events
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony
+
+EVENTS = """event,cage,date,strain,female_num,female_cage,male_num,male_cage,animal
+weaned,5100,,WT,2,5401,1,5402,
+birth,5200,8/1/2019,,,,,,
+sac_mouse,,,,,,,,4881-D3
+"""
+
+
+class FailingUpdates(object):
+    """
+    Passes requests to a table, failing the given single record update
+    """
+
+    def __init__(self, table, fail_at):
+        self.table = table
+        self.fail_at = fail_at
+        self.updates = 0
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["table"], name)
+
+    def update(self, record_id, fields, typecast=False):
+        self.updates += 1
+        if self.updates == self.fail_at:
+            raise IOError("connection reset")
+        return self.table.update(record_id, fields, typecast)
+
+
+def setup(tmp_path, base_key):
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = Manipulate(base_key, "Mice", snapshot=True, backend=backend)
+    backend.views[mytable.main_view] = mytable.alive()
+    path = tmp_path / "events.csv"
+    path.write_text(EVENTS)
+    return backend, mytable, read_events(str(path))
+
+
+def test_a_failed_event_stops_every_write(tmp_path):
+    backend, mytable, events = setup(tmp_path, "test_events")
+    backend.reset_stats()
+    results, written = process_events(mytable, events, confirm=True)
+    assert [result.status for result in results] == ["ok", "failed", "ok"]
+    assert written == {}
+    assert "POST" not in backend.stats()["methods"]
+    assert "PATCH" not in backend.stats()["methods"]
+    table = backend.table("test_events", "Mice")
+    assert table.search_prefix("Animal ID", "5100-") == []
+    assert table.match("Animal ID", "4881-D3")["fields"]["Status"]\
+        == "B: Breeding"
+
+
+def test_partial_commits_the_events_that_passed(tmp_path):
+    backend, mytable, events = setup(tmp_path, "test_events_partial")
+    results, written = process_events(mytable, events, confirm=True,
+                                      partial=True)
+    assert [result.status for result in results] == ["ok", "failed", "ok"]
+    assert [result.writes for result in results] == [4, 0, 1]
+    table = backend.table("test_events_partial", "Mice")
+    assert [pup["fields"]["Cage Card"] for pup
+            in table.search_prefix("Animal ID", "5100-")]\
+        == ["5401", "5401", "5402"]
+    assert table.match("Animal ID", "4727-A2")["fields"]["Status"]\
+        == "B: Breeding"
+    assert table.match("Animal ID", "4881-D3")["fields"]["Status"]\
+        == "S: Sacrificed"
+    # The staged records were swapped for the ones written
+    snapshot = mytable.Authenticate("test_events_partial", "Mice")
+    assert not any(record["id"].startswith("staged")
+                   for record in snapshot.get_all())
+    assert len(snapshot.get_all()) == len(table.get_all())
+
+
+def test_indexes_follow_the_commit(tmp_path):
+    backend, mytable, events = setup(tmp_path, "test_events_indexes")
+    cages = mytable.get_cages()
+    process_events(mytable, [events[0], events[2]], confirm=True)
+    # The written records are tracked under their real ids
+    assert mytable._cages is cages
+    assert not cages.is_free(5401) and not cages.is_free(5402)
+    assert not any(record_id.startswith("staged")
+                   for record_id in cages.cage_of)
+    # Undoing a failed event drops the indexes, rebuilt on next use
+    mytable.get_cages()
+    process_events(mytable, events, confirm=True, partial=True)
+    assert mytable._cages is None
+
+
+def test_a_failed_commit_is_compensated(tmp_path):
+    backend, mytable, events = setup(tmp_path, "test_events_compensate")
+    snapshot = mytable.Authenticate("test_events_compensate", "Mice")
+    table = backend.table("test_events_compensate", "Mice")
+    # The mother's update and the pups' insert land, the SAC fails
+    snapshot.airtable = FailingUpdates(snapshot.airtable, fail_at=2)
+    with pytest.raises(IOError):
+        process_events(mytable, events, confirm=True, partial=True)
+    assert backend.stats()["methods"]["DELETE"] == 1
+    assert table.search_prefix("Animal ID", "5100-") == []
+    mother = table.match("Animal ID", "4727-A2")["fields"]
+    assert (mother["Status"], mother["Weaning Date"])\
+        == ("P: With Pups", "7/21/2019")
+    assert table.match("Animal ID", "4881-D3")["fields"]["Status"]\
+        == "B: Breeding"
+    # The snapshot is back as it was before staging
+    assert not any(record["id"].startswith("staged")
+                   for record in snapshot.get_all())
+    assert snapshot.match("Animal ID", "4727-A2")["fields"]["Status"]\
+        == "P: With Pups"
+    assert len(snapshot.get_all()) == len(table.get_all()) == 4
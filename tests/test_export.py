@@ -0,0 +1,83 @@
+import csv
+
+import pytest
+
+from export import Exporter, have_pyarrow
+from session_dir.backends import MemoryBackend
+
+FIELDS = ["ID", "Animal ID", "Father ID"]
+
+
+class InterruptedTable(object):
+    """
+    Passes listings to a table, failing before requesting the given page
+    """
+
+    def __init__(self, table, fail_at):
+        self.table = table
+        self.fail_at = fail_at
+
+    def pages(self, offset=None, **options):
+        for number, page in enumerate(self.table.pages(offset, **options), 1):
+            yield page
+            if number + 1 == self.fail_at:
+                raise IOError("connection reset")
+
+
+def table(rows=250):
+    backend = MemoryBackend()
+    backend.add_records("Mice", [
+        {"ID": str(ID), "Animal ID": "5100-A" + str(ID),
+         "Father ID": ["rec" + str(ID)] if ID % 2 else None}
+        for ID in range(rows)])
+    return backend, backend.table("test_export", "Mice")
+
+
+def read_csv(path):
+    with open(path, newline="") as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_export_resumes_from_the_checkpoint(tmp_path):
+    backend, airtable = table()
+    path = str(tmp_path / "mice.csv")
+    with pytest.raises(IOError):
+        Exporter(InterruptedTable(airtable, 3), FIELDS, csv_path=path,
+                 pages_per_chunk=1).run()
+    # The first two pages were checkpointed
+    assert len(read_csv(path)) == 201
+    backend.reset_stats()
+    assert Exporter(airtable, FIELDS, csv_path=path,
+                    pages_per_chunk=1).run(resume=True) == 250
+    # Only the last page was fetched again
+    assert backend.stats()["requests"] == 1
+    rows = read_csv(path)
+    assert rows[0] == ["id"] + FIELDS
+    assert [row[1] for row in rows[1:]] == [str(ID) for ID in range(250)]
+    assert rows[2][3] == '["rec1"]' and rows[1][3] == ""
+
+
+def test_expired_offset_skips_the_exported_rows(tmp_path):
+    backend, airtable = table()
+    path = str(tmp_path / "mice.csv")
+    with pytest.raises(IOError):
+        Exporter(InterruptedTable(airtable, 3), FIELDS, csv_path=path,
+                 pages_per_chunk=2).run()
+    assert len(read_csv(path)) == 201
+    backend.cursors.clear()
+    assert Exporter(airtable, FIELDS, csv_path=path,
+                    pages_per_chunk=2).run(resume=True) == 250
+    assert [row[1] for row in read_csv(path)[1:]]\
+        == [str(ID) for ID in range(250)]
+
+
+@pytest.mark.skipif(not have_pyarrow(), reason="pyarrow is not installed")
+def test_parquet_parts(tmp_path):
+    import pyarrow.parquet
+    _, airtable = table()
+    directory = str(tmp_path / "mice")
+    Exporter(airtable, FIELDS, parquet_dir=directory,
+             pages_per_chunk=2).run()
+    exported = pyarrow.parquet.read_table(directory)
+    assert exported.num_rows == 250
+    assert exported.column("Father ID").to_pylist()[:2] == [None, '["rec1"]']
@@ -0,0 +1,74 @@
+from genotypes import genotype_strain, ingest_results, pending_markers
+from session_dir.backends import MemoryBackend
+from tests.helpers import manipulate
+
+
+def test_strain_suffixes():
+    markers = ["-Cre", "DF16A"]
+    assert pending_markers("Ai14-Cre x DF16A", markers) == markers
+    assert pending_markers("Ai14-Cren x DF16A", markers) == ["DF16A"]
+    assert pending_markers("WT", markers) == []
+    assert genotype_strain("Ai14-Cre x DF16A", "DF16A", "p")\
+        == "Ai14-Cre x DF16Ap"
+    # Markers are matched as whole tokens
+    assert pending_markers("Cdh5-CreERT2", markers) == []
+    assert pending_markers("Cdh5-CreERT2 x Ai14-Cre", markers) == ["-Cre"]
+    assert genotype_strain("Cdh5-CreERT2 x Ai14-Cre", "-Cre", "n")\
+        == "Cdh5-CreERT2 x Ai14-Cren"
+    assert pending_markers("Ai14-Cren x Cdh5-Cre", markers) == ["-Cre"]
+
+
+def test_plate_is_applied_in_batches():
+    backend = MemoryBackend()
+    backend.add_records("Mice", [
+        {"ID": str(ID), "Animal ID": "5100-A" + str(ID),
+         "Strain": "Ai14-Cre", "Status": "CM: Colony Maintenance"}
+        for ID in range(1, 21)] + [
+        {"ID": "21", "Animal ID": "5200-A1", "Strain": "Ai14-Cre x DF16A",
+         "Status": "CM: Colony Maintenance"},
+        {"ID": "22", "Animal ID": "5200-A2", "Strain": "Ai14-Cre x DF16A",
+         "Status": "CM: Colony Maintenance"}])
+    mytable = manipulate(backend, "test_genotypes")
+    plate = [{"animal": "5100-A" + str(ID),
+              "result": "+" if ID % 2 else "negative"}
+             for ID in range(1, 21)]
+    plate += [{"animal": "5200-A1", "marker": "Cre", "result": "neg"},
+              {"animal": "5200-A2", "marker": "Cre", "result": "pos"},
+              {"animal": "5200-A2", "marker": "Cre", "result": "neg"},
+              {"animal": "5100-A1", "result": "fail"},
+              {"animal": "5300-A1", "result": "pos"}]
+    backend.reset_stats()
+    rows = ingest_results(mytable, plate)
+    assert [row.status for row in rows[20:]] == [
+        "ok", "conflict", "conflict", "unreadable", "not found"]
+    # One query, then 21 mice written 10 at a time
+    assert backend.stats()["methods"] == {"GET": 1, "PATCH": 3}
+    airtable = mytable.Authenticate("test_genotypes", "Mice")
+    first = airtable.match("Animal ID", "5100-A1")["fields"]
+    assert (first["Strain"], first["Status"]) == ("Ai14-Crep", "A: Available")
+    assert airtable.match("Animal ID", "5100-A2")["fields"]["Strain"]\
+        == "Ai14-Cren"
+    # Still awaiting its DF16A result
+    mixed = airtable.match("Animal ID", "5200-A1")["fields"]
+    assert (mixed["Strain"], mixed["Status"])\
+        == ("Ai14-Cren x DF16A", "CM: Colony Maintenance")
+    assert airtable.match("Animal ID", "5200-A2")["fields"]["Strain"]\
+        == "Ai14-Cre x DF16A"
+
+
+def test_repeated_marker_is_reported():
+    backend = MemoryBackend()
+    backend.add_records("Mice", [
+        {"ID": "1", "Animal ID": "5400-A1", "Strain": "Ai14-Cre x Cdh5-Cre",
+         "Status": "CM: Colony Maintenance"},
+        {"ID": "2", "Animal ID": "5400-A2", "Strain": "Cdh5-CreERT2",
+         "Status": "CM: Colony Maintenance"}])
+    mytable = manipulate(backend, "test_genotypes_repeated")
+    rows = ingest_results(mytable, [{"animal": "5400-A1", "result": "pos"},
+                                    {"animal": "5400-A2", "result": "pos"}])
+    assert [row.status for row in rows] == ["ambiguous", "unknown marker"]
+    airtable = mytable.Authenticate("test_genotypes_repeated", "Mice")
+    assert airtable.match("Animal ID", "5400-A1")["fields"]["Strain"]\
+        == "Ai14-Cre x Cdh5-Cre"
+    assert airtable.match("Animal ID", "5400-A2")["fields"]["Strain"]\
+        == "Cdh5-CreERT2"
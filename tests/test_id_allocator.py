@@ -0,0 +1,59 @@
+from session_dir.backends import MemoryBackend
+from session_dir.id_allocator import IDAllocator
+from tests.helpers import colony, manipulate
+
+
+def test_blocks_do_not_overlap():
+    allocator = IDAllocator()
+    assert allocator.needs_max()
+    allocator.observe("1515")
+    assert list(allocator.reserve(3)) == [1516, 1517, 1518]
+    assert list(allocator.reserve(2)) == [1519, 1520]
+
+
+def test_record_created_last_gives_up_its_ID():
+    """
+    Verify only the later of two records sharing an ID is moved
+    """
+    allocator = IDAllocator()
+    allocator.observe(1515)
+    ours = [{"id": "recA", "createdTime": "2019-10-11T10:00:01.000Z",
+             "fields": {"ID": "1516"}},
+            {"id": "recB", "createdTime": "2019-10-11T10:00:01.000Z",
+             "fields": {"ID": "1517"}}]
+    theirs = {"id": "recC", "createdTime": "2019-10-11T10:00:00.000Z",
+              "fields": {"ID": "1516"}}
+    assert allocator.collisions(ours, ours + [theirs]) == [ours[0]]
+    assert allocator.collisions([theirs], ours + [theirs]) == []
+
+
+def test_forget_keeps_the_mark_as_a_floor():
+    allocator = IDAllocator()
+    allocator.observe(1515)
+    allocator.reserve(5)
+    allocator.forget()
+    assert allocator.needs_max()
+    # The table's max is behind the blocks this process handed out
+    allocator.observe(1516)
+    assert not allocator.needs_max()
+    assert list(allocator.reserve(1)) == [1521]
+
+
+def test_collisions_read_the_max_ID_again():
+    """
+    Verify mice colliding with IDs another process used past the cached
+    mark are moved past them in one try
+    """
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_id_allocator_stale")
+    mytable.get_max_ID()
+    # Another process inserts IDs 14 to 73
+    backend.add_records("Mice", [{"ID": str(ID), "Animal ID": "6000-A1"}
+                                 for ID in range(14, 74)])
+    mytable.weaned(5100, "WT", female_num=2, female_cage=5401)
+    airtable = mytable.Authenticate("test_id_allocator_stale", "Mice")
+    pups = airtable.search_prefix("Animal ID", "5100-")
+    assert sorted(pup["fields"]["ID"] for pup in pups) == ["74", "75"]
+    IDs = [record["fields"]["ID"] for record in airtable.get_all()]
+    assert len(IDs) == len(set(IDs))
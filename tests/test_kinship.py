@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from ADP import Manipulate
+from kinship import Kinship, PairKinship
+from pedigree import Pedigree
+from session_dir.backends import MemoryBackend
+from tests.test_pedigree import mouse
+
+
+def family():
+    return Pedigree([
+        mouse("1071-A1"), mouse("1071-A2"), mouse("1071-A3"),
+        mouse("5202-A1", "1071-A1", "1071-A2"),
+        mouse("5202-A2", "1071-A1", "1071-A2"),
+        mouse("5203-A1", "1071-A1", "1071-A3"),
+        mouse("6001-A1", "5202-A1", "5202-A2"),
+        mouse("9000-A1"),
+    ])
+
+
+def test_coefficients():
+    kinship = Kinship(family())
+    assert kinship.kinship("5202-A1", "5202-A2") == 0.25
+    assert kinship.kinship("5202-A1", "5203-A1") == 0.125
+    assert kinship.kinship("1071-A1", "5202-A1") == 0.25
+    assert kinship.kinship("1071-A2", "1071-A3") == 0.0
+    assert kinship.kinship("6001-A1", "6001-A1") == 0.625
+    assert kinship.inbreeding("6001-A1") == 0.25
+    # Unrelated founders get no row
+    assert "9000-A1" not in kinship
+    assert kinship.kinship("9000-A1", "5202-A1") == 0.0
+    assert kinship.best_partners("5202-A1", ["6001-A1", "5202-A2",
+                                             "9000-A1", "5203-A1"]) == [
+        ("9000-A1", 0.0), ("5203-A1", 0.125), ("5202-A2", 0.25),
+        ("6001-A1", 0.375)]
+
+
+def test_update_matches_rebuild():
+    pedigree = family()
+    kinship = Kinship(pedigree)
+    pedigree.add(mouse("7000-A1", "6001-A1", "5203-A1")["fields"])
+    pedigree.add(mouse("7000-A2", "9000-A1", "5203-A1")["fields"])
+    kinship.update()
+    rebuilt = Kinship(pedigree)
+    for animal_ID in ["7000-A1", "7000-A2", "6001-A1", "1071-A3"]:
+        for other_ID in ["7000-A1", "7000-A2", "5202-A2", "9000-A1"]:
+            assert kinship.kinship(animal_ID, other_ID) ==\
+                rebuilt.kinship(animal_ID, other_ID)
+
+
+def test_set_breeding_rejects_siblings():
+    backend = MemoryBackend()
+    backend.add_records("Mice", [
+        {"ID": "1", "Animal ID": "5202-A1", "Gender": "M", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5202",
+         "Father ID": "1071-A1_WT", "Mother ID": "1071-A2_WT"},
+        {"ID": "2", "Animal ID": "5202-A2", "Gender": "F", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5203",
+         "Father ID": "1071-A1_WT", "Mother ID": "1071-A2_WT"},
+        {"ID": "3", "Animal ID": "5300-A1", "Gender": "F", "Strain": "WT",
+         "Status": "A: Available", "Cage Card": "5300"},
+    ])
+    mytable = Manipulate("test_kinship", "Mice", snapshot=True,
+                         backend=backend)
+    mytable.ask = lambda prompt: "y"
+    with pytest.raises(AssertionError, match="too closely related"):
+        mytable.set_breeding(6000, 10, 11, 2019, "5202-A1", "5202-A2")
+    # Checked from the pair's ancestors, without building the matrix
+    assert mytable._kinship is None
+    assert mytable.best_partners("5202-A1") == [("5300-A1", 0.0),
+                                                ("5202-A2", 0.25)]
+    mytable.set_breeding(6000, 10, 11, 2019, "5202-A1", "5300-A1")
+
+
+def test_pairs_match_the_matrix():
+    pedigree = family()
+    pedigree.add(mouse("7000-A1", "6001-A1", "5203-A1")["fields"])
+    matrix = Kinship(pedigree)
+    pairs = PairKinship(pedigree)
+    for animal_ID in pedigree.names + ["1234-A1"]:
+        for other_ID in pedigree.names + ["1234-A1"]:
+            assert pairs.kinship(animal_ID, other_ID) ==\
+                matrix.kinship(animal_ID, other_ID)
@@ -1,13 +1,9 @@
 import pytest
-from unittest.mock import patch
 
 from ADP import *
-from session_dir.session_object import *
+from session_dir.backends import MemoryBackend, SQLiteBackend
+from tests.helpers import colony, manipulate
 
-class ManipulateTests(unittest.TestCase):
-    @patch('ADP.Manipulate')
-    def test_get_max_ID(self):
-        self.assertEqual()
 
 def test_get_date_born():
     """
@@ -15,4 +11,112 @@ def test_get_date_born():
     """
     assert get_date_born("7/21/2019") == "6/30/2019"
     assert get_date_born("3/7/2019") == "2/14/2019"
-    assert get_date_born("1/2/2019") == "12/12/2018"
\ No newline at end of file
+    assert get_date_born("1/2/2019") == "12/12/2018"
+
+
+def test_weaned_offline():
+    """
+    Verify weaned() runs against a local backend and writes the litter
+    """
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_weaned_offline")
+    mytable.weaned(5100, "WT", female_num=2, female_cage=5401, male_num=6,
+                   male_cage=5402, male_cage2=5403)
+
+    airtable = mytable.Authenticate("test_weaned_offline", "Mice")
+    pups = airtable.search_prefix("Animal ID", "5100-")
+    assert [pup["fields"]["ID"] for pup in pups] == [str(ID) for ID
+                                                     in range(14, 22)]
+    assert [pup["fields"]["Cage Card"] for pup in pups] ==\
+        ["5401"] * 2 + ["5402"] * 5 + ["5403"]
+    assert pups[0]["fields"]["Mother ID"] == "4727-A2_WT"
+    assert pups[0]["fields"]["Born"] == "6/30/2019"
+    mother = airtable.match("Animal ID", "4727-A2")
+    assert mother["fields"]["Status"] == "B: Breeding"
+    assert "Weaning Date" not in mother["fields"]
+    assert backend.stats()["methods"]["POST"] == 1
+
+
+def test_cage_workflows_offline():
+    """
+    Verify birth(), set_breeding(), SAC_cage() and get_negatives() offline
+    """
+    backend = SQLiteBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_cage_workflows_offline")
+    airtable = mytable.Authenticate("test_cage_workflows_offline", "Mice")
+
+    airtable.update_by_field("Animal ID", "4727-A2",
+                             {"Status": "B: Breeding"})
+    mytable.birth(5100, 10, 11, 2019)
+    mother = airtable.match("Animal ID", "4727-A2")["fields"]
+    assert mother["Status"] == "P: With Pups"
+    assert mother["Weaning Date"] == "11/1/2019"
+
+    mytable.ask = lambda prompt: "n"
+    mytable.set_breeding(5300, 10, 11, 2019, "5001-A1", "4727-A2")
+    assert airtable.search("Cage Card", 5300)[0]["fields"]["Partner ID"]\
+        in ["4727-A2_WT", "5001-A1_WT"]
+
+    mytable.SAC_cage(5100)
+    assert [record["fields"]["Status"] for record
+            in airtable.search("Cage Card", 5100)] == ["S: Sacrificed",
+                                                        "D: Died"]
+    assert mytable.get_negatives() == []
+    with pytest.raises(AssertionError, match="Cage does not exist"):
+        mytable.SAC_cage(9999)
+
+
+def negative_cages(backend):
+    colony(backend)
+    mouse = lambda ID, animal_ID, strain, status, cage: {
+        "ID": str(ID), "Animal ID": animal_ID, "Gender": "F",
+        "Strain": strain, "Status": status, "Cage Card": cage}
+    backend.add_records("Mice", [
+        # -Cre and -Cren mice together
+        mouse(20, "6001-A1", "Ai14-Cre", "A: Available", "6001"),
+        mouse(21, "6001-A2", "Ai14-Cren", "A: Available", "6001"),
+        # Every mouse Cre negative
+        mouse(22, "6002-A1", "Ai14-Cren", "A: Available", "6002"),
+        mouse(23, "6002-A2", "Ai14-Cren", "B: Breeding", "6002"),
+        # A SACed -Cre mouse still carries the card of a negative cage
+        mouse(24, "6003-A1", "Ai14-Cren", "A: Available", "6003"),
+        mouse(25, "6003-A2", "Ai14-Cre", "S: Sacrificed", "6003"),
+        # No live mouse left
+        mouse(26, "6004-A1", "Ai14-Cren", "D: Died", "6004"),
+    ])
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_get_negatives(snapshot):
+    """
+    Verify a cage is listed only if it has a live mouse and every mouse
+    with its card is Cre negative
+    """
+    backend = MemoryBackend()
+    negative_cages(backend)
+    mytable = Manipulate("test_get_negatives", "Mice", backend=backend,
+                         snapshot=snapshot)
+    backend.views[mytable.main_view] = mytable.alive()
+    assert mytable.get_negatives() == ["6002"]
+    # A view that cannot be checked locally is listed separately
+    backend.views["Negative cages"] = eq("Cage Card", "6003")
+    assert mytable.cages_where(lambda fields: True, view="Negative cages")\
+        == ["6003"]
+
+
+def test_latency_and_paging():
+    """
+    Verify get_all pages by 100 records and each page waits the latency
+    """
+    waits = []
+    backend = MemoryBackend(latency=0.25, sleep=waits.append)
+    backend.add_records("Mice", [{"ID": str(ID)} for ID in range(250)])
+    table = backend.table("base_key", "Mice")
+    assert len(table.get_all()) == 250
+    assert table.get_all(sort="-ID", max_records=1)[0]["fields"]["ID"]\
+        == "249"
+    stats = backend.stats()
+    assert stats["requests"] == 4 and waits == [0.25] * 4
+    assert stats["wait_time"] == 1.0
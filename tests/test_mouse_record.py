@@ -0,0 +1,50 @@
+from ADP import Manipulate
+import datetime
+
+from mouse_record import MouseSchema
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony
+
+
+def test_round_trip():
+    schema = MouseSchema()
+    record = {"id": "rec1", "createdTime": "2019-10-11T10:00:00.000Z",
+              "fields": {"ID": "1513", "Animal ID": "1071-A2",
+                         "Cage Card": 6001, "Status": "P: With Pups",
+                         "Born": "4/10/2019", "Weaning Date": "06/20/2019",
+                         "Notes": "tail clipped"}}
+    mouse = schema.load(record)
+    assert (mouse.ID, mouse.cage, mouse.born) ==\
+        (1513, 6001, datetime.date(2019, 4, 10))
+    assert (mouse.parental_cage, mouse.cohort, mouse.number) ==\
+        ("1071", "A", 2)
+    # Values a slot would not give back unchanged stay as sent
+    assert mouse.weaning_date is None
+    assert mouse.extra == {"Weaning Date": "06/20/2019",
+                           "Notes": "tail clipped"}
+    assert mouse.get("Gender") is None and "Gender" not in mouse
+    assert schema.dump(mouse) == record
+    assert schema.dump(mouse, ["ID", "Gender"])["fields"] == {"ID": "1513"}
+    # Shared values
+    other = schema.load({"id": "rec2", "fields": {"Born": "4/10/2019",
+                                                  "Status": "P: With Pups"}})
+    assert other.born is mouse.born and other.status is mouse.status
+
+
+def test_snapshot_keeps_mouse_records():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = Manipulate("test_mouse_record", "Mice", snapshot=True,
+                         backend=backend)
+    backend.views[mytable.main_view] = mytable.alive()
+    mice = mytable.load_mice(view=mytable.main_view)
+    assert [mouse.animal_ID for mouse in mice] == ["4881-D3", "4727-A2",
+                                                   "5001-A1"]
+    airtable = mytable.Authenticate("test_mouse_record", "Mice")
+    assert all(type(record).__name__ == "MouseRecord"
+               for record in airtable.records.values())
+    mytable.weaned(5100, "WT", female_num=2, female_cage=5401)
+    pups = airtable.search_prefix("Animal ID", "5100-")
+    assert [pup["fields"]["Cage Card"] for pup in pups] == ["5401", "5401"]
+    assert backend.table("test_mouse_record", "Mice").search_prefix(
+        "Animal ID", "5100-") == pups
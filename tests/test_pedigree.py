@@ -0,0 +1,47 @@
+from ADP import Manipulate
+from pedigree import Pedigree
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony
+
+
+def mouse(animal_ID, father=None, mother=None):
+    fields = {"Animal ID": animal_ID}
+    if father:
+        fields["Father ID"] = father + "_WT"
+    if mother:
+        fields["Mother ID"] = mother + "_WT"
+    return {"fields": fields}
+
+
+def test_lineage_queries():
+    pedigree = Pedigree([
+        mouse("1071-A1"), mouse("1071-A2"), mouse("1071-A3"),
+        mouse("5202-A1", "1071-A1", "1071-A2"),
+        mouse("5202-A2", "1071-A1", "1071-A2"),
+        mouse("5203-A1", "1071-A1", "1071-A3"),
+        mouse("6001-A1", "5202-A1", "5203-A1"),
+    ])
+    assert pedigree.descendants("1071-A1") == ["5202-A1", "5202-A2",
+                                               "5203-A1", "6001-A1"]
+    assert pedigree.descendants("1071-A1", max_depth=1) == [
+        "5202-A1", "5202-A2", "5203-A1"]
+    assert pedigree.ancestors("6001-A1") == ["5202-A1", "5203-A1", "1071-A1",
+                                             "1071-A2", "1071-A3"]
+    assert pedigree.siblings("5202-A1") == ["5202-A2"]
+    assert pedigree.siblings("5202-A1", half=True) == ["5202-A2", "5203-A1"]
+    assert pedigree.offspring_of_cage(5202) == ["5202-A1", "5202-A2"]
+    assert pedigree.generation("1071-A1") == 0
+    assert pedigree.generation("6001-A1") == 2
+    assert pedigree.parents("5203-A1") == ("1071-A1", "1071-A3")
+
+
+def test_weaned_pups_join_a_built_pedigree():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = Manipulate("test_pedigree", "Mice", backend=backend)
+    pedigree = mytable.get_pedigree()
+    mytable.weaned(5100, "WT", female_num=2, female_cage=5401)
+    assert mytable.get_pedigree() is pedigree
+    assert pedigree.offspring_of_cage(5100) == ["5100-A1", "5100-A2"]
+    assert pedigree.descendants("4727-A2") == ["5100-A1", "5100-A2"]
+    assert pedigree.siblings("5100-A1") == ["5100-A2"]
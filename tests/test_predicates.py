@@ -0,0 +1,30 @@
+from session_dir.predicates import AND, NOT, OR, eq, ne, startswith
+
+
+def test_formula_and_local_match_agree():
+    """
+    Verify a predicate compiles to a formula and matches records locally
+    """
+    alive = AND(ne("Status", "S: Sacrificed"), ne("Status", "D: Died"))
+    condition = AND(eq("Cage Card", 5100), alive)
+    assert condition.formula() == "AND({Cage Card}=5100,AND({Status}!="\
+        "'S: Sacrificed',{Status}!='D: Died'))"
+    assert condition.matches({"Cage Card": "5100", "Status": "B: Breeding"})
+    assert not condition.matches({"Cage Card": "5100", "Status": "D: Died"})
+    assert not condition.matches({"Cage Card": "5101"})
+
+
+def test_text_and_blank_cells():
+    cohort = startswith("Animal ID", "1071-")
+    assert cohort.formula() == "FIND('1071-',{Animal ID})=1"
+    assert cohort.matches({"Animal ID": "1071-A1"})
+    assert not cohort.matches({})
+    assert eq("Strain", "O'Hara").formula() == "{Strain}='O\\'Hara'"
+    assert (NOT(eq("Gender", "M")) | eq("Gender", "F")).matches({})
+    assert not OR(eq("Gender", "M")).matches({"Gender": "F"})
+
+
+def test_fields_read():
+    predicate = AND(ne("Status", "D: Died"), OR(eq("Status", "B: Breeding"),
+                                                startswith("Strain", "Ai14")))
+    assert predicate.fields() == ["Status", "Strain"]
@@ -0,0 +1,74 @@
+from session_dir.backends import MemoryBackend
+from session_dir.record_ids import RecordIDMap
+from tests.helpers import colony, manipulate
+
+
+def test_renames_and_deletions_are_tracked():
+    record_ids = RecordIDMap("Animal ID")
+    record_ids.observe_response({"records": [
+        {"id": "rec1", "fields": {"Animal ID": "4727-A1"}},
+        {"id": "rec2", "fields": {"Animal ID": "4727-A2"}},
+        {"id": "rec3", "fields": {"Status": "A: Available"}}]})
+    assert record_ids.get("4727-A1") == "rec1"
+    assert len(record_ids) == 2
+    record_ids.observe_response({"id": "rec1",
+                                 "fields": {"Animal ID": "4727-A9"}})
+    assert record_ids.get("4727-A1") is None
+    assert record_ids.get("4727-A9") == "rec1"
+    record_ids.observe_response({"records": [{"id": "rec2",
+                                              "deleted": True}]})
+    assert record_ids.get("4727-A2") is None
+
+
+def test_update_mouse_skips_the_search():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_record_ids")
+    airtable = mytable.Authenticate("test_record_ids", "Mice")
+    mother = airtable.match("Animal ID", "4727-A2")
+    searches = []
+    search = airtable.search
+    airtable.search = lambda *args, **options: searches.append(args)\
+        or search(*args, **options)
+    backend.reset_stats()
+    mytable.update_mouse("4727-A2", {"Notes": "big litter"})
+    # The record is read by its id, not searched for
+    assert backend.stats()["methods"] == {"GET": 1, "PATCH": 1}
+    assert searches == []
+    assert airtable.get(mother["id"])["fields"]["Notes"] == "big litter"
+    mytable.SAC_mouse("4881-D3")
+    mytable.set_breeding(5300, 8, 1, 2019, "5001-A1", "4727-A2")
+    # Only the mice the session had not seen yet are searched for
+    assert [args for args in searches if args[0] == "Animal ID"] ==\
+        [("Animal ID", "4881-D3"), ("Animal ID", "5001-A1")]
+
+
+def test_renamed_records_are_not_trusted():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_record_ids_renamed")
+    airtable = mytable.Authenticate("test_record_ids_renamed", "Mice")
+    mother = airtable.match("Animal ID", "4727-A2")
+    # Another session renames the record and enters a new 4727-A2
+    other = backend.table("test_record_ids_renamed", "Mice")
+    other.update(mother["id"], {"Animal ID": "4727-A9"})
+    added = other.insert(dict(mother["fields"]))
+    record = mytable.update_mouse("4727-A2", {"Notes": "big litter"})
+    assert record["id"] == added["id"]
+    assert "Notes" not in airtable.get(mother["id"])["fields"]
+    assert mytable.record_ids.get("4727-A9") == mother["id"]
+
+
+def test_update_mouse_falls_back_when_the_id_is_stale():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_record_ids_stale")
+    airtable = mytable.Authenticate("test_record_ids_stale", "Mice")
+    mother = airtable.match("Animal ID", "4727-A2")
+    # Deleted and re-entered by another session
+    other = backend.table("test_record_ids_stale", "Mice")
+    other.delete(mother["id"])
+    readded = other.insert(dict(mother["fields"]))
+    record = mytable.update_mouse("4727-A2", {"Notes": "big litter"})
+    assert record["id"] == readded["id"]
+    assert mytable.record_ids.get("4727-A2") == readded["id"]
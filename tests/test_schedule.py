@@ -0,0 +1,57 @@
+import datetime
+
+from schedule import Schedule
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony, manipulate
+
+
+def record(record_id, **fields):
+    return {"id": record_id, "fields": dict(
+        (name.replace("_", " "), value) for name, value in fields.items())}
+
+
+def test_calendar():
+    schedule = Schedule([
+        record("rec1", Animal_ID="4727-A2", Gender="F", Status="P: With Pups",
+               Cage_Card="5100", Born="1/1/2019",
+               **{"Weaning Date": "7/21/2019"}),
+        record("rec2", Animal_ID="4881-D3", Gender="M", Status="B: Breeding",
+               Cage_Card="5100", Born="3/1/2019",
+               **{"Breeding Date": "5/1/2019"}),
+        record("rec3", Animal_ID="4900-A1", Gender="F", Status="B: Breeding",
+               Cage_Card="5200", Born="3/1/2019",
+               **{"Breeding Date": "5/1/2019"}),
+        record("rec4", Animal_ID="5200-A1", Gender="M", Status="A: Available",
+               Cage_Card="5300", Born="6/1/2019"),
+    ], retirement_days=240, no_litter_days=60)
+    # 4900-A1 had a litter a month after being set to breeding
+    assert schedule.litters["5200"] == datetime.date(2019, 6, 1).toordinal()
+    assert [str(task) for task in schedule.due(datetime.date(2019, 8, 1))] == [
+        "7/21/2019: wean the litter of 4727-A2 in cage 5100",
+        "7/31/2019: 4900-A1 in cage 5200 has had no litter"]
+    assert [task.animal_ID for task in schedule.between(
+        datetime.date(2019, 8, 1), datetime.date(2019, 12, 31),
+        kinds=["retire"])] == ["4727-A2", "4881-D3", "4900-A1"]
+
+    # A new litter moves the no litter task, SACing drops every task
+    schedule.update("rec5", {"Animal ID": "5200-A2", "Born": "7/20/2019"})
+    schedule.update("rec1", {"Status": "S: Sacrificed"})
+    assert [str(task) for task in schedule.due(datetime.date(2019, 9, 18))] == [
+        "9/18/2019: 4900-A1 in cage 5200 has had no litter"]
+
+
+def test_writes_update_a_built_schedule():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_schedule")
+    schedule = mytable.get_schedule()
+    assert [task.kind for task in schedule.due(datetime.date(2019, 8, 1))]\
+        == ["wean"]
+    mytable.weaned(5100, "WT", female_num=2, female_cage=5401)
+    assert schedule.due(datetime.date(2019, 8, 1)) == []
+    mytable.birth(5100, 8, 1, 2019)
+    assert [str(task) for task in schedule.due(datetime.date(2019, 8, 30))]\
+        == ["8/22/2019: wean the litter of 4727-A2 in cage 5100"]
+    mytable.SAC_cage(5100)
+    assert len(schedule) == 0
+    assert mytable.get_schedule() is schedule
@@ -0,0 +1,108 @@
+import pytest
+import requests
+
+from session_dir.client import Client
+from session_dir.scheduler import RequestScheduler, get_scheduler
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Response(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_token_bucket_paces_past_burst():
+    """
+    Verify the 6th back to back request waits for a token at 5/sec
+    """
+    clock = FakeClock()
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    for _ in range(6):
+        scheduler.send(lambda: Response(200))
+    assert clock.sleeps == [0.2]
+    assert scheduler.stats()["requests"] == 6
+
+
+def test_retries_throttled_and_server_errors():
+    """
+    Verify 429/5xx responses are retried and Retry-After is respected
+    """
+    clock = FakeClock()
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    responses = [Response(429, {"Retry-After": "30"}), Response(503),
+                 Response(200)]
+    assert scheduler.send(lambda: responses.pop(0)).status_code == 200
+    stats = scheduler.stats()
+    assert stats["retries"] == 2 and stats["throttled"] == 1
+    assert clock.sleeps[0] >= 30
+
+    scheduler = RequestScheduler(max_retries=1, clock=clock,
+                                 sleep=clock.sleep)
+    assert scheduler.send(lambda: Response(500)).status_code == 500
+
+
+def test_scheduler_shared_per_base():
+    assert get_scheduler("base_key") is get_scheduler("base_key")
+    assert get_scheduler("base_key") is not get_scheduler("other_base")
+
+
+def test_server_errors_are_retried_only_when_safe():
+    """
+    Verify a 5xx is not retried for a request that may have gone through,
+    while a 429 always is
+    """
+    clock = FakeClock()
+    scheduler = RequestScheduler(clock=clock, sleep=clock.sleep)
+    sent = []
+
+    def send_request(status_code):
+        sent.append(status_code)
+        return Response(status_code)
+
+    assert scheduler.send(lambda: send_request(500),
+                          idempotent=False).status_code == 500
+    assert sent == [500]
+    responses = [429, 200]
+    assert scheduler.send(lambda: send_request(responses.pop(0)),
+                          idempotent=False).status_code == 200
+    assert sent == [500, 429, 200]
+
+
+def test_client_sends_a_post_once_on_server_error():
+    clock = FakeClock()
+    client = Client("base_key", "Mice", "API_key",
+                    scheduler=RequestScheduler(clock=clock,
+                                               sleep=clock.sleep))
+    sent = []
+
+    def request(method, url, **kwargs):
+        sent.append(method)
+        response = requests.Response()
+        response.status_code = 500
+        response._content = b"{}"
+        response.url = url
+        return response
+
+    client.session.request = request
+    with pytest.raises(requests.HTTPError):
+        client.insert({"Animal ID": "5100-A1"})
+    assert sent == ["post"]
+    # Reads and single record updates are retried
+    with pytest.raises(requests.HTTPError):
+        client.update("rec1", {"Status": "A: Available"})
+    assert sent == ["post"] + ["patch"] * 6
+    assert client.idempotent("get", client.url_table)
+    assert not client.idempotent("patch", client.url_table)
@@ -0,0 +1,12 @@
+from session_dir.session_object import Session
+
+
+def test_authenticate_shares_one_client():
+    """
+    Verify every Authenticate call reuses the session's pooled client
+    """
+    with Session("base_key", "table_name", "API_key") as session:
+        first = session.Authenticate("base_key", "table_name", "API_key")
+        second = session.Authenticate("base_key", "table_name", "API_key")
+        assert first is second
+    assert first.closed
@@ -0,0 +1,68 @@
+from session_dir.snapshot import TableSnapshot
+
+
+class FakeTable(object):
+    """
+    Minimal stand-in for the Airtable methods the snapshot calls
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.requests = 0
+
+    def get_all(self, **options):
+        self.requests += 1
+        return [dict(r, fields=dict(r["fields"])) for r in self.records]
+
+    def update(self, record_id, fields, typecast=False):
+        self.requests += 1
+        for record in self.records:
+            if record["id"] == record_id:
+                record["fields"].update(fields)
+                return dict(record, fields=dict(record["fields"]))
+
+    def insert(self, fields, typecast=False):
+        self.requests += 1
+        record = {"id": "rec" + str(len(self.records)), "fields": dict(fields)}
+        self.records.append(record)
+        return dict(record, fields=dict(fields))
+
+
+def make_snapshot():
+    table = FakeTable([
+        {"id": "rec0", "fields": {"ID": 1512, "Cage Card": "6000",
+                                  "Animal ID": "1071-A1", "Strain": "WT"}},
+        {"id": "rec1", "fields": {"ID": 1513, "Cage Card": "6001",
+                                  "Animal ID": "1071-A2", "Strain": "WT"}},
+        {"id": "rec2", "fields": {"ID": 1514, "Cage Card": "6001",
+                                  "Animal ID": "1071-A3", "Strain": "WT"}},
+    ])
+    snapshot = TableSnapshot(table, ["Animal ID", "Cage Card", "Strain", "ID"])
+    return table, snapshot
+
+
+def test_lookups_use_one_request():
+    """
+    Verify index lookups are answered after a single load
+    """
+    table, snapshot = make_snapshot()
+    assert len(snapshot.search("Cage Card", 6001)) == 2
+    assert snapshot.search("Animal ID", "1071-A1")[0]["id"] == "rec0"
+    assert snapshot.search("Animal ID", "9999-A1") == []
+    assert snapshot.get_all(sort="-ID", max_records=1)[0]["fields"]["ID"]\
+        == 1514
+    assert table.requests == 1
+
+
+def test_writes_update_indexes():
+    """
+    Verify records written through the snapshot are re-indexed
+    """
+    table, snapshot = make_snapshot()
+    snapshot.update_by_field("Animal ID", "1071-A1", {"Cage Card": "6001"})
+    assert len(snapshot.search("Cage Card", "6001")) == 3
+    assert snapshot.search("Cage Card", "6000") == []
+    snapshot.insert({"ID": 1515, "Cage Card": "6002", "Animal ID": "1071-A4"})
+    assert snapshot.search("Cage Card", "6002")[0]["fields"]["ID"] == 1515
+    # load + update + insert
+    assert table.requests == 3
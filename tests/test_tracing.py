@@ -0,0 +1,44 @@
+import asyncio
+import logging
+
+from ADP import Manipulate
+from ADP_async import AsyncManipulate
+from session_dir.backends import MemoryBackend
+from tests.helpers import colony
+
+
+def test_requests_are_attributed_to_the_outer_operation(caplog):
+    """
+    Verify weaned() is one operation span totalling its request spans,
+    and its messages go to the logger
+    """
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = Manipulate("test_tracing", "Mice", backend=backend)
+    caplog.set_level(logging.INFO, logger="ADP")
+    with mytable.tracer.collect() as spans:
+        mytable.weaned(5100, "WT", female_num=2, female_cage=5401)
+
+    requests = [span for span in spans if span.kind == "request"]
+    operation = spans[-1]
+    assert operation.kind == "operation" and operation.name == "weaned"
+    assert all(span.operation == "weaned" for span in requests)
+    assert operation.requests == len(requests) == backend.stats()["requests"]
+    assert requests[0].endpoint == "test_tracing/Mice"
+    assert requests[0].bytes_received > 0 and requests[0].retries == 0
+
+    metrics = mytable.tracer.metrics()
+    assert metrics["operations.weaned"] == 1
+    assert metrics["requests.weaned"] == metrics["requests"]
+    assert metrics["requests.POST"] == 1
+    assert "5100-A1 goes to cage 5401" in caplog.messages
+
+
+def test_async_requests_are_traced():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = AsyncManipulate("test_async_tracing", "Mice", backend=backend)
+    asyncio.run(mytable.weaned(5100, "WT", male_num=3, male_cage=5402))
+    mytable.close()
+    metrics = mytable.tracer.metrics()
+    assert metrics["requests.weaned"] == backend.stats()["requests"]
@@ -0,0 +1,112 @@
+import pytest
+
+from ADP import Manipulate
+from session_dir.backends import MemoryBackend
+from session_dir.unit_of_work import UnitOfWork
+from tests.helpers import colony, manipulate
+
+
+class FailingTable(object):
+    """
+    Passes requests to a table, failing the given batch update
+    """
+
+    def __init__(self, table, fail_at):
+        self.table = table
+        self.fail_at = fail_at
+        self.batch_updates = 0
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["table"], name)
+
+    def batch_update(self, records, typecast=False):
+        self.batch_updates += 1
+        if self.batch_updates == self.fail_at:
+            raise IOError("connection reset")
+        return self.table.batch_update(records, typecast)
+
+
+def test_operations_share_one_commit():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_unit_of_work")
+    airtable = mytable.Authenticate("test_unit_of_work", "Mice")
+    airtable.update_by_field("Animal ID", "4727-A2",
+                             {"Status": "B: Breeding"})
+    backend.reset_stats()
+    with mytable.unit_of_work() as unit:
+        mytable.birth(5100, 10, 11, 2019)
+        unit.update_by_field("Animal ID", "4727-A2", {"Notes": "big litter"})
+        mytable.SAC_cage(5200)
+        assert unit.match("Animal ID", "4727-A2")["fields"]["Notes"]\
+            == "big litter"
+        assert backend.stats()["methods"].get("PATCH") is None
+    # Two records, one batch PATCH
+    assert backend.stats()["methods"]["PATCH"] == 1
+    mother = airtable.match("Animal ID", "4727-A2")["fields"]
+    assert (mother["Status"], mother["Weaning Date"], mother["Notes"]) ==\
+        ("P: With Pups", "11/1/2019", "big litter")
+    assert airtable.match("Animal ID", "5001-A1")["fields"]["Status"]\
+        == "S: Sacrificed"
+
+
+def test_nothing_is_sent_if_the_block_fails():
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = manipulate(backend, "test_unit_of_work_fails")
+    with pytest.raises(AssertionError):
+        with mytable.unit_of_work():
+            mytable.SAC_cage(5200)
+            mytable.birth(5200, 10, 11, 2019)
+    airtable = mytable.Authenticate("test_unit_of_work_fails", "Mice")
+    assert airtable.match("Animal ID", "5001-A1")["fields"]["Status"]\
+        == "A: Available"
+
+
+def test_failed_commit_is_compensated():
+    backend = MemoryBackend()
+    backend.add_records("Mice", [{"ID": str(ID), "Status": "A: Available"}
+                                 for ID in range(12)])
+    table = backend.table("test_compensate", "Mice")
+    unit = UnitOfWork(FailingTable(table, fail_at=2))
+    for record in unit.get_all():
+        unit.update(record["id"], {"Status": "S: Sacrificed",
+                                   "Notes": "cull"})
+    unit.insert({"ID": "12"})
+    with pytest.raises(IOError):
+        unit.commit()
+    assert len(unit) == 0
+    records = table.get_all()
+    assert len(records) == 12
+    assert all(record["fields"] == {"ID": record["fields"]["ID"],
+                                    "Status": "A: Available"}
+               for record in records)
+
+
+def test_snapshot_unit_checks_IDs_once():
+    """
+    Verify a unit of work in snapshot mode checks the new IDs only after
+    they are committed
+    """
+    backend = MemoryBackend()
+    colony(backend)
+    mytable = Manipulate("test_unit_of_work_snapshot", "Mice",
+                         backend=backend, snapshot=True)
+    backend.views[mytable.main_view] = mytable.alive()
+    # Load the snapshot
+    mytable.Authenticate("test_unit_of_work_snapshot", "Mice").get_all()
+    checked = []
+    check_IDs = mytable.check_IDs
+
+    def spy(airtable, inserted, attempts=5):
+        checked.append([record["id"] for record in inserted])
+        return check_IDs(airtable, inserted, attempts)
+
+    mytable.check_IDs = spy
+    backend.reset_stats()
+    with mytable.unit_of_work():
+        mytable.weaned(5100, "WT", female_num=2, female_cage=5401)
+    # The only read is the check of the written IDs
+    assert backend.stats()["methods"] == {"GET": 1, "PATCH": 1, "POST": 1}
+    assert not any(record_id.startswith("staged")
+                   for record_id in checked[-1])
@@ -0,0 +1,61 @@
+from session_dir.write_buffer import WriteBuffer
+
+
+class RecordingTable(object):
+    """
+    Records each request a WriteBuffer sends
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def insert(self, fields, typecast=False):
+        self.calls.append(("insert", 1))
+        return {"id": "rec" + fields["Animal ID"], "fields": fields}
+
+    def batch_insert(self, records, typecast=False):
+        self.calls.append(("batch_insert", len(records)))
+        return [{"id": "rec" + r["Animal ID"], "fields": r} for r in records]
+
+    def update(self, record_id, fields, typecast=False):
+        self.calls.append(("update", 1))
+        return {"id": record_id, "fields": fields}
+
+    def batch_update(self, records, typecast=False):
+        self.calls.append(("batch_update", len(records)))
+        return records
+
+
+def test_flush_batches_in_order():
+    """
+    Verify writes are grouped by kind, 10 per request, in order
+    """
+    table = RecordingTable()
+    with WriteBuffer(table) as buffer:
+        buffer.update("rec0", {"Status": "B: Breeding"})
+        for i in range(12):
+            buffer.insert({"Animal ID": "1071-A" + str(i + 1)})
+    assert table.calls == [("update", 1), ("batch_insert", 10),
+                           ("batch_insert", 2)]
+    assert [r["id"] for r in buffer.results][:3] == ["rec0", "rec1071-A1",
+                                                    "rec1071-A2"]
+    assert buffer.results[-1]["id"] == "rec1071-A12"
+
+
+def test_unbatched_and_failed_blocks():
+    """
+    Verify batch=False writes immediately and errors drop pending writes
+    """
+    table = RecordingTable()
+    buffer = WriteBuffer(table, batch=False)
+    buffer.insert({"Animal ID": "1071-A1"})
+    assert table.calls == [("insert", 1)]
+
+    table = RecordingTable()
+    try:
+        with WriteBuffer(table) as buffer:
+            buffer.insert({"Animal ID": "1071-A1"})
+            raise AssertionError("Cage already alocated")
+    except AssertionError:
+        pass
+    assert table.calls == []